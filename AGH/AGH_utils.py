@@ -3,9 +3,125 @@
 
 import json
 import os
+import threading
+import time
 
 from AGH.data.constants import BADAWCZO_DYDAKTYCZNA, DYDAKTYCZNA
 
+DATA_PATH = os.path.join(os.path.dirname(__file__), 'data')
+
+
+class RegulationCatalog:
+    """
+    Process-wide catalog of the regulation data stored in JSON files of the data/ directory.
+    Every file is parsed only once and indexed with dictionaries (lower-cased position, function name and factor ID).
+    Data is reloaded when modification time of any of the files changes - files are checked at most every
+    CHECK_INTERVAL seconds, so a lookup is usually just a dictionary read.
+    """
+    CHECK_INTERVAL = 5
+    PENSUM_THRESHOLDS_FILES = {
+        BADAWCZO_DYDAKTYCZNA: 'PensumThresholds_BadawczoDydaktyczna.json',
+        DYDAKTYCZNA: 'PensumThresholds_Dydaktyczna.json',
+    }
+    PENSUM_REDUCTION_FILE = 'PensumReduction.json'
+    ADDITIONAL_HOURS_FACTORS_FILE = 'additional_hours_factors.json'
+
+    def __init__(self, data_path=DATA_PATH):
+        self.__paths = [
+            os.path.join(data_path, file_name)
+            for file_name in [*self.PENSUM_THRESHOLDS_FILES.values(), self.PENSUM_REDUCTION_FILE,
+                              self.ADDITIONAL_HOURS_FACTORS_FILE]
+        ]
+        self.__lock = threading.Lock()
+        self.__mtimes = None
+        self.__checked_at = None
+
+        self.pensum_thresholds = {}
+        self.function_names = []
+        self.reduction_values = {}
+        self.additional_hours_factors_choices = []
+        self.additional_hours_factors = {}
+        self.additional_hours_groups = {}
+        self.sectors = {}
+
+    def __get_mtimes(self):
+        return tuple(os.stat(path).st_mtime_ns for path in self.__paths)
+
+    def __read(self, file_name):
+        with open(os.path.join(os.path.dirname(self.__paths[0]), file_name), 'r', encoding='utf8') as json_file:
+            return json.load(json_file)
+
+    def __load(self):
+        pensum_thresholds = {}
+        for group, file_name in self.PENSUM_THRESHOLDS_FILES.items():
+            pensum_thresholds[group] = {}
+            for item in self.__read(file_name):
+                for position in item.get('positions'):
+                    # first matching record wins - same as searching the list in order
+                    pensum_thresholds[group].setdefault(position.lower(), item.get('value'))
+
+        reductions = self.__read(self.PENSUM_REDUCTION_FILE)
+        function_names = [item.get('function') for item in reductions]
+        reduction_values = {item.get('function'): item.get('value') for item in reductions}
+
+        factors_data = self.__read(self.ADDITIONAL_HOURS_FACTORS_FILE)
+        additional_hours_factors = {
+            item.get('factor ID'): item for item in factors_data.get('additional hours factors') if item.get('factor ID')
+        }
+        additional_hours_groups = {item.get('group ID'): item for item in factors_data.get('groups')}
+        # every list section indexed by factor ID (e.g. 'major factors', 'job-time hours limits', 'exams')
+        sectors = {}
+        for sector_name, items in factors_data.items():
+            sectors[sector_name] = {}
+            for item in items:
+                if item.get('factor ID'):
+                    sectors[sector_name].setdefault(item.get('factor ID'), item)
+
+        self.pensum_thresholds = pensum_thresholds
+        self.function_names = function_names
+        self.reduction_values = reduction_values
+        self.additional_hours_factors_choices = [
+            (factor_ID, item.get('factor description')) for factor_ID, item in additional_hours_factors.items()
+        ]
+        self.additional_hours_factors = additional_hours_factors
+        self.additional_hours_groups = additional_hours_groups
+        self.sectors = sectors
+
+    def refresh(self, force=False):
+        """
+        Loads data if it was not loaded yet or if any of the files changed since last load (checked at most every
+        CHECK_INTERVAL seconds)
+
+        params: force - check the files regardless of the time of the last check
+        return: catalog instance
+        """
+        now = time.monotonic()
+        if not force and self.__checked_at is not None and now - self.__checked_at < self.CHECK_INTERVAL:
+            return self
+        self.__checked_at = now
+        mtimes = self.__get_mtimes()
+        if mtimes != self.__mtimes:
+            with self.__lock:
+                if mtimes != self.__mtimes:
+                    self.__load()
+                    self.__mtimes = mtimes
+        return self
+
+    def get_factor(self, factor_name, sector_name):
+        return self.sectors.get(sector_name, {}).get(factor_name)
+
+
+regulation_catalog = RegulationCatalog()
+
+
+def get_regulation_catalog():
+    """
+    Returns process-wide regulation catalog with up-to-date data
+
+    return: RegulationCatalog instance
+    """
+    return regulation_catalog.refresh()
+
 
 def get_pensum(position, group=DYDAKTYCZNA):
     """
@@ -16,19 +132,7 @@ def get_pensum(position, group=DYDAKTYCZNA):
     params: group - employee's group name
     return: pensum basic threshold for given position-group matchup
     """
-    base_path = os.path.dirname(__file__)
-    with open(
-            os.path.join(base_path, "data/PensumThresholds_BadawczoDydaktyczna.json"), 'r', encoding='utf8'
-    ) as json_file:
-        for item in json.load(json_file):
-            if (position.lower() in [x.lower() for x in item.get('positions')]) and (group == BADAWCZO_DYDAKTYCZNA):
-                return item.get('value')
-    with open(
-            os.path.join(base_path, "data/PensumThresholds_Dydaktyczna.json"), 'r', encoding='utf8'
-    ) as json_file:
-        for item in json.load(json_file):
-            if (position.lower() in [x.lower() for x in item.get('positions')]) and (group == DYDAKTYCZNA):
-                return item.get('value')
+    return get_regulation_catalog().pensum_thresholds.get(group, {}).get(position.lower())
 
 
 def get_pensum_function_names():
@@ -37,11 +141,7 @@ def get_pensum_function_names():
 
     return: list of possible employee's function names
     """
-    base_path = os.path.dirname(__file__)
-    with open(
-            os.path.join(base_path, "data/PensumReduction.json"), 'r', encoding='utf8'
-    ) as json_file:
-        return [item.get('function') for item in json.load(json_file)]
+    return list(get_regulation_catalog().function_names)
 
 
 def get_pensum_reduction_value(function):
@@ -51,14 +151,7 @@ def get_pensum_reduction_value(function):
     params: function - employee's function name
     return: pensum's reduction value
     """
-    base_path = os.path.dirname(__file__)
-    with open(
-            os.path.join(base_path, "data/PensumReduction.json"), 'r', encoding='utf8'
-    ) as json_file:
-        try:
-            return [item.get('value') for item in json.load(json_file) if item.get('function') == function].pop()
-        except IndexError:
-            return None
+    return get_regulation_catalog().reduction_values.get(function)
 
 
 def get_additional_hours_factors_choices():
@@ -68,17 +161,7 @@ def get_additional_hours_factors_choices():
 
     return: list of tuples of additional hours possibilities names
     """
-    base_path = os.path.dirname(__file__)
-    with open(
-            os.path.join(base_path, "data/additional_hours_factors.json"), 'r', encoding='utf8'
-    ) as json_file:
-        try:
-            return [
-                (item.get('factor ID'), item.get('factor description'))
-                for item in json.load(json_file).get('additional hours factors') if item.get('factor ID')
-            ]
-        except IndexError:
-            return None
+    return list(get_regulation_catalog().additional_hours_factors_choices)
 
 
 class AdditionalHoursFactorData:
@@ -86,12 +169,8 @@ class AdditionalHoursFactorData:
     Class containing data regarding given factor ID based on data/additional_hours_factors.json file
     """
     def __init__(self, factor_ID):
-        base_path = os.path.dirname(__file__)
-        with open(os.path.join(base_path, "data/additional_hours_factors.json"), 'r', encoding='utf8') as json_file:
-            self.__json_data = json.load(json_file)
-        factors = self.__json_data.get('additional hours factors')
-        groups = self.__json_data.get('groups')
-        factor_data = next((item for item in factors if item.get("factor ID") == factor_ID), None)
+        catalog = get_regulation_catalog()
+        factor_data = catalog.additional_hours_factors.get(factor_ID)
 
         self.factor_ID = factor_ID
         self.group_ID = self.limit_key_name = self.limit_per_unit = self.max_amount_for_group = None
@@ -99,7 +178,7 @@ class AdditionalHoursFactorData:
         if factor_data:
             self.group_ID = factor_data.get('group ID')
 
-            group = next((item for item in groups if item.get("group ID") == self.group_ID), None)
+            group = catalog.additional_hours_groups.get(self.group_ID)
 
             self.limit_key_name = next(item for item in factor_data.keys() if item.startswith('limit per '))
             self.limit_per_unit = factor_data.get(self.limit_key_name)
@@ -108,13 +187,8 @@ class AdditionalHoursFactorData:
 
 
 def __get_factor_value(factor_name, sector_name='major factors'):
-    base_path = os.path.dirname(__file__)
-    with open(
-            os.path.join(base_path, "data/additional_hours_factors.json"), 'r', encoding='utf8'
-    ) as json_file:
-        return next((
-            item.get('value') for item in json.load(json_file).get(sector_name) if item.get('factor ID') == factor_name
-        ), None)
+    factor = get_regulation_catalog().get_factor(factor_name, sector_name)
+    return factor.get('value') if factor else None
 
 
 def get_major_factors_value(name):
@@ -126,23 +200,25 @@ def get_job_time_hours_limit(name):
 
 
 class ExamsFactors:
-    factor_for_written_exam = factor_for_oral_exam = min_students_number = max_summary_hours = 0
-    __base_path = os.path.dirname(__file__)
-    with open(
-            os.path.join(__base_path, "data/additional_hours_factors.json"), 'r', encoding='utf8'
-    ) as __json_file:
-        __data = json.load(__json_file).get('exams')
-        for __rec in __data:
-            if __rec.get('factor ID') == 'k':
-                factor_for_written_exam = __rec.get('value for written')
-                factor_for_oral_exam = __rec.get('value for oral')
-            if __rec.get('factor ID') == 'N_min':
-                min_students_number = __rec.get('value')
-            if __rec.get('factor ID') == 'sum_max':
-                max_summary_hours = __rec.get('limit per year')
+    """
+    Exams factors based on 'exams' section of data/additional_hours_factors.json file, read at creation time
+    """
+    def __init__(self):
+        data = get_regulation_catalog().sectors.get('exams', {})
+
+        self.factor_for_written_exam = self.factor_for_oral_exam = self.min_students_number = 0
+        self.max_summary_hours = 0
+        if data.get('k'):
+            self.factor_for_written_exam = data['k'].get('value for written')
+            self.factor_for_oral_exam = data['k'].get('value for oral')
+        if data.get('N_min'):
+            self.min_students_number = data['N_min'].get('value')
+        if data.get('sum_max'):
+            self.max_summary_hours = data['sum_max'].get('limit per year')
 
 
 def get_exam_hours(module, _type):
+    exams_factors = ExamsFactors()
     return module.main_order.students_number * (
-        ExamsFactors.factor_for_written_exam if _type != 'Oral' else ExamsFactors.factor_for_oral_exam
+        exams_factors.factor_for_written_exam if _type != 'Oral' else exams_factors.factor_for_oral_exam
     )
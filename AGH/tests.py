@@ -0,0 +1,40 @@
+import json
+import os
+import shutil
+import tempfile
+
+from django.test import SimpleTestCase
+
+from .AGH_utils import DATA_PATH, RegulationCatalog
+from .data.constants import BADAWCZO_DYDAKTYCZNA, DYDAKTYCZNA
+
+
+class RegulationCatalogTests(SimpleTestCase):
+    def setUp(self):
+        self.data_path = tempfile.mkdtemp()
+        for file_name in os.listdir(DATA_PATH):
+            if file_name.endswith('.json'):
+                shutil.copy(os.path.join(DATA_PATH, file_name), self.data_path)
+        self.catalog = RegulationCatalog(data_path=self.data_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.data_path)
+
+    def test_lookups(self):
+        catalog = self.catalog.refresh()
+        self.assertEqual(catalog.pensum_thresholds[DYDAKTYCZNA]['prof. agh'], 315)
+        self.assertEqual(catalog.pensum_thresholds[BADAWCZO_DYDAKTYCZNA]['adiunkt'], 240)
+        self.assertEqual(catalog.reduction_values['Rektor'], 150)
+        self.assertEqual(catalog.get_factor('full-time hours limit', 'job-time hours limits')['value'], 2.0)
+        self.assertIn('bachelor thesis', catalog.additional_hours_factors)
+
+    def test_reload_on_file_change(self):
+        self.assertEqual(self.catalog.refresh().reduction_values['Rektor'], 150)
+        file_path = os.path.join(self.data_path, RegulationCatalog.PENSUM_REDUCTION_FILE)
+        with open(file_path, 'w', encoding='utf8') as json_file:
+            json.dump([{'function': 'Rektor', 'value': 1}], json_file)
+        stat = os.stat(file_path)
+        os.utime(file_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        # files are not checked again until CHECK_INTERVAL passes
+        self.assertEqual(self.catalog.refresh().reduction_values['Rektor'], 150)
+        self.assertEqual(self.catalog.refresh(force=True).reduction_values['Rektor'], 1)
@@ -36,6 +36,7 @@ INSTALLED_APPS = [
     'orders.apps.OrdersConfig',
     'modules.apps.ModulesConfig',
     'employees.apps.EmployeesConfig',
+    'jobs.apps.JobsConfig',
     'rest_framework',
     'django.contrib.admin',
     'django.contrib.auth',
@@ -117,8 +118,16 @@ AUTH_PASSWORD_VALIDATORS = [
 
 REST_FRAMEWORK = {
     'TEST_REQUEST_DEFAULT_FORMAT': 'json',
+    # opt-in pagination (with ?page_size=N or ?cursor=...), lists are not paginated by default
+    'DEFAULT_PAGINATION_CLASS': 'utils.pagination.KeysetPagination',
+    'PAGE_SIZE': 100,
+    # ?search=... on views with search_fields, other query parameters on views with filter_lookups
+    'DEFAULT_FILTER_BACKENDS': ['utils.filters.LookupsFilterBackend', 'rest_framework.filters.SearchFilter'],
 }
 
+# number of processes validating CSV files uploaded with ?dry_run=1 (number of CPUs by default)
+CSV_VALIDATION_PROCESSES = int(environ.get('CSV_VALIDATION_PROCESSES', default=0)) or None
+
 # Internationalization
 # https://docs.djangoproject.com/en/3.1/topics/i18n/
 
@@ -18,6 +18,7 @@ from django.urls import include, path, re_path
 from rest_framework_nested.routers import DefaultRouter, NestedDefaultRouter
 
 from employees import views as employees_views
+from jobs import views as jobs_views
 from modules import views as modules_views
 from orders import views as orders_views
 from schedules import views as schedules_views
@@ -75,10 +76,19 @@ order_plans_router.register(r'order/plans', orders_views.PlansViewSet, basename=
 schedules_router.register(r'orders', orders_views.OrdersViewSet, basename='orders')
 # generates:
 # /schedules/{schedule_slug}/orders/
+plans_bulk_paths = [
+    re_path(r'^schedules/(?P<schedule_slug>[^/.]+)/plans/bulk/$',
+            orders_views.PlansBulkViewSet.as_view({'post': 'create'}),
+            name='plans-bulk')]
+# /schedules/{schedule_slug}/plans/bulk/
 schedules_router.register(r'pensums', schedules_views.PensumViewSet, basename='pensums')
 # generates:
 # /schedules/{schedule_slug}/pensum/
 # /schedules/{schedule_slug}/pensum/{employee}
+schedules_router.register(
+    r'available_employees', schedules_views.AvailableEmployeesViewSet, basename='available_employees')
+# generates:
+# /schedules/{schedule_slug}/available_employees/
 pensum_router = NestedDefaultRouter(schedules_router, r'pensums', lookup='pensums')
 pensum_reduction_paths = [
     re_path(r'^schedules/(?P<schedule_slug>[^/.]+)/pensums/(?P<pensums_employee>[^/.]+)/reduction/$',
@@ -108,6 +118,10 @@ pensum_router.register(
 # generates:
 # /schedules/{schedule_slug}/pensum/{pensums_employee}/exams_additional_hours/
 # /schedules/{schedule_slug}/pensum/{pensums_employee}/exams_additional_hours/{pk}
+schedules_router.register(r'jobs', jobs_views.JobsViewSet, basename='jobs')
+# generates:
+# /schedules/{schedule_slug}/jobs/
+# /schedules/{schedule_slug}/jobs/{pk}
 
 router.register(r'syllabus', syllabus_views.SyllabusView, basename='syllabus')
 # generates:
@@ -131,6 +145,7 @@ urlpatterns = [
     path('API/', include(modules_router.urls)),
     path('API/', include(classes_order_paths)),
     path('API/', include(order_plans_router.urls)),
+    path('API/', include(plans_bulk_paths)),
     path('API/', include(syllabus_paths)),
     path('', views.home, name='home'),
     path('admin/', admin.site.urls),
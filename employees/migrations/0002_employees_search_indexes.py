@@ -0,0 +1,16 @@
+# Generated by Django 3.1.3 on 2026-10-18 20:01
+
+from django.db import migrations
+
+from utils.db import trigram_indexes
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('employees', '0001_initial'),
+    ]
+
+    operations = [
+        trigram_indexes('employees_employees', ['abbreviation', 'first_name', 'last_name']),
+    ]
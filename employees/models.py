@@ -26,6 +26,7 @@ class Positions(models.Model):
 class Employees(models.Model):
     class Meta:
         ordering = ['abbreviation']
+        # searching by name is served by trigram indexes on PostgreSQL only (see migrations)
 
     PENSUM_GROUPS_CHOICES = [
         (DYDAKTYCZNA, DYDAKTYCZNA),
@@ -1,13 +1,17 @@
-from rest_framework.relations import SlugRelatedField
+from rest_framework.fields import IntegerField
+from rest_framework.relations import HyperlinkedIdentityField
 from rest_framework.serializers import HyperlinkedModelSerializer, ModelSerializer
 
+from utils.relations import PrefetchedSlugRelatedField, TemplateHyperlinkedIdentityField
 from .models import Degrees, Employees, Positions
 
 
 class EmployeeListSerializer(HyperlinkedModelSerializer):
     """
     Employee Short Serializer - simple serializer with url and very basic model fields
+    (url is reversed once for the whole list - see TemplateHyperlinkedIdentityField)
     """
+    serializer_url_field = TemplateHyperlinkedIdentityField
 
     class Meta:
         model = Employees
@@ -30,6 +34,20 @@ class DegreeSerializer(HyperlinkedModelSerializer):
     employees = EmployeeListSerializer(read_only=True, many=True)
 
 
+class DegreeLightSerializer(HyperlinkedModelSerializer):
+    """
+    Degree Light Serializer - serializer with url, model's field, number of employees (annotated, see DegreeViewSet)
+    and url of their list
+    """
+
+    class Meta:
+        model = Degrees
+        fields = ['url', 'name', 'employees_count', 'employees_url']
+
+    employees_count = IntegerField(source='employees_count_value', read_only=True)
+    employees_url = HyperlinkedIdentityField(view_name='degrees-employees')
+
+
 class PositionSerializer(HyperlinkedModelSerializer):
     """
     Position Serializer - serializer with url, model's field and additional employee list
@@ -42,6 +60,20 @@ class PositionSerializer(HyperlinkedModelSerializer):
     employees = EmployeeListSerializer(read_only=True, many=True)
 
 
+class PositionLightSerializer(HyperlinkedModelSerializer):
+    """
+    Position Light Serializer - serializer with url, model's field, number of employees (annotated, see
+    PositionViewSet) and url of their list
+    """
+
+    class Meta:
+        model = Positions
+        fields = ['url', 'name', 'employees_count', 'employees_url']
+
+    employees_count = IntegerField(source='employees_count_value', read_only=True)
+    employees_url = HyperlinkedIdentityField(view_name='positions-employees')
+
+
 class EmployeeSerializer(ModelSerializer):
     """
     Employee Serializer - Extended Employee Serializer with additional urls and nested serializers
@@ -56,5 +88,5 @@ class EmployeeSerializer(ModelSerializer):
             'part_of_job_time': {'min_value': 0, 'max_value': 1}
         }
 
-    degree = SlugRelatedField(slug_field='name', queryset=Degrees.objects.all())
-    position = SlugRelatedField(slug_field='name', queryset=Positions.objects.all())
+    degree = PrefetchedSlugRelatedField(slug_field='name', queryset=Degrees.objects.all())
+    position = PrefetchedSlugRelatedField(slug_field='name', queryset=Positions.objects.all())
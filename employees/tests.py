@@ -1,8 +1,11 @@
 import json
 
+from django.core.files.uploadedfile import SimpleUploadedFile
+from rest_framework import status
 from rest_framework.reverse import reverse
 from rest_framework.test import APIClient, APIRequestFactory, APITestCase
 
+from utils.csv_import import CSVImporter
 from utils.random_generators import random_max_len_field_str, random_str
 from utils.tests import BasicAPITests
 from .models import Degrees, Employees, Positions
@@ -186,4 +189,144 @@ class EmployeesTests(BasicAPITests, APITestCase):
         for field in EmployeeFields.string_fields:
             cls.invalid_partial_data['empty ' + field] = {field: ''}
             cls.invalid_partial_data['too long ' + field] = {
-                field: random_max_len_field_str(cls.model, EmployeeFields.first_name) + random_str(1)}
\ No newline at end of file
+                field: random_max_len_field_str(cls.model, EmployeeFields.first_name) + random_str(1)}
+
+
+class EmployeesCSVUploadTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.url = reverse('employees-csv-files-upload')
+        cls.degree = Degrees.objects.create(name='dr')
+        cls.position = Positions.objects.create(name='adiunkt')
+        Employees.objects.create(first_name='Jan', last_name='Kowalski', abbreviation='jk', e_mail='jk@ab.ba',
+                                 degree=cls.degree, position=cls.position)
+
+    def upload(self, method, rows):
+        content = 'first_name,last_name,abbreviation,degree,position,e_mail,part_of_job_time\n'
+        content += ''.join(','.join(row) + '\n' for row in rows)
+        response = getattr(self.client, method)(
+            self.url, {'employees': SimpleUploadedFile('employees.csv', content.encode())}, format='multipart')
+        return response.status_code, response.data['employees file']
+
+    def test_create(self):
+        rows = [(f'Name{i}', f'Surname{i}', f'e{i}', 'dr', 'adiunkt', f'e{i}@ab.ba', '0.5') for i in range(10)]
+        # queries do not depend on rows number (prefetch, existing and unique values, insert and refresh of pks)
+        with self.assertNumQueries(8):
+            status_code, data = self.upload('post', rows)
+        self.assertEqual(status_code, status.HTTP_200_OK)
+        self.assertEqual(len(data), 10)
+        self.assertEqual(data['e3@ab.ba'][0]['abbreviation'], 'e3')
+        self.assertEqual(Employees.objects.get(abbreviation='e3').part_of_job_time, 0.5)
+
+    def test_update_or_create(self):
+        status_code, data = self.upload('put', [
+            ('Janusz', 'Kowalski', 'jk', 'dr', 'adiunkt', 'jk@ab.ba', '1'),
+            ('Anna', 'Nowak', 'an', 'dr', 'adiunkt', 'an@ab.ba', '1'),
+        ])
+        self.assertEqual(status_code, status.HTTP_200_OK)
+        self.assertEqual(Employees.objects.get(e_mail='jk@ab.ba').first_name, 'Janusz')
+        self.assertEqual(Employees.objects.count(), 2)
+        self.assertEqual(data['an@ab.ba'][0]['first_name'], 'Anna')
+
+    def test_rows_errors(self):
+        employees_count = Employees.objects.count()
+        status_code, data = self.upload('post', [
+            # abbreviation used in database, unknown degree, abbreviation used by previous row
+            ('Jan', 'Nowak', 'jk', 'dr', 'adiunkt', 'jn@ab.ba', '1'),
+            ('Anna', 'Nowak', 'an', 'unknown', 'adiunkt', 'an@ab.ba', '1'),
+            ('Adam', 'Nowak', 'ad', 'dr', 'adiunkt', 'ad@ab.ba', '1'),
+            ('Adam', 'Nowacki', 'ad', 'dr', 'adiunkt', 'ad2@ab.ba', '1'),
+        ])
+        self.assertEqual(status_code, status.HTTP_200_OK)
+        self.assertEqual(list(data['jn@ab.ba'][0]), ['abbreviation'])
+        self.assertEqual(list(data['an@ab.ba'][0]), ['degree'])
+        self.assertEqual(data['ad@ab.ba'][0]['abbreviation'], 'ad')
+        self.assertEqual(list(data['ad2@ab.ba'][0]), ['abbreviation'])
+        self.assertEqual(Employees.objects.count(), employees_count + 1)
+
+    def test_unique_values_of_invalid_row(self):
+        # values of invalid row are not taken by the import
+        status_code, data = self.upload('post', [
+            ('Anna', 'Nowak', 'zz', 'unknown', 'adiunkt', 'an@ab.ba', '1'),
+            ('Adam', 'Nowak', 'zz', 'dr', 'adiunkt', 'ad@ab.ba', '1'),
+        ])
+        self.assertEqual(status_code, status.HTTP_200_OK)
+        self.assertEqual(list(data['an@ab.ba'][0]), ['degree'])
+        self.assertEqual(data['ad@ab.ba'][0]['abbreviation'], 'zz')
+        self.assertTrue(Employees.objects.filter(abbreviation='zz').exists())
+
+    def test_export(self):
+        Employees.objects.create(first_name='Anna', last_name='Nowak', abbreviation='an', e_mail='an@ab.ba',
+                                 degree=self.degree, position=self.position)
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('employees-list'), {'format': 'csv'})
+            content = b''.join(response.streaming_content).decode()
+        self.assertEqual(content.splitlines(), ['first_name,last_name,abbreviation,degree,position,e_mail',
+                                                'Anna,Nowak,an,dr,adiunkt,an@ab.ba',
+                                                'Jan,Kowalski,jk,dr,adiunkt,jk@ab.ba'])
+        response = self.client.get(reverse('employees-list'), {'format': 'ndjson', 'search': 'Nowak'})
+        lines = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([(line['abbreviation'], line['part_of_job_time']) for line in lines], [('an', 1)])
+
+    def test_no_files(self):
+        self.assertEqual(self.client.post(self.url).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_dry_run(self):
+        employees_count = Employees.objects.count()
+        response = self.client.post(self.url + '?dry_run=1', {'employees': SimpleUploadedFile('employees.csv', (
+            'first_name,last_name,abbreviation,degree,position,e_mail,part_of_job_time\n'
+            'Jan,Nowak,jk,dr,adiunkt,jn@ab.ba,1\n'
+            'Anna,Nowak,an,dr,adiunkt,an@ab.ba,1\n'
+            'Adam,Nowak,an,unknown,adiunkt,ad@ab.ba,2\n'
+        ).encode())}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        report = response.data['employees file']
+        self.assertEqual((report['rows'], report['invalid']), (3, 2))
+        # rows are reported by their lines
+        self.assertEqual(list(report['errors'][2]), ['abbreviation'])
+        self.assertEqual(sorted(report['errors'][4]), ['abbreviation', 'degree', 'part_of_job_time'])
+        self.assertEqual(Employees.objects.count(), employees_count)
+
+    def test_dry_run_validation_pool(self):
+        rows = [{'first_name': 'Name', 'last_name': 'Surname', 'abbreviation': f'e{i % 5}', 'degree': 'dr',
+                 'position': 'adiunkt' if i % 7 else 'unknown', 'e_mail': f'e{i}@ab.ba', 'part_of_job_time': '1'}
+                for i in range(10)]
+        # chunks validated by separate processes, abbreviation of invalid first row is free for the sixth one
+        report = CSVImporter(EmployeeSerializer(), Employees, 'e_mail').dry_run(rows, chunk_size=3)
+        self.assertEqual(report['rows'], 10)
+        self.assertEqual(sorted(report['errors']), [2, 8, 9, 10, 11])
+        self.assertEqual(list(report['errors'][2]), ['position'])
+        self.assertEqual(list(report['errors'][8]), ['abbreviation'])
+        self.assertEqual(sorted(report['errors'][9]), ['abbreviation', 'position'])
+
+
+class DegreesPositionsEmployeesTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.degree = Degrees.objects.create(name='dr')
+        for name in ['adiunkt', 'profesor']:
+            position = Positions.objects.create(name=name)
+            for i in range(3):
+                Employees.objects.create(first_name='Jan', last_name='Kowalski', abbreviation=f'{name[:2]}{i}',
+                                         e_mail=f'{name}{i}@ab.ba', degree=cls.degree, position=position)
+
+    def test_employees_prefetched(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('positions-list'))
+        self.assertEqual([[employee['abbreviation'] for employee in data['employees']] for data in response.data],
+                         [['ad0', 'ad1', 'ad2'], ['pr0', 'pr1', 'pr2']])
+        self.assertEqual(response.data[0]['employees'][0]['url'],
+                         'http://testserver' + reverse('employees-detail', kwargs={'abbreviation': 'ad0'}))
+
+    def test_light_mode(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('degrees-list'), {'light': '1'})
+        self.assertEqual(response.data[0]['employees_count'], 6)
+        self.assertNotIn('employees', response.data[0])
+
+        # employees' list paginated
+        response = self.client.get(response.data[0]['employees_url'], {'page_size': 4})
+        self.assertEqual([data['abbreviation'] for data in response.data['results']], ['ad0', 'ad1', 'ad2', 'pr0'])
+        response = self.client.get(response.data['next'])
+        self.assertEqual([data['abbreviation'] for data in response.data['results']], ['pr1', 'pr2'])
+        self.assertIsNone(response.data['next'])
@@ -1,16 +1,58 @@
+from django.db.models import Count
 from rest_framework import mixins
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.settings import api_settings
 from rest_framework.viewsets import GenericViewSet, ModelViewSet
-from rest_framework_csv.renderers import CSVRenderer
+from rest_framework_csv.renderers import CSVRenderer, CSVStreamingRenderer
 
+from schedules.signals import employees_changed
+from utils.ViewSets import StreamingExportMixin
+from utils.filters import TRUE_VALUES
 from utils.serializers import read_csv_files
+from utils.streaming import NDJSONRenderer
 from .models import Degrees, Employees, Positions
-from .serializers import DegreeSerializer, EmployeeListSerializer, EmployeeSerializer, PositionSerializer
+from .serializers import (DegreeLightSerializer, DegreeSerializer, EmployeeListSerializer, EmployeeSerializer,
+                          PositionLightSerializer, PositionSerializer)
 
 
-class DegreeViewSet(mixins.CreateModelMixin,
+class EmployeesGroupMixin:
+    """
+    Common part of Degree and Position View Sets - employees of all listed degrees / positions are prefetched with one
+    query. With ?light=1 only number of employees and url of employees action are listed (see light_serializer_class),
+    so size of the list does not depend on number of employees.
+    """
+    light_serializer_class = None
+
+    def is_light(self):
+        return self.request.query_params.get('light') in TRUE_VALUES
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'employees':
+            return queryset
+        if self.is_light():
+            return queryset.annotate(employees_count_value=Count('employees'))
+        return queryset.prefetch_related('employees')
+
+    def get_serializer_class(self):
+        if self.is_light() and self.action in ('list', 'retrieve'):
+            return self.light_serializer_class
+        return super().get_serializer_class()
+
+    @action(detail=True, methods=['GET'])
+    def employees(self, request, *args, **kwargs):
+        """
+        Employees of degree / position - paginated with ?page_size=N (see KeysetPagination)
+        """
+        queryset = self.get_object().employees.all()
+        page = self.paginate_queryset(queryset)
+        serializer = EmployeeListSerializer(queryset if page is None else page, many=True, context={'request': request})
+        return Response(serializer.data) if page is None else self.get_paginated_response(serializer.data)
+
+
+class DegreeViewSet(EmployeesGroupMixin,
+                    mixins.CreateModelMixin,
                     mixins.RetrieveModelMixin,
                     mixins.UpdateModelMixin,
                     mixins.ListModelMixin,
@@ -19,9 +61,11 @@ class DegreeViewSet(mixins.CreateModelMixin,
     Degrees View Set
     Create, Retrieve, Update degrees
     Deleting not allowed
+    Use ?light=1 to list number of employees instead of their list
     """
     queryset = Degrees.objects.all()
     serializer_class = DegreeSerializer
+    light_serializer_class = DegreeLightSerializer
     renderer_classes = tuple(api_settings.DEFAULT_RENDERER_CLASSES) + (CSVRenderer,)
 
     # Customizing header for CSV format
@@ -36,6 +80,7 @@ class DegreeViewSet(mixins.CreateModelMixin,
         """
         Action to upload CSV file(s).
         POST method will try to create new records.
+        With ?dry_run=1 files are only validated and a report of invalid rows (by line) is returned.
         Handled column headers:
          - REQUIRED:
         'name' - unique string,
@@ -43,18 +88,21 @@ class DegreeViewSet(mixins.CreateModelMixin,
         return read_csv_files(self=self, request=request, model=Degrees, lookup='name')
 
 
-class PositionViewSet(mixins.CreateModelMixin,
+class PositionViewSet(EmployeesGroupMixin,
+                      mixins.CreateModelMixin,
                       mixins.RetrieveModelMixin,
                       mixins.UpdateModelMixin,
                       mixins.ListModelMixin,
                       GenericViewSet):
     """
     Positions View Set
-    Create, Retrieve, Update degrees
+    Create, Retrieve, Update positions
     Deleting not allowed
+    Use ?light=1 to list number of employees instead of their list
     """
     queryset = Positions.objects.all()
     serializer_class = PositionSerializer
+    light_serializer_class = PositionLightSerializer
     renderer_classes = tuple(api_settings.DEFAULT_RENDERER_CLASSES) + (CSVRenderer,)
 
     # Customizing header for CSV format
@@ -69,6 +117,7 @@ class PositionViewSet(mixins.CreateModelMixin,
         """
         Action to upload CSV file(s).
         POST method will try to create new records.
+        With ?dry_run=1 files are only validated and a report of invalid rows (by line) is returned.
         Handled column headers:
          - REQUIRED:
         'name' - unique string,
@@ -76,34 +125,44 @@ class PositionViewSet(mixins.CreateModelMixin,
         return read_csv_files(self=self, request=request, model=Positions, lookup='name')
 
 
-class EmployeeRenderer(CSVRenderer):
+class EmployeeRenderer(CSVStreamingRenderer):
     """
     Custom CSV Renderer for Employee View Set
     Needs custom import CSV format action -> method csv_files_upload()
+    Renders rows one by one (see EmployeeViewSet.list)
     """
     header = ['first_name', 'last_name', 'abbreviation', 'degree', 'position', 'e_mail']
 
 
-class EmployeeViewSet(ModelViewSet):
+class EmployeeViewSet(StreamingExportMixin, ModelViewSet):
     """
     Employees View Set
     Create, Retrieve, Update, Delete employees
+    List is exported (streamed) in CSV and NDJSON formats
     """
     queryset = Employees.objects.all()
     serializer_class = EmployeeSerializer
-    renderer_classes = tuple(api_settings.DEFAULT_RENDERER_CLASSES) + (EmployeeRenderer,)
+    renderer_classes = tuple(api_settings.DEFAULT_RENDERER_CLASSES) + (EmployeeRenderer, NDJSONRenderer)
     # Custom lookup_field - needs entry in extra_kwargs of serializer!
     lookup_field = 'abbreviation'
+    export_filename = 'employees'
+    search_fields = ['abbreviation', 'first_name', 'last_name']
+    filter_lookups = {
+        'abbreviation': 'abbreviation__istartswith',
+        'degree': 'degree__name',
+        'position': 'position__name',
+        'pensum_group': 'pensum_group',
+    }
 
     # Custom list method with simpler serializer
     def list(self, request, *args, **kwargs):
-        queryset = Employees.objects.all()
-        # list full data of each employee for csv, short version otherwise
-        if request.query_params.get('format') == 'csv':
-            serializer = EmployeeSerializer(queryset, many=True, context={'request': request})
-        else:
-            serializer = EmployeeListSerializer(queryset, many=True, context={'request': request})
-        return Response(serializer.data)
+        queryset = self.filter_queryset(self.get_queryset())
+        # stream full data of each employee for exports, short version otherwise
+        if self.is_export():
+            return self.export_response(queryset.select_related('degree', 'position'))
+        page = self.paginate_queryset(queryset)
+        serializer = EmployeeListSerializer(queryset if page is None else page, many=True, context={'request': request})
+        return Response(serializer.data) if page is None else self.get_paginated_response(serializer.data)
 
     # Action for uploading data in format of CSV files - match it with EmployeeRenderer
     @action(detail=False, methods=['PUT', 'POST'])
@@ -112,6 +171,7 @@ class EmployeeViewSet(ModelViewSet):
         Action to upload CSV file(s).
         POST method will try to create new records.
         PUT method will update existing or create new records.
+        With ?dry_run=1 files are only validated and a report of invalid rows (by line) is returned.
         Handled column headers:
          - REQUIRED:
         'first_name' - string,
@@ -124,4 +184,4 @@ class EmployeeViewSet(ModelViewSet):
         'pensum_group' - 'badawczo-dydaktyczna'/'dydaktyczna', default='dydaktyczna',
         'part_of_job_time' - float from 0-1 range, default=1
         """
-        return read_csv_files(self=self, request=request, model=Employees, lookup='e_mail')
+        return read_csv_files(self=self, request=request, model=Employees, lookup='e_mail', saved=employees_changed)
@@ -0,0 +1,90 @@
+import logging
+import multiprocessing
+import threading
+import time
+from contextlib import contextmanager
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection, connections
+
+logger = logging.getLogger(__name__)
+
+
+@contextmanager
+def heartbeat(job, interval):
+    """
+    Marks job as still running every interval seconds (see Jobs.release_stale), until the block is left
+    """
+    stop = threading.Event()
+
+    def beat():
+        while not stop.wait(interval):
+            try:
+                job.beat()
+            except Exception:
+                logger.exception("Heartbeat of %s failed", job)
+                close_old_connections()
+        # thread's own connection
+        connection.close()
+
+    thread = threading.Thread(target=beat, daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def work_once(poll_interval, heartbeat_interval):
+    """
+    Claims and runs the next pending job (or waits poll_interval seconds if there is none). Errors (e.g. lost database
+    connection) are logged, so they never stop the worker.
+    """
+    from jobs.models import Jobs
+
+    try:
+        job = Jobs.claim_next()
+        if job:
+            with heartbeat(job, heartbeat_interval):
+                job.run()
+        else:
+            time.sleep(poll_interval)
+    except Exception:
+        logger.exception("Jobs worker error")
+        time.sleep(poll_interval)
+    finally:
+        close_old_connections()
+
+
+def work(poll_interval, heartbeat_interval):
+    while True:
+        work_once(poll_interval, heartbeat_interval)
+
+
+class Command(BaseCommand):
+    help = "Starts pool of worker processes executing pending background jobs"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=multiprocessing.cpu_count())
+        parser.add_argument('--poll-interval', type=float, default=1, help="seconds to wait when there are no jobs")
+        parser.add_argument('--heartbeat-interval', type=float, default=30,
+                            help="seconds between marks of running jobs as still running")
+
+    def handle(self, *args, **options):
+        # forked processes cannot share DB connections - each of them opens its own
+        connections.close_all()
+        processes = [
+            multiprocessing.Process(target=work, args=(options['poll_interval'], options['heartbeat_interval']),
+                                    daemon=True)
+            for _ in range(options['processes'])
+        ]
+        for process in processes:
+            process.start()
+        self.stdout.write(f"Started {len(processes)} worker process(es)")
+        try:
+            for process in processes:
+                process.join()
+        except KeyboardInterrupt:
+            for process in processes:
+                process.terminate()
@@ -0,0 +1,23 @@
+# Generated by Django 3.1.3 on 2026-10-18 20:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobs', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jobs',
+            name='attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='jobs',
+            name='heartbeat',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
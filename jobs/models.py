@@ -0,0 +1,118 @@
+import traceback
+from datetime import timedelta
+
+from django.db import models
+from django.db.models import F, Q
+from django.utils import timezone
+
+from schedules.models import Schedules
+from .tasks import TASKS
+
+
+class Jobs(models.Model):
+    """
+    Background job - long running task executed by the worker process (see run_jobs_worker management command)
+    """
+    class Meta:
+        ordering = ['-pk']
+
+    PENDING = 'Pending'
+    RUNNING = 'Running'
+    DONE = 'Done'
+    FAILED = 'Failed'
+    STATUSES = [
+        (PENDING, PENDING),
+        (RUNNING, RUNNING),
+        (DONE, DONE),
+        (FAILED, FAILED),
+    ]
+
+    # running job without heartbeat for that long is considered abandoned by its worker (see release_stale)
+    STALE_AFTER = timedelta(minutes=5)
+    # number of claims of a job - abandoned job is failed instead of being requeued after that many claims
+    MAX_ATTEMPTS = 2
+
+    schedule = models.ForeignKey(Schedules, on_delete=models.CASCADE, related_name='jobs', null=True, blank=True)
+    name = models.CharField(max_length=128)
+    params = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=len(PENDING), choices=STATUSES, default=PENDING, db_index=True)
+    progress = models.FloatField(default=0)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    started = models.DateTimeField(null=True, blank=True)
+    finished = models.DateTimeField(null=True, blank=True)
+    # last sign of life of the worker running the job
+    heartbeat = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name} job ({self.status})" + (f" of {self.schedule}" if self.schedule_id else "")
+
+    @classmethod
+    def enqueue(cls, name, schedule=None, **params):
+        """
+        Creates pending job for registered task
+
+        params: name - name of the task (see jobs.tasks.register_task)
+        params: schedule - (optional) schedule the job is listed under
+        params: params - JSON serializable kwargs of the task
+        return: job instance
+        """
+        if name not in TASKS:
+            raise ValueError(f"Task {name} is not registered.")
+        return cls.objects.create(name=name, schedule=schedule, params=params)
+
+    @classmethod
+    def claim_next(cls):
+        """
+        Marks the oldest pending job as running - conditional update makes sure only one worker gets the job
+
+        return: job instance or None if there is no pending job
+        """
+        cls.release_stale()
+        for pk in cls.objects.filter(status=cls.PENDING).order_by('pk').values_list('pk', flat=True)[:10]:
+            now = timezone.now()
+            if cls.objects.filter(pk=pk, status=cls.PENDING).update(
+                    status=cls.RUNNING, started=now, heartbeat=now, attempts=F('attempts') + 1):
+                return cls.objects.get(pk=pk)
+        return None
+
+    @classmethod
+    def release_stale(cls):
+        """
+        Requeues running jobs abandoned by their workers (no heartbeat for STALE_AFTER), jobs claimed MAX_ATTEMPTS
+        times already are failed
+        """
+        now = timezone.now()
+        stale = cls.objects.filter(Q(heartbeat__lt=now - cls.STALE_AFTER) |
+                                   Q(heartbeat__isnull=True, started__lt=now - cls.STALE_AFTER), status=cls.RUNNING)
+        stale.filter(attempts__lt=cls.MAX_ATTEMPTS).update(status=cls.PENDING, progress=0, started=None,
+                                                           heartbeat=None)
+        stale.update(status=cls.FAILED, error="Worker stopped responding.", finished=now)
+
+    def beat(self):
+        """
+        Marks the job as still running (see release_stale)
+        """
+        Jobs.objects.filter(pk=self.pk, status=self.RUNNING).update(heartbeat=timezone.now())
+
+    def set_progress(self, progress):
+        """
+        params: progress - float from 0-1 range
+        """
+        self.progress = progress
+        Jobs.objects.filter(pk=self.pk).update(progress=progress, heartbeat=timezone.now())
+
+    def run(self):
+        try:
+            result = TASKS[self.name](self, **self.params)
+        except Exception:
+            self.status = self.FAILED
+            self.error = traceback.format_exc()
+        else:
+            self.status = self.DONE
+            self.progress = 1
+            self.result = result
+        self.finished = timezone.now()
+        self.save(update_fields=['status', 'progress', 'result', 'error', 'finished'])
@@ -0,0 +1,24 @@
+from rest_framework.relations import SlugRelatedField
+from rest_framework_nested.serializers import NestedHyperlinkedModelSerializer
+
+from utils.relations import AdvNestedHyperlinkedIdentityField
+from .models import Jobs
+
+
+class JobSerializer(NestedHyperlinkedModelSerializer):
+    class Meta:
+        model = Jobs
+        fields = ['url', 'pk', 'schedule', 'name', 'params', 'status', 'progress', 'result', 'error',
+                  'created', 'started', 'finished', 'heartbeat', 'attempts']
+        read_only_fields = fields
+
+    parent_lookup_kwargs = {
+        'schedule_slug': 'schedule__slug'
+    }
+
+    url = AdvNestedHyperlinkedIdentityField(
+        view_name='jobs-detail',
+        lookup_field='pk',
+        parent_lookup_kwargs=parent_lookup_kwargs
+    )
+    schedule = SlugRelatedField(slug_field='slug', read_only=True)
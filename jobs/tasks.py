@@ -0,0 +1,17 @@
+# registry of functions that can be run as background jobs: {name: function}
+TASKS = {}
+
+
+def register_task(name):
+    """
+    Decorator registering function as a task, that can be enqueued with Jobs.enqueue(name, ...).
+    Function is called by the worker with job instance (for progress reports) and job's params as kwargs and should
+    return JSON serializable result.
+
+    params: name - unique name of the task
+    """
+    def decorator(func):
+        TASKS[name] = func
+        return func
+
+    return decorator
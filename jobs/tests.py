@@ -0,0 +1,92 @@
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.reverse import reverse
+from rest_framework.test import APITestCase
+
+from employees.models import Employees
+from schedules.models import Pensum
+from schedules.tests import create_schedule_data
+from .models import Jobs
+from .tasks import register_task
+
+
+@register_task('failing_test_task')
+def failing_test_task(job):
+    raise ValueError('failure')
+
+
+class JobsTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.schedule = create_schedule_data()
+        Pensum.objects.filter(employee__abbreviation='emp0').update(basic_threshold=100)
+
+    def test_background_action_is_enqueued_and_run(self):
+        response = self.client.get(
+            reverse('pensums-recalculate-pensum-values-for-employees-of-current-schedule',
+                    kwargs={'schedule_slug': self.schedule.slug}), {'background': 1})
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['status'], Jobs.PENDING)
+        # nothing is done until worker claims the job
+        self.assertEqual(Pensum.objects.get(employee__abbreviation='emp0').basic_threshold, 100)
+
+        job = Jobs.claim_next()
+        self.assertEqual(job.pk, response.data['pk'])
+        self.assertIsNone(Jobs.claim_next())
+        job.run()
+        self.assertEqual(Pensum.objects.get(employee__abbreviation='emp0').basic_threshold, 360)
+
+        response = self.client.get(response.data['url'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['status'], Jobs.DONE)
+        self.assertEqual(response.data['progress'], 1)
+        self.assertEqual(len(response.data['result']), Pensum.objects.filter(schedule=self.schedule).count())
+
+    def test_check_and_overwrite_in_background(self):
+        response = self.client.post(
+            reverse('pensums-check-and-overwrite-pensum-values-for-all-employees',
+                    kwargs={'schedule_slug': self.schedule.slug}) + '?background=1')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        Jobs.claim_next().run()
+        job = Jobs.objects.get(pk=response.data['pk'])
+        self.assertEqual(job.status, Jobs.DONE, job.error)
+        self.assertEqual(len(job.result), Employees.objects.count())
+
+    def test_failed_job(self):
+        job = Jobs.enqueue('failing_test_task', schedule=self.schedule)
+        Jobs.claim_next().run()
+        job.refresh_from_db()
+        self.assertEqual(job.status, Jobs.FAILED)
+        self.assertIn('ValueError: failure', job.error)
+        self.assertIsNotNone(job.finished)
+
+        response = self.client.get(reverse('jobs-list', kwargs={'schedule_slug': self.schedule.slug}))
+        self.assertEqual([data['pk'] for data in response.data], [job.pk])
+
+    def test_stale_job_requeued_then_failed(self):
+        job = Jobs.enqueue('failing_test_task', schedule=self.schedule)
+        self.assertEqual(Jobs.claim_next().pk, job.pk)
+        # worker died - no heartbeat since
+        Jobs.objects.filter(pk=job.pk).update(heartbeat=timezone.now() - Jobs.STALE_AFTER * 2)
+        self.assertEqual(Jobs.claim_next().pk, job.pk)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Jobs.RUNNING, 2))
+
+        Jobs.objects.filter(pk=job.pk).update(heartbeat=timezone.now() - Jobs.STALE_AFTER * 2)
+        self.assertIsNone(Jobs.claim_next())
+        job.refresh_from_db()
+        self.assertEqual(job.status, Jobs.FAILED)
+        self.assertIn('stopped responding', job.error)
+
+    def test_running_job_with_heartbeat_kept(self):
+        job = Jobs.enqueue('failing_test_task', schedule=self.schedule)
+        Jobs.claim_next()
+        Jobs.objects.filter(pk=job.pk).update(started=timezone.now() - Jobs.STALE_AFTER * 2)
+        job.beat()
+        Jobs.release_stale()
+        job.refresh_from_db()
+        self.assertEqual(job.status, Jobs.RUNNING)
+
+    def test_unknown_task(self):
+        with self.assertRaises(ValueError):
+            Jobs.enqueue('unknown')
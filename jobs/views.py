@@ -0,0 +1,35 @@
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.viewsets import ReadOnlyModelViewSet
+from rest_framework_nested.viewsets import NestedViewSetMixin
+
+from .models import Jobs
+from .serializers import JobSerializer
+
+
+class JobsViewSet(NestedViewSetMixin, ReadOnlyModelViewSet):
+    """
+    Jobs View Set
+    Status, progress and results of schedule's background jobs
+    """
+    queryset = Jobs.objects.all()
+    serializer_class = JobSerializer
+
+
+def enqueue_job_response(request, name, schedule=None, **params):
+    """
+    Enqueues background job and returns response with its data
+
+    params: request - request object (for hyper-links)
+    params: name, schedule, params - see Jobs.enqueue
+    return: Response with 202 status
+    """
+    job = Jobs.enqueue(name, schedule=schedule, **params)
+    return Response(JobSerializer(job, context={'request': request}).data, status=status.HTTP_202_ACCEPTED)
+
+
+def is_background_request(request):
+    """
+    Checks if client asked for running action in the background (?background=1)
+    """
+    return request.query_params.get('background') in ('1', 'true', 'True')
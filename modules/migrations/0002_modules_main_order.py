@@ -0,0 +1,36 @@
+# Generated by Django 3.1.3 on 2026-10-18 19:55
+
+from django.db import migrations, models
+from django.db.models import Case, IntegerField, Value, When
+import django.db.models.deletion
+
+
+def fill_main_order(apps, schema_editor):
+    Modules = apps.get_model('modules', 'Modules')
+    modules = {}
+    # lectures' order or the first (by classes' name) order of module's classes
+    for module, order in apps.get_model('orders', 'Orders').objects.order_by(
+            'classes__module',
+            Case(When(classes__name='Lectures', then=Value(0)), default=Value(1), output_field=IntegerField()),
+            'classes__name'
+    ).values_list('classes__module', 'pk'):
+        modules.setdefault(module, order)
+    Modules.objects.bulk_update(
+        [Modules(pk=pk, main_order_id=order) for pk, order in modules.items()], ['main_order'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0002_orders_remaining_hours'),
+        ('modules', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='modules',
+            name='main_order',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='orders.orders'),
+        ),
+        migrations.RunPython(fill_main_order, migrations.RunPython.noop),
+    ]
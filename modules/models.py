@@ -1,19 +1,116 @@
-from django.core.exceptions import ObjectDoesNotExist
 from django.db import models
+from django.db.models import Case, FloatField, IntegerField, Max, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
 
 from schedules.models import Schedules
 
+# names of module's classes for classes' hours properties of Modules
+CLASSES_HOURS = {
+    'lectures_hours': 'Lectures',
+    'laboratory_classes_hours': 'Laboratory_classes',
+    'auditorium_classes_hours': 'Auditorium_classes',
+    'project_classes_hours': 'Project_classes',
+    'seminar_classes_hours': 'Seminar_classes',
+}
+
+
+class ModulesQuerySet(models.QuerySet):
+    def with_classes_hours(self):
+        """
+        Annotates modules with hours of each form of classes (pivot of module's classes in a single query,
+        0 if module has no such classes - see Modules.CLASSES_HOURS_ANNOTATIONS)
+
+        return: annotated queryset
+        """
+        return self.annotate(**{
+            f'{field}_value': Coalesce(
+                Max(Case(When(form_of_classes__name=name, then='form_of_classes__classes_hours'),
+                         output_field=IntegerField())),
+                Value(0), output_field=IntegerField())
+            for field, name in CLASSES_HOURS.items()
+        })
+
+    def with_exams_portion_staffed(self):
+        """
+        Annotates modules with sum of portions of their exams already staffed (see Modules.exams_portion_staffed)
+
+        return: annotated queryset
+        """
+        from schedules.models import ExamsAdditionalHours
+
+        portions = ExamsAdditionalHours.objects.filter(module=OuterRef('pk')).order_by().values('module').annotate(
+            total=Sum('portion')).values('total')
+        return self.annotate(exams_portion_staffed_value=Coalesce(
+            Subquery(portions, output_field=FloatField()), Value(0.0), output_field=FloatField()))
+
+    def unstaffed_exams(self, pensum=None, include=None):
+        """
+        Filters examination modules with exams left to staff - modules with main order and sum of exams' portions
+        below 1, in a single query
+
+        params: pensum - pensum (or its pk) whose exams' modules are excluded
+        params: include - pk of module included anyway (e.g. module of edited exam)
+        return: filtered queryset (annotated with exams_portion_staffed_value)
+        """
+        condition = Q(examination=True, main_order__isnull=False, exams_portion_staffed_value__lt=1)
+        if pensum is not None:
+            condition &= ~Q(exams_additional_hours__pensum=pensum)
+        if include is not None:
+            condition |= Q(pk=include)
+        return self.with_exams_portion_staffed().filter(condition)
+
+    def refresh_main_order(self):
+        """
+        Sets main order of modules - order of lectures or the first (by classes' name) order of module's classes.
+        Needs to be called whenever module's orders or classes' names change.
+        Main order's students number is used for exams additional hours, so totals of pensums with exams of modules
+        whose main order changed are refreshed as well.
+        """
+        from orders.models import Orders
+        from schedules.signals import schedule_totals_refresh
+
+        current = dict(self.values_list('pk', 'main_order'))
+        modules = dict.fromkeys(current)
+        for module, order in Orders.objects.filter(classes__module__in=modules).order_by(
+                'classes__module',
+                Case(When(classes__name='Lectures', then=Value(0)), default=Value(1), output_field=IntegerField()),
+                'classes__name'
+        ).values_list('classes__module', 'pk'):
+            if modules[module] is None:
+                modules[module] = order
+        changed = [pk for pk, order in modules.items() if order != current[pk]]
+        if changed:
+            Modules.objects.bulk_update(
+                [Modules(pk=pk, main_order_id=modules[pk]) for pk in changed], ['main_order'], batch_size=500)
+            # bulk update sends no signals
+            schedule_totals_refresh(Q(exams_additional_hours__module__in=changed))
+
 
 class Modules(models.Model):
     class Meta:
         ordering = ['module_code']
         unique_together = (('module_code', 'schedule'),)
+        # searching by name is served by trigram indexes on PostgreSQL only (see migrations)
+
+    objects = ModulesQuerySet.as_manager()
 
     module_code = models.SlugField(max_length=45)
     name = models.CharField(max_length=256)
     examination = models.BooleanField(default=False)
     schedule = models.ForeignKey(Schedules, on_delete=models.CASCADE, related_name='modules')
     language = models.CharField(max_length=2, default='pl')
+    # denormalized order used for exams (see ModulesQuerySet.refresh_main_order)
+    main_order = models.ForeignKey('orders.Orders', on_delete=models.SET_NULL, related_name='+', null=True, blank=True,
+                                   editable=False)
+
+    # values annotated by ModulesQuerySet.with_classes_hours()
+    CLASSES_HOURS_ANNOTATIONS = [f'{field}_value' for field in CLASSES_HOURS]
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # annotated values are outdated after change
+        for name in self.CLASSES_HOURS_ANNOTATIONS + ['exams_portion_staffed_value']:
+            self.__dict__.pop(name, None)
 
     def __str__(self):
         return f'{self.module_code}' + (f' (name: {self.name})' if self.name else '') + f' module of {self.schedule}'
@@ -21,44 +118,37 @@ class Modules(models.Model):
     def __repr__(self):
         return self.module_code
 
-    @property
-    def main_order(self):
-        try:
-            classes = self.form_of_classes.exclude(order=None).get(name='Lectures')
-        except ObjectDoesNotExist:
-            classes = self.form_of_classes.exclude(order=None).first()
-        return classes.order if classes else None
-
     @property
     def exams_portion_staffed(self):
+        if hasattr(self, 'exams_portion_staffed_value'):
+            return self.exams_portion_staffed_value
         return sum([x.portion for x in self.exams_additional_hours.all()])
 
     @property
     def lectures_hours(self):
-        return self.__return_classes_hours(name='Lectures')
+        return self.__return_classes_hours('lectures_hours')
 
     @property
     def laboratory_classes_hours(self):
-        return self.__return_classes_hours(name='Laboratory_classes')
+        return self.__return_classes_hours('laboratory_classes_hours')
 
     @property
     def auditorium_classes_hours(self):
-        return self.__return_classes_hours(name='Auditorium_classes')
+        return self.__return_classes_hours('auditorium_classes_hours')
 
     @property
     def project_classes_hours(self):
-        return self.__return_classes_hours(name='Project_classes')
+        return self.__return_classes_hours('project_classes_hours')
 
     @property
     def seminar_classes_hours(self):
-        return self.__return_classes_hours(name='Seminar_classes')
-
-    def __return_classes_hours(self, name):
-        try:
-            classes = self.classes.filter(name=name).first()
-            return classes.classes_hours if classes else 0
-        except Exception as e:
-            return None
+        return self.__return_classes_hours('seminar_classes_hours')
+
+    def __return_classes_hours(self, field):
+        if hasattr(self, f'{field}_value'):
+            return getattr(self, f'{field}_value')
+        classes = self.form_of_classes.filter(name=CLASSES_HOURS[field]).first()
+        return classes.classes_hours if classes else 0
 
 
 class Classes(models.Model):
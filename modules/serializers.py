@@ -1,10 +1,23 @@
+from collections import Counter, defaultdict
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+from rest_framework.serializers import ListSerializer
 from rest_framework_nested.serializers import NestedHyperlinkedModelSerializer
 
+from orders.models import Orders
 from orders.serializers import ClassesOrderSerializer
 from schedules.models import Schedules
+from schedules.signals import schedule_totals_refresh
 from utils.relations import AdvNestedHyperlinkedIdentityField, ParentHiddenRelatedField
 from .models import Classes, Modules
 
+# number of rows created or updated in a single query
+BULK_BATCH_SIZE = 500
+
 
 class ClassSerializer(NestedHyperlinkedModelSerializer):
     """
@@ -53,6 +66,102 @@ class ClassSerializer(NestedHyperlinkedModelSerializer):
     )
 
 
+class ModuleListSerializer(ListSerializer):
+    """
+    Module List Serializer - creates or updates many modules (with their classes) at once.
+    Modules and classes are found by their natural keys (module's code and schedule, classes' name),
+    then created or updated in bulk (missing classes in data are not deleted).
+    """
+
+    def validate(self, attrs):
+        keys = Counter((item.get('schedule'), item.get('module_code')) for item in attrs)
+        duplicates = {module_code for (schedule, module_code), count in keys.items() if count > 1}
+        if duplicates:
+            raise ValidationError(f"Modules sent more than once: {', '.join(sorted(duplicates))}.")
+        return attrs
+
+    @staticmethod
+    def natural_keys_filter(keys):
+        """
+        params: keys - iterable of modules' natural keys (schedule's pk and module's code)
+        return: Q object matching modules with given natural keys
+        """
+        module_codes = defaultdict(set)
+        for schedule, module_code in keys:
+            module_codes[schedule].add(module_code)
+        return reduce(or_, [Q(schedule=schedule, module_code__in=codes) for schedule, codes in module_codes.items()],
+                      Q(pk__in=[]))
+
+    def create(self, validated_data):
+        existing = {
+            (module.schedule_id, module.module_code): module for module in Modules.objects.filter(
+                self.natural_keys_filter((item['schedule'].pk, item['module_code']) for item in validated_data))
+        }
+        modules_classes = []
+        to_create = []
+        to_update = []
+        updated_fields = set()
+        for item in validated_data:
+            form_of_classes = item.pop('form_of_classes')
+            module = existing.get((item['schedule'].pk, item['module_code']))
+            if module:
+                for key, value in item.items():
+                    setattr(module, key, value)
+                updated_fields.update(item.keys())
+                to_update.append(module)
+            else:
+                module = Modules(**item)
+                to_create.append(module)
+            modules_classes.append((module, form_of_classes))
+
+        with transaction.atomic():
+            Modules.objects.bulk_create(to_create, batch_size=BULK_BATCH_SIZE)
+            if to_create and to_create[0].pk is None:
+                # primary keys are not set by bulk_create() on some databases (e.g. SQLite)
+                created = {(module.schedule_id, module.module_code): module.pk for module in Modules.objects.filter(
+                    self.natural_keys_filter((module.schedule_id, module.module_code) for module in to_create))}
+                for module in to_create:
+                    module.pk = created[(module.schedule_id, module.module_code)]
+            updated_fields -= {'schedule', 'module_code'}
+            if to_update and updated_fields:
+                Modules.objects.bulk_update(to_update, updated_fields, batch_size=BULK_BATCH_SIZE)
+                # language decides about plans additional hours (signals are not sent by bulk update)
+                schedule_totals_refresh(Q(employee__plans__order__classes__module__in=to_update))
+            save_modules_classes(modules_classes)
+        return list(Modules.objects.filter(pk__in=[module.pk for module, _ in modules_classes]).prefetch_related(
+            'schedule', 'form_of_classes__order__plans__employee'))
+
+
+def save_modules_classes(modules_classes):
+    """
+    Creates or updates (by their names) classes of modules in bulk (missing classes in data are not deleted)
+
+    params: modules_classes - list of tuples: module instance and list of its classes' validated data
+    """
+    existing = {(classes.module_id, classes.name): classes
+                for classes in Classes.objects.filter(module__in=[module for module, _ in modules_classes])}
+    to_create = []
+    to_update = []
+    updated_fields = set()
+    for module, form_of_classes in modules_classes:
+        for classes_data in form_of_classes:
+            classes_data['module'] = module
+            classes = existing.get((module.pk, classes_data.get('name')))
+            if classes:
+                for key, value in classes_data.items():
+                    setattr(classes, key, value)
+                updated_fields.update(classes_data.keys())
+                to_update.append(classes)
+            else:
+                to_create.append(Classes(**classes_data))
+    Classes.objects.bulk_create(to_create, batch_size=BULK_BATCH_SIZE)
+    updated_fields -= {'module', 'name'}
+    if to_update and updated_fields:
+        Classes.objects.bulk_update(to_update, updated_fields, batch_size=BULK_BATCH_SIZE)
+        # classes' hours and students limit per group decide about order's hours (see orders.signals)
+        Orders.objects.filter(classes__in=to_update).refresh_remaining_hours()
+
+
 class ModuleSerializer(NestedHyperlinkedModelSerializer):
     """
     Module Serializer - serializer with url, some of the model's fields and additional properties:
@@ -61,6 +170,7 @@ class ModuleSerializer(NestedHyperlinkedModelSerializer):
 
     class Meta:
         model = Modules
+        list_serializer_class = ModuleListSerializer
         fields = ['url',
                   'module_code', 'name',
                   'examination', 'language',
@@ -99,26 +209,28 @@ class ModuleSerializer(NestedHyperlinkedModelSerializer):
         }
     )
 
+    def get_validators(self):
+        # modules sent in bulk are created or updated by their natural key (see ModuleListSerializer)
+        if isinstance(self.parent, ModuleListSerializer):
+            return []
+        return super().get_validators()
+
     # overwrite for handling nested classes (this will not delete missing classes in data)
     def create(self, validated_data):
         form_of_classes = validated_data.pop('form_of_classes')
-        module = Modules.objects.create(**validated_data)
-        for classes_data in form_of_classes:
-            classes_data['module'] = module
-            Classes.objects.create(**classes_data)
+        with transaction.atomic():
+            module = Modules.objects.create(**validated_data)
+            save_modules_classes([(module, form_of_classes)])
         return module
 
     # overwrite for handling nested classes (this will not delete missing classes in data)
     def update(self, instance, validated_data):
         form_of_classes = validated_data.pop('form_of_classes')
-        Modules.objects.filter(pk=instance.pk).update(**validated_data)
-        for classes_data in form_of_classes:
-            classes_data['module'] = instance
-            classes = Classes.objects.filter(module=instance, name=classes_data.get('name'))
-            if classes:
-                classes.update(**classes_data)
-            else:
-                Classes.objects.create(**classes_data)
+        with transaction.atomic():
+            Modules.objects.filter(pk=instance.pk).update(**validated_data)
+            # language decides about plans additional hours (post_save is not sent by update)
+            schedule_totals_refresh(Q(employee__plans__order__classes__module=instance.pk))
+            save_modules_classes([(instance, form_of_classes)])
         return Modules.objects.get(pk=instance.pk)
 
 
@@ -0,0 +1,160 @@
+import csv
+import io
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.reverse import reverse
+from rest_framework.test import APITestCase
+
+from orders.models import Orders
+from schedules.models import Schedules
+from .models import Classes, Modules
+
+
+class ModulesMainOrderTests(TestCase):
+    def setUp(self):
+        schedule = Schedules.objects.create(slug='test')
+        self.module = Modules.objects.create(module_code='mod', name='Module', schedule=schedule)
+        self.laboratories = Classes.objects.create(module=self.module, name='Laboratory_classes', classes_hours=15)
+        self.lectures = Classes.objects.create(module=self.module, name='Lectures', classes_hours=30)
+
+    def main_order(self):
+        return Modules.objects.get(pk=self.module.pk).main_order
+
+    def test_main_order_follows_orders(self):
+        self.assertIsNone(self.main_order())
+        laboratories_order = Orders.objects.create(classes=self.laboratories, students_number=20)
+        self.assertEqual(self.main_order(), laboratories_order)
+        lectures_order = Orders.objects.create(classes=self.lectures, students_number=40)
+        self.assertEqual(self.main_order(), lectures_order)
+        lectures_order.delete()
+        self.assertEqual(self.main_order(), laboratories_order)
+        self.laboratories.delete()
+        self.assertIsNone(self.main_order())
+
+    def test_main_order_follows_classes_name(self):
+        Orders.objects.create(classes=self.laboratories, students_number=20)
+        lectures_order = Orders.objects.create(classes=self.lectures, students_number=40)
+        self.lectures.name = 'Seminar_classes'
+        self.lectures.save()
+        self.assertEqual(self.main_order().pk, self.laboratories.pk)
+        self.lectures.name = 'Lectures'
+        self.lectures.save()
+        self.assertEqual(self.main_order(), lectures_order)
+
+    def test_refresh_main_order(self):
+        Orders.objects.create(classes=self.lectures, students_number=40)
+        Modules.objects.update(main_order=None)
+        Modules.objects.all().refresh_main_order()
+        self.assertEqual(self.main_order().pk, self.lectures.pk)
+
+
+class ModulesCSVTests(APITestCase):
+    def setUp(self):
+        schedule = Schedules.objects.create(slug='test')
+        for i in range(3):
+            module = Modules.objects.create(module_code=f'mod{i}', name=f'Module {i}', schedule=schedule)
+            Classes.objects.create(module=module, name='Lectures', classes_hours=30 + i)
+            Classes.objects.create(module=module, name='Seminar_classes', classes_hours=15)
+
+    def test_list_csv_in_single_query(self):
+        url = reverse('modules-list', kwargs={'schedule_slug': 'test'})
+        with self.assertNumQueries(1):
+            response = self.client.get(url, {'format': 'csv'})
+            content = b''.join(response.streaming_content).decode()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        rows = list(csv.reader(io.StringIO(content)))
+        self.assertEqual(rows[0], ['module_code', 'name', 'examination', 'lectures_hours', 'laboratory_classes_hours',
+                                   'auditorium_classes_hours', 'project_classes_hours', 'seminar_classes_hours'])
+        self.assertEqual(rows[1:], [[f'mod{i}', f'Module {i}', 'False', str(30 + i), '0', '0', '0', '15']
+                                    for i in range(3)])
+
+    def test_retrieve_csv(self):
+        url = reverse('modules-detail', kwargs={'schedule_slug': 'test', 'module_code': 'mod1'})
+        response = self.client.get(url, {'format': 'csv'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(list(csv.reader(io.StringIO(response.content.decode())))[1],
+                         ['mod1', 'Module 1', 'False', '31', '0', '0', '0', '15'])
+        # properties without annotations
+        self.assertEqual(Modules.objects.get(module_code='mod1').lectures_hours, 31)
+
+
+class ModulesBulkTests(APITestCase):
+    def setUp(self):
+        Schedules.objects.create(slug='test')
+        self.url = reverse('modules-list', kwargs={'schedule_slug': 'test'})
+
+    def modules_data(self, number):
+        return [{'module_code': f'mod{i}', 'name': f'Module {i}',
+                 'form_of_classes': [{'name': 'Lectures', 'classes_hours': 30},
+                                     {'name': 'Laboratory_classes', 'classes_hours': 15,
+                                      'students_limit_per_group': 12}]}
+                for i in range(number)]
+
+    def test_create_in_constant_number_of_queries(self):
+        with CaptureQueriesContext(connection) as few:
+            self.client.post(self.url, self.modules_data(2), format='json')
+        Modules.objects.all().delete()
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.post(self.url, self.modules_data(20), format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(few), len(many))
+        self.assertEqual(Modules.objects.count(), 20)
+        self.assertEqual(Classes.objects.count(), 40)
+        self.assertEqual(len(response.json()[0]['form_of_classes']), 2)
+
+    def test_update_existing_modules_and_classes(self):
+        self.client.post(self.url, self.modules_data(3), format='json')
+        order = Orders.objects.create(classes=Classes.objects.get(module__module_code='mod1', name='Lectures'),
+                                      students_number=10)
+        data = self.modules_data(4)
+        data[1]['name'] = 'Changed'
+        data[1]['form_of_classes'] = [{'name': 'Lectures', 'classes_hours': 45},
+                                      {'name': 'Seminar_classes', 'classes_hours': 10}]
+        response = self.client.post(self.url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(Modules.objects.count(), 4)
+        module = Modules.objects.get(module_code='mod1')
+        self.assertEqual(module.name, 'Changed')
+        # missing classes are not deleted
+        self.assertEqual(sorted(module.form_of_classes.values_list('name', 'classes_hours')),
+                         [('Laboratory_classes', 15), ('Lectures', 45), ('Seminar_classes', 10)])
+        order.refresh_from_db()
+        self.assertEqual(order.remaining_hours, 45)
+
+    def test_duplicated_modules(self):
+        response = self.client.post(self.url, self.modules_data(2) * 2, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Modules.objects.exists())
+
+    def test_single_module_update(self):
+        self.client.post(self.url, self.modules_data(1), format='json')
+        url = reverse('modules-detail', kwargs={'schedule_slug': 'test', 'module_code': 'mod0'})
+        data = self.modules_data(1)[0]
+        data['form_of_classes'][1]['classes_hours'] = 20
+        response = self.client.put(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(Classes.objects.get(module__module_code='mod0', name='Laboratory_classes').classes_hours, 20)
+
+
+class ModulesFiltersTests(APITestCase):
+    def setUp(self):
+        schedule = Schedules.objects.create(slug='test')
+        Modules.objects.create(module_code='abc-1', name='Algebra', schedule=schedule, examination=True)
+        Modules.objects.create(module_code='abc-2', name='Linear algebra', schedule=schedule)
+        Modules.objects.create(module_code='xyz-1', name='Physics', schedule=schedule, examination=True)
+        self.url = reverse('modules-list', kwargs={'schedule_slug': 'test'})
+
+    def module_codes(self, **params):
+        return [data['module_code'] for data in self.client.get(self.url, params).data]
+
+    def test_filters(self):
+        self.assertEqual(self.module_codes(search='ALGEBRA'), ['abc-1', 'abc-2'])
+        self.assertEqual(self.module_codes(search='1'), ['abc-1', 'xyz-1'])
+        self.assertEqual(self.module_codes(module_code='abc'), ['abc-1', 'abc-2'])
+        self.assertEqual(self.module_codes(name='lin'), ['abc-2'])
+        self.assertEqual(self.module_codes(examination='true'), ['abc-1', 'xyz-1'])
+        self.assertEqual(self.module_codes(examination='0'), ['abc-2'])
+        self.assertEqual(self.module_codes(examination='1', search='abc'), ['abc-1'])
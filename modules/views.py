@@ -1,47 +1,68 @@
+from django.db.models import Q
 from rest_framework.response import Response
 from rest_framework.settings import api_settings
 from rest_framework.viewsets import ModelViewSet
-from rest_framework_csv.renderers import CSVRenderer
+from rest_framework_csv.renderers import CSVStreamingRenderer
 from rest_framework_nested.viewsets import NestedViewSetMixin
 
-from .models import Classes, Modules
+from utils.ViewSets import StreamingExportMixin
+from utils.filters import flag
+from utils.streaming import NDJSONRenderer
+from .models import CLASSES_HOURS, Classes, Modules
 from .serializers import ClassSerializer, ModuleFlatSerializer, ModuleSerializer
 
 
-class ModuleRenderer(CSVRenderer):
+class ModuleRenderer(CSVStreamingRenderer):
     """
     Custom CSV Renderer for Module View Set
-    Keeps proper column arrangement
+    Keeps proper column arrangement, renders rows one by one (see ModuleViewSet.list)
     """
-    classes_hours = ['lectures_hours', 'laboratory_classes_hours', 'auditorium_classes_hours', 'project_classes_hours',
-                     'seminar_classes_hours']
+    classes_hours = list(CLASSES_HOURS)
     header = ['module_code', 'name', 'examination'] + classes_hours
 
 
-class ModuleViewSet(NestedViewSetMixin, ModelViewSet):
+class ModuleViewSet(StreamingExportMixin, NestedViewSetMixin, ModelViewSet):
     """
     Modules View Set
     Create, Retrieve, Update, Delete modules
+    List is exported (streamed) in CSV and NDJSON formats
     """
     queryset = Modules.objects.all()
     serializer_class = ModuleSerializer
-    renderer_classes = tuple(api_settings.DEFAULT_RENDERER_CLASSES) + (ModuleRenderer,)
+    renderer_classes = tuple(api_settings.DEFAULT_RENDERER_CLASSES) + (ModuleRenderer, NDJSONRenderer)
     # Custom lookup_field - needs entry in extra_kwargs of serializer!
     lookup_field = 'module_code'
+    export_serializer_class = ModuleFlatSerializer
+    export_filename = 'modules'
+    search_fields = ['module_code', 'name']
+    filter_lookups = {
+        'module_code': 'module_code__istartswith',
+        'name': 'name__istartswith',
+        'examination': flag(Q(examination=True)),
+        'language': 'language',
+    }
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        # classes' hours of flat formats pivoted in the same query
+        if self.request.query_params.get('format') in ('csv', 'ndjson'):
+            queryset = queryset.with_classes_hours()
+        return queryset
 
     # Custom list method with different serializers for different formats
     def list(self, request, *args, **kwargs):
-        # list flat data of each employee for CSV format
-        if request.query_params.get('format') == 'csv':
-            serializer = ModuleFlatSerializer(self.get_queryset(), many=True, context={'request': request})
-        else:
-            serializer = ModuleSerializer(self.get_queryset(), many=True, context={'request': request})
-        return Response(serializer.data)
+        queryset = self.filter_queryset(self.get_queryset())
+        # stream flat data of each module for exports
+        if self.is_export():
+            return self.export_response(queryset)
+        page = self.paginate_queryset(queryset)
+        serializer = ModuleSerializer(queryset if page is None else page, many=True, context={'request': request})
+        return Response(serializer.data) if page is None else self.get_paginated_response(serializer.data)
 
     # Custom retrieve method with different serializers for different formats
     def retrieve(self, request, *args, **kwargs):
-        # get flat data of employee instance for CSV format
-        if request.query_params.get('format') == 'csv':
+        # get flat data of module instance for CSV and NDJSON formats
+        if request.query_params.get('format') in ('csv', 'ndjson'):
             serializer = ModuleFlatSerializer(instance=self.get_object(), context={'request': request})
         else:
             serializer = ModuleSerializer(instance=self.get_object(), context={'request': request})
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class OrdersConfig(AppConfig):
     name = 'orders'
+
+    def ready(self):
+        # connect receivers keeping Orders' remaining hours up to date
+        from . import signals  # noqa: F401
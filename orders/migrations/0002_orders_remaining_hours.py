@@ -0,0 +1,34 @@
+# Generated by Django 3.1.3 on 2026-10-18 19:53
+
+from math import ceil
+
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def fill_remaining_hours(apps, schema_editor):
+    Orders = apps.get_model('orders', 'Orders')
+    plans_sums = dict(apps.get_model('orders', 'Plans').objects.values('order').annotate(
+        total=Sum('plan_hours')).values_list('order', 'total'))
+    orders = list(Orders.objects.select_related('classes'))
+    for order in orders:
+        limit = order.classes.students_limit_per_group
+        groups_number = ceil(order.students_number / limit) if limit else 1
+        order.remaining_hours = groups_number * order.classes.classes_hours - (plans_sums.get(order.pk) or 0)
+    Orders.objects.bulk_update(orders, ['remaining_hours'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orders',
+            name='remaining_hours',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(fill_remaining_hours, migrations.RunPython.noop),
+    ]
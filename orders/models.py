@@ -1,19 +1,86 @@
 from math import ceil
 
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Case, ExpressionWrapper, F, IntegerField, OuterRef, Prefetch, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
 
 from AGH.AGH_utils import get_major_factors_value
 from employees.models import Employees
 from modules.models import Classes
 
 
+class OrdersQuerySet(models.QuerySet):
+    def with_metrics(self):
+        """
+        Annotates orders with metrics (see annotate_metrics) and prefetches plans with their employees, so listing
+        orders with nested plans costs constant number of queries.
+
+        return: annotated queryset
+        """
+        return self.select_related('classes__module__schedule').prefetch_related(
+            Prefetch('plans', queryset=Plans.objects.select_related('employee'))
+        ).annotate_metrics()
+
+    def refresh_remaining_hours(self):
+        """
+        Recalculates remaining hours counters of orders (see Orders.remaining_hours). Counters are locked before plans
+        are summed, so reservations of concurrent transactions (see orders.reservations) are not overwritten.
+        """
+        with transaction.atomic():
+            pks = list(Orders.objects.select_for_update().filter(pk__in=self.values('pk')).values_list(
+                'pk', flat=True))
+            Orders.objects.bulk_update([
+                Orders(pk=pk, remaining_hours=order_hours - plans_sum_hours)
+                for pk, order_hours, plans_sum_hours in Orders.objects.filter(pk__in=pks).annotate_metrics(
+                ).values_list('pk', 'order_hours_value', 'plans_sum_hours_value')
+            ], ['remaining_hours'], batch_size=500)
+
+    def annotate_metrics(self):
+        """
+        Annotates orders with groups number, order hours and plans summary hours calculated in SQL
+        (see Orders.METRICS_ANNOTATIONS)
+
+        return: annotated queryset
+        """
+        limit = F('classes__students_limit_per_group')
+        plans = Plans.objects.filter(order=OuterRef('pk')).order_by().values('order')
+        return self.annotate(
+            # ceil division on integers
+            groups_number_value=Case(
+                When(classes__students_limit_per_group__gt=0, then=ExpressionWrapper(
+                    (F('students_number') + limit - 1) / limit, output_field=IntegerField())),
+                default=Value(1), output_field=IntegerField()),
+            plans_sum_hours_value=Coalesce(
+                Subquery(plans.annotate(total=Sum('plan_hours')).values('total'), output_field=IntegerField()),
+                Value(0)),
+        ).annotate(
+            order_hours_value=ExpressionWrapper(
+                F('groups_number_value') * F('classes__classes_hours'), output_field=IntegerField()),
+        )
+
+
 class Orders(models.Model):
+    objects = OrdersQuerySet.as_manager()
+
     classes = models.OneToOneField(Classes, on_delete=models.CASCADE, related_name='order', primary_key=True)
     students_number = models.PositiveIntegerField()
     order_number = models.CharField(max_length=50, blank=True, null=True)
+    # order's hours not covered by plans - counter for race-free plan hours reservations (see orders.reservations)
+    remaining_hours = models.IntegerField(default=0)
+
+    # values annotated by OrdersQuerySet.with_metrics()
+    METRICS_ANNOTATIONS = ['groups_number_value', 'order_hours_value', 'plans_sum_hours_value']
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # annotated values are outdated after change
+        for name in self.METRICS_ANNOTATIONS:
+            self.__dict__.pop(name, None)
 
     @property
     def groups_number(self):
+        if hasattr(self, 'groups_number_value'):
+            return self.groups_number_value
         if self.classes.students_limit_per_group:
             return ceil(self.students_number / self.classes.students_limit_per_group)
         else:
@@ -21,10 +88,14 @@ class Orders(models.Model):
 
     @property
     def order_hours(self):
+        if hasattr(self, 'order_hours_value'):
+            return self.order_hours_value
         return self.groups_number * self.classes.classes_hours
 
     @property
     def plans_sum_hours(self):
+        if hasattr(self, 'plans_sum_hours_value'):
+            return self.plans_sum_hours_value
         return sum([_.plan_hours for _ in self.plans.all()])
 
     def __str__(self):
@@ -0,0 +1,93 @@
+from django.db.models import ExpressionWrapper, F, FloatField, Value
+from django.db.models.functions import Greatest, Least
+
+from schedules.models import Pensum, PensumTotals
+from .models import Orders, get_plans_additional_hours
+
+ORDER_HOURS_EXCEEDED = "Order's hours number cannot be exceeded by summary number of its plans hours."
+CONTACT_HOURS_EXCEEDED = "Employee's pensum contact hours limit cannot be exceeded."
+OVER_TIME_HOURS_EXCEEDED = "Employee's pensum additional hours limit cannot be exceeded."
+
+# Reservations of plan hours.
+# Every check-and-write is a single conditional UPDATE statement (... WHERE remaining >= hours) on denormalized
+# counters (Orders.remaining_hours and PensumTotals), so concurrent requests cannot over-allocate order or pensum and
+# only reserved rows are locked. Functions need to be called inside transaction.atomic() - raise an error to roll back
+# partial reservation. Absolute recalculations (OrdersQuerySet.refresh_remaining_hours, PensumTotals.refresh) lock
+# the same rows first, so they do not overwrite reservations of concurrent transactions.
+
+
+def reserve_order_hours(order_pk, hours):
+    """
+    Reserves (or releases if hours are negative) hours of order
+
+    params: order_pk - order's pk
+    params: hours - number of hours
+    return: None if hours were reserved or reason why they could not be
+    """
+    orders = Orders.objects.filter(pk=order_pk)
+    if hours > 0:
+        orders = orders.filter(remaining_hours__gte=hours)
+    if hours and not orders.update(remaining_hours=F('remaining_hours') - hours):
+        return ORDER_HOURS_EXCEEDED
+    return None
+
+
+def reserve_pensum_hours(pensum_pk, contact_hours, additional_hours):
+    """
+    Reserves (or releases if hours are negative) contact hours and plans additional hours in pensum's totals
+
+    params: pensum_pk - pensum's pk
+    params: contact_hours - number of plan hours
+    params: additional_hours - number of plans additional hours (see orders.models.get_plans_additional_hours)
+    return: None if hours were reserved or reason why they could not be
+    """
+    if not contact_hours and not additional_hours:
+        return None
+    PensumTotals.refresh(Pensum.objects.filter(pk=pensum_pk, totals__isnull=True))
+    over_time_hours = contact_hours + additional_hours
+    totals = PensumTotals.objects.filter(pk=pensum_pk)
+    if contact_hours > 0:
+        totals = totals.filter(amount_until_contact_hours_limit__gte=contact_hours)
+    if over_time_hours > 0:
+        totals = totals.filter(amount_until_over_time_hours_limit__gte=over_time_hours)
+    # right hand side values are values before update
+    updated = totals.update(
+        pensum_contact_hours=F('pensum_contact_hours') + contact_hours,
+        pensum_additional_hours=F('pensum_additional_hours') + additional_hours,
+        amount_until_over_time_hours_limit=F('amount_until_over_time_hours_limit') - over_time_hours,
+        amount_until_contact_hours_limit=Least(
+            ExpressionWrapper(F('limit_for_contact_hours') - F('pensum_contact_hours') - contact_hours,
+                              output_field=FloatField()),
+            F('amount_until_over_time_hours_limit') - over_time_hours,
+            output_field=FloatField()),
+        amount_until_contact_hours_min=Greatest(
+            ExpressionWrapper(F('min_for_contact_hours') - F('pensum_contact_hours') - contact_hours,
+                              output_field=FloatField()),
+            Value(0.0), output_field=FloatField()),
+    )
+    if not updated:
+        if PensumTotals.objects.get(pk=pensum_pk).amount_until_over_time_hours_limit < over_time_hours:
+            return OVER_TIME_HOURS_EXCEEDED
+        return CONTACT_HOURS_EXCEEDED
+    return None
+
+
+def reserve_plan_hours(order, employee, hours):
+    """
+    Reserves (or releases if hours are negative) plan hours in order and in employee's pensum of order's schedule
+
+    params: order - order instance
+    params: employee - employee instance (or pk)
+    params: hours - number of plan hours
+    return: None if hours were reserved or reason why they could not be
+    """
+    if not hours:
+        return None
+    reason = reserve_order_hours(order.pk, hours)
+    if reason:
+        return reason
+    pensum_pk = Pensum.objects.filter(
+        schedule=order.classes.module.schedule_id, employee=employee).values_list('pk', flat=True).first()
+    if pensum_pk is None:
+        return None
+    return reserve_pensum_hours(pensum_pk, hours, get_plans_additional_hours(order.classes.module, hours))
@@ -1,17 +1,25 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Sum
+from django.db.models.functions import Coalesce
 from django.shortcuts import get_object_or_404
 from rest_framework.exceptions import ValidationError
-from rest_framework.fields import CharField
+from rest_framework.fields import CharField, IntegerField
 from rest_framework.relations import SlugRelatedField
+from rest_framework.serializers import Serializer
 from rest_framework.validators import UniqueValidator
 from rest_framework_nested.relations import NestedHyperlinkedRelatedField
 from rest_framework_nested.serializers import NestedHyperlinkedModelSerializer
 
 from employees.models import Employees
 from modules.models import Classes
-from schedules.models import Pensum, Schedules
+from schedules.calculations import calculate_pensums_values
+from schedules.models import Pensum, PensumTotals
 from utils.relations import AdvNestedHyperlinkedIdentityField, ParentHiddenRelatedField
-from utils.serializers import SerializerLambdaField
+from utils.serializers import SerializerLambdaField, get_request_cached_object
 from .models import Orders, Plans, get_plans_additional_hours
+from .reservations import reserve_order_hours, reserve_pensum_hours, reserve_plan_hours
 
 
 class ScheduledEmployeesField(SlugRelatedField):
@@ -32,11 +40,10 @@ class ScheduledEmployeesField(SlugRelatedField):
         # exclude plan's instance so it's employee can be present in Form
         if self.root.instance:
             plans = plans.exclude(employee=self.root.instance.employee)
-        pensums = Schedules.objects.get(
-            slug=self.context.get('request').resolver_match.kwargs.get('schedule_slug')
-        ).pensums.all()
         # exclude pensums with no more free hours
-        pensums = [pensum for pensum in pensums if pensum.amount_until_contact_hours_limit >= 1]
+        pensums = Pensum.objects.filter(
+            schedule__slug=self.context.get('request').resolver_match.kwargs.get('schedule_slug')
+        ).with_free_contact_hours(1)
         # return only employees possible to be chosen
         return self.queryset.filter(pensums__in=pensums).exclude(plans__in=plans)
 
@@ -112,9 +119,12 @@ class PlansSerializer(NestedHyperlinkedModelSerializer):
         # get filter kwargs from request's URL
         pensum_filter_kwargs = {
             'schedule__slug': url_kwargs['schedule_slug'],
-            'employee__abbreviation': self.initial_data.get('employee')}
-        # finding employee's pensum instance
-        pensum = get_object_or_404(Pensum, **pensum_filter_kwargs)
+            # partial update may not send employee
+            'employee__abbreviation': self.initial_data.get('employee') or (
+                self.instance.employee.abbreviation if self.instance else None)}
+        # finding employee's pensum instance (shared within request)
+        pensum = get_request_cached_object(self.context['request'], Pensum.objects.with_totals(),
+                                           **pensum_filter_kwargs)
         tmp = pensum.amount_until_contact_hours_limit + (self.instance.plan_hours if self.instance else 0)
         if data > tmp and (not max_value_to_set or max_value_to_set > tmp):
             max_value_to_set = tmp
@@ -133,6 +143,28 @@ class PlansSerializer(NestedHyperlinkedModelSerializer):
                                   f"{' Reason: {}'.format(reason) if reason else ''}")
         return data
 
+    def reserve_hours(self, order, employee, difference):
+        # check-and-write of limits validated above, race-free for concurrent requests
+        reason = reserve_plan_hours(order, employee, difference)
+        if reason:
+            raise ValidationError({'plan_hours': [reason]})
+
+    def create(self, validated_data):
+        with transaction.atomic():
+            self.reserve_hours(validated_data['order'], validated_data['employee'], validated_data['plan_hours'])
+            return super().create(validated_data)
+
+    def update(self, instance, validated_data):
+        with transaction.atomic():
+            employee = validated_data.get('employee', instance.employee)
+            plan_hours = validated_data.get('plan_hours', instance.plan_hours)
+            if employee == instance.employee:
+                self.reserve_hours(instance.order, employee, plan_hours - instance.plan_hours)
+            else:
+                self.reserve_hours(instance.order, instance.employee, -instance.plan_hours)
+                self.reserve_hours(instance.order, employee, plan_hours)
+            return super().update(instance, validated_data)
+
 
 class OrdersSerializer(NestedHyperlinkedModelSerializer):
     """
@@ -143,11 +175,12 @@ class OrdersSerializer(NestedHyperlinkedModelSerializer):
         model = Orders
         fields = ['url', 'module', 'module_url', 'classes_name', 'classes_url',
                   'students_number', 'groups_number', 'order_hours', 'order_number',
-                  'plans_url', 'plans_sum_hours', 'plans',
+                  'plans_url', 'plans_sum_hours', 'remaining_hours', 'plans',
                   # write only
                   'classes']
         extra_kwargs = {
-            'students_number': {'min_value': 0}
+            'students_number': {'min_value': 0},
+            'remaining_hours': {'read_only': True},
         }
 
     parent_lookup_kwargs = {
@@ -223,11 +256,12 @@ class ClassesOrderSerializer(OrdersSerializer):
     class Meta:
         model = Orders
         fields = ['url', 'students_number', 'groups_number', 'order_hours', 'order_number',
-                  'plans_url', 'plans_sum_hours', 'plans',
+                  'plans_url', 'plans_sum_hours', 'remaining_hours', 'plans',
                   # hidden
                   'classes']
         extra_kwargs = {
-            'students_number': {'min_value': 0}
+            'students_number': {'min_value': 0},
+            'remaining_hours': {'read_only': True},
         }
 
     classes = ParentHiddenRelatedField(
@@ -253,3 +287,146 @@ class EmployeePlansSerializer(PlansSerializer):
     order_hours = SerializerLambdaField(lambda obj: obj.order.order_hours)
     plans_sum_hours = SerializerLambdaField(lambda obj: obj.order.plans_sum_hours)
     employee_plan_hours = SerializerLambdaField(lambda obj: obj.plan_hours)
+
+
+class BulkPlanSerializer(Serializer):
+    """
+    Bulk Plan Serializer - single plan of bulk assignment, points order with module's code and classes' name
+    """
+    module_code = CharField()
+    classes_name = CharField()
+    employee = CharField()
+    plan_hours = IntegerField(min_value=0)
+
+
+class BulkPlansSerializer(Serializer):
+    """
+    Bulk Plans Serializer - creates or updates many plans of the schedule at once.
+    Order's hours and pensum's limits are validated for the whole batch from a few aggregate queries
+    (plans are validated in sequence, so every plan sees hours taken by the previous ones).
+    """
+    plans = BulkPlanSerializer(many=True)
+
+    def validate_plans(self, data):
+        # schedule's slug may be passed with context (when used outside of plans bulk endpoint)
+        schedule_slug = self.context.get('schedule_slug') or self.context['request'].resolver_match.kwargs.get(
+            'schedule_slug')
+        orders = {
+            (order.classes.module.module_code, order.classes.name): order
+            for order in Orders.objects.filter(
+                classes__module__schedule__slug=schedule_slug,
+                classes__module__module_code__in={item['module_code'] for item in data}
+            ).select_related('classes__module').annotate(
+                plans_hours=Coalesce(Sum('plans__plan_hours'), 0))
+        }
+        pensums = dict(Pensum.objects.filter(
+            schedule__slug=schedule_slug,
+            employee__abbreviation__in={item['employee'] for item in data}
+        ).values_list('employee__abbreviation', 'pk'))
+        pensums_values = calculate_pensums_values(Pensum.objects.filter(pk__in=pensums.values()))
+        existing_plans = {
+            (plan.order_id, plan.employee.abbreviation): plan
+            for plan in Plans.objects.filter(
+                order__in=[order.pk for order in orders.values()], employee__abbreviation__in=pensums.keys()
+            ).select_related('employee')
+        }
+        # hours still available: {order's pk: hours}, {pensum's pk: [contact hours, over time hours]}
+        orders_hours = {order.pk: order.order_hours - order.plans_hours for order in orders.values()}
+        pensums_hours = {
+            pk: [values['limit_for_contact_hours'] - values['pensum_contact_hours'],
+                 values['amount_until_over_time_hours_limit']]
+            for pk, values in pensums_values.items()
+        }
+
+        errors = []
+        seen = set()
+        for item in data:
+            errors.append({})
+            order = orders.get((item['module_code'], item['classes_name']))
+            pensum_pk = pensums.get(item['employee'])
+            if not order:
+                errors[-1]['classes_name'] = [f"Order of {item['module_code']} module's {item['classes_name']} "
+                                              f"classes does not exist in this schedule."]
+            if not pensum_pk:
+                errors[-1]['employee'] = [f"Employee {item['employee']} has no pensum in this schedule."]
+            if errors[-1]:
+                continue
+            if (order.pk, item['employee']) in seen:
+                errors[-1]['non_field_errors'] = ["Plan is duplicated within the batch."]
+                continue
+            seen.add((order.pk, item['employee']))
+
+            plan = existing_plans.get((order.pk, item['employee']))
+            old_hours = plan.plan_hours if plan else 0
+            factor = get_plans_additional_hours(order.classes.module, 1)
+            contact_hours, over_time_hours = pensums_hours[pensum_pk]
+            max_value_to_set = reason = None
+            # same limits as in PlansSerializer.validate_plan_hours
+            for tmp, tmp_reason in [
+                (orders_hours[order.pk] + old_hours,
+                 "Order's hours number cannot be exceeded by summary number of its plans hours."),
+                (min(contact_hours, over_time_hours) + old_hours,
+                 "Employee's pensum contact hours limit cannot be exceeded."),
+                (over_time_hours / (factor + 1) + old_hours,
+                 "Employee's pensum additional hours limit cannot be exceeded."),
+            ]:
+                if item['plan_hours'] > tmp and (max_value_to_set is None or max_value_to_set > tmp):
+                    max_value_to_set, reason = tmp, tmp_reason
+            if max_value_to_set is not None:
+                errors[-1]['plan_hours'] = [f"Max. value possible: {int(max(max_value_to_set, 0))}. Reason: {reason}"]
+                continue
+
+            difference = item['plan_hours'] - old_hours
+            orders_hours[order.pk] -= difference
+            pensums_hours[pensum_pk] = [contact_hours - difference, over_time_hours - difference * (factor + 1)]
+            item['order'] = order
+            item['plan'] = plan
+            item['pensum'] = pensum_pk
+
+        if any(errors):
+            raise ValidationError(errors)
+        return data
+
+    def create(self, validated_data):
+        data = validated_data['plans']
+        employees = dict(Employees.objects.filter(
+            abbreviation__in={item['employee'] for item in data}).values_list('abbreviation', 'pk'))
+        plans_to_create = []
+        plans_to_update = []
+        # hours to reserve: {order's pk: hours}, {pensum's pk: [contact hours, additional hours]}
+        orders_hours = defaultdict(int)
+        pensums_hours = defaultdict(lambda: [0, 0])
+        for item in data:
+            difference = item['plan_hours'] - (item['plan'].plan_hours if item['plan'] else 0)
+            orders_hours[item['order'].pk] += difference
+            pensums_hours[item['pensum']][0] += difference
+            pensums_hours[item['pensum']][1] += get_plans_additional_hours(item['order'].classes.module, difference)
+            if item['plan']:
+                item['plan'].plan_hours = item['plan_hours']
+                plans_to_update.append(item['plan'])
+            else:
+                plans_to_create.append(
+                    Plans(order=item['order'], employee_id=employees[item['employee']], plan_hours=item['plan_hours']))
+
+        with transaction.atomic():
+            # validated batch is checked once again with race-free reservations (concurrent requests)
+            reasons = [reserve_order_hours(pk, hours) for pk, hours in orders_hours.items()] + [
+                reserve_pensum_hours(pk, *hours) for pk, hours in pensums_hours.items()]
+            if any(reasons):
+                raise ValidationError({'plans': sorted({reason for reason in reasons if reason})})
+            Plans.objects.bulk_create(plans_to_create, batch_size=500)
+            Plans.objects.bulk_update(plans_to_update, ['plan_hours'], batch_size=500)
+            # bulk operations do not send signals, contact hours are summed from plans of all schedules
+            PensumTotals.refresh(Pensum.objects.filter(employee__in=employees.values()))
+        return validated_data
+
+    def to_representation(self, instance):
+        return {'plans': [
+            {
+                'module_code': item['module_code'],
+                'classes_name': item['classes_name'],
+                'employee': item['employee'],
+                'plan_hours': item['plan_hours'],
+                'status': 'updated' if item.get('plan') else 'created',
+            } for item in instance['plans']
+        ]}
@@ -0,0 +1,36 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from modules.models import Classes, Modules
+from .models import Orders, Plans
+
+
+@receiver(post_save, sender=Orders)
+def order_changed(sender, instance, **kwargs):
+    # students number decides about order's hours
+    Orders.objects.filter(pk=instance.pk).refresh_remaining_hours()
+
+
+@receiver(post_save, sender=Classes)
+def classes_changed(sender, instance, created, **kwargs):
+    # classes' hours and students limit per group decide about order's hours (new classes have no order yet)
+    if not created:
+        Orders.objects.filter(pk=instance.pk).refresh_remaining_hours()
+
+
+@receiver([post_save, post_delete], sender=Plans)
+def plan_changed(sender, instance, **kwargs):
+    Orders.objects.filter(pk=instance.order_id).refresh_remaining_hours()
+
+
+@receiver([post_save, post_delete], sender=Orders)
+def module_orders_changed(sender, instance, **kwargs):
+    # module's classes may be already deleted (cascade)
+    Modules.objects.filter(form_of_classes=instance.classes_id).refresh_main_order()
+
+
+@receiver([post_save, post_delete], sender=Classes)
+def module_classes_changed(sender, instance, **kwargs):
+    # classes' name decides about module's main order
+    if not kwargs.get('created'):
+        Modules.objects.filter(pk=instance.module_id).refresh_main_order()
@@ -0,0 +1,168 @@
+import csv
+import io
+import json
+
+from rest_framework import status
+from rest_framework.reverse import reverse
+from rest_framework.test import APITestCase
+
+from schedules.models import Pensum, PensumTotals
+from schedules.tests import create_schedule_data
+from .models import Orders, Plans
+
+
+class PlansBulkTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.schedule = create_schedule_data()
+        cls.url = reverse('plans-bulk', kwargs={'schedule_slug': cls.schedule.slug})
+
+    def test_bulk_create_and_update(self):
+        response = self.client.post(self.url, [
+            # update of existing plan (order has 15 free hours)
+            {'module_code': 'test-mod0', 'classes_name': 'Laboratory_classes', 'employee': 'emp0', 'plan_hours': 30},
+            {'module_code': 'test-mod1', 'classes_name': 'Lectures', 'employee': 'emp0', 'plan_hours': 0},
+        ], format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        self.assertEqual([plan['status'] for plan in response.data['plans']], ['updated', 'created'])
+        self.assertEqual(Plans.objects.get(
+            order__classes__module__module_code='test-mod0', order__classes__name='Laboratory_classes',
+            employee__abbreviation='emp0').plan_hours, 30)
+        self.assertTrue(Plans.objects.filter(
+            order__classes__module__module_code='test-mod1', employee__abbreviation='emp0').exists())
+        # totals are refreshed for the whole batch
+        pensum = Pensum.objects.get(schedule=self.schedule, employee__abbreviation='emp0')
+        self.assertEqual(pensum.totals.pensum_contact_hours, pensum.pensum_contact_hours)
+
+    def test_batch_validated_as_a_whole(self):
+        plans_count = Plans.objects.count()
+        response = self.client.post(self.url, [
+            {'module_code': 'test-mod0', 'classes_name': 'Laboratory_classes', 'employee': 'emp1', 'plan_hours': 10},
+            # only 5 hours left after previous plan
+            {'module_code': 'test-mod0', 'classes_name': 'Laboratory_classes', 'employee': 'emp0', 'plan_hours': 30},
+            {'module_code': 'test-mod0', 'classes_name': 'Unknown', 'employee': 'emp1', 'plan_hours': 1},
+            {'module_code': 'test-mod0', 'classes_name': 'Lectures', 'employee': 'unknown', 'plan_hours': 1},
+        ], format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        errors = response.data['plans']
+        self.assertEqual(errors[0], {})
+        self.assertIn('Max. value possible: 25.', errors[1]['plan_hours'][0])
+        self.assertIn('classes_name', errors[2])
+        self.assertIn('employee', errors[3])
+        # nothing is written
+        self.assertEqual(Plans.objects.count(), plans_count)
+
+    def test_pensum_limit(self):
+        response = self.client.post(self.url, [
+            {'module_code': 'test-mod1', 'classes_name': 'Laboratory_classes', 'employee': 'emp1',
+             'plan_hours': 10000},
+        ], format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('Reason', response.data['plans'][0]['plan_hours'][0])
+
+
+class OrdersMetricsTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.schedule = create_schedule_data()
+
+    def test_with_metrics_equals_properties(self):
+        for order in Orders.objects.with_metrics():
+            python_order = Orders.objects.get(pk=order.pk)
+            for name in ['groups_number', 'order_hours', 'plans_sum_hours']:
+                self.assertEqual(getattr(order, name), getattr(python_order, name), name)
+
+    def test_orders_list_queries(self):
+        url = reverse('orders-list', kwargs={'schedule_slug': self.schedule.slug})
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertEqual(len(response.data), 4)
+        self.assertEqual(sorted(len(data['plans']) for data in response.data), [1, 1, 2, 2])
+
+    def test_orders_list_keyset_pagination(self):
+        url = reverse('orders-list', kwargs={'schedule_slug': self.schedule.slug})
+        # pages are ordered by module's code and classes' name
+        names = sorted((data['module'], data['classes_name']) for data in self.client.get(url).data)
+
+        # forward with page of 3 orders
+        response = self.client.get(url, {'page_size': 3})
+        self.assertEqual([(data['module'], data['classes_name']) for data in response.data['results']],
+                         names[:3])
+        self.assertIsNone(response.data['previous'])
+        response = self.client.get(response.data['next'])
+        self.assertEqual([(data['module'], data['classes_name']) for data in response.data['results']],
+                         names[3:])
+        self.assertIsNone(response.data['next'])
+        # and back
+        response = self.client.get(response.data['previous'])
+        self.assertEqual([(data['module'], data['classes_name']) for data in response.data['results']],
+                         names[:3])
+        self.assertIsNone(response.data['previous'])
+
+        self.assertEqual(self.client.get(url, {'cursor': 'invalid'}).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_orders_export(self):
+        url = reverse('orders-list', kwargs={'schedule_slug': self.schedule.slug})
+        # plans are prefetched for every chunk of streamed orders
+        with self.assertNumQueries(2):
+            response = self.client.get(url, {'format': 'ndjson'})
+            lines = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(sorted(len(line['plans']) for line in lines), [1, 1, 2, 2])
+
+        response = self.client.get(url, {'format': 'csv'})
+        rows = list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual(rows[0][:2], ['module', 'classes_name'])
+        self.assertEqual(len(rows), 5)
+
+
+class PlanHoursReservationTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.schedule = create_schedule_data()
+        PensumTotals.refresh(Pensum.objects.all())
+        cls.order = Orders.objects.get(classes__module__module_code='test-mod0', classes__name='Laboratory_classes')
+        cls.url = reverse('classes-order-plans-list', kwargs={
+            'schedule_slug': cls.schedule.slug, 'module_module_code': 'test-mod0',
+            'classes_name': 'Laboratory_classes'})
+
+    def test_remaining_hours_counter(self):
+        order = Orders.objects.get(pk=self.order.pk)
+        self.assertEqual(order.remaining_hours, order.order_hours - order.plans_sum_hours)
+        self.assertEqual(order.remaining_hours, 15)
+        Plans.objects.filter(order=order, employee__abbreviation='emp0').delete()
+        order.refresh_from_db()
+        self.assertEqual(order.remaining_hours, 35)
+
+    def test_reservation_is_checked_on_write(self):
+        # hours reserved by concurrent transaction (not visible for plans' summary yet)
+        Orders.objects.filter(pk=self.order.pk).update(remaining_hours=5)
+        response = self.client.post(self.url, {'employee': 'emp1', 'plan_hours': 10})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("Order's hours number", response.data['plan_hours'][0])
+        self.assertFalse(Plans.objects.filter(order=self.order, employee__abbreviation='emp1').exists())
+        self.assertEqual(Orders.objects.get(pk=self.order.pk).remaining_hours, 5)
+
+        response = self.client.post(self.url, {'employee': 'emp1', 'plan_hours': 5})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        pensum = Pensum.objects.get(schedule=self.schedule, employee__abbreviation='emp1')
+        contact_hours = pensum.totals.pensum_contact_hours
+        self.assertEqual(contact_hours, pensum.pensum_contact_hours)
+
+        # releasing hours
+        response = self.client.patch(self.url + 'emp1/', {'plan_hours': 1})
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        pensum.totals.refresh_from_db()
+        self.assertEqual(pensum.totals.pensum_contact_hours, contact_hours - 4)
+        order = Orders.objects.get(pk=self.order.pk)
+        self.assertEqual(order.remaining_hours, order.order_hours - order.plans_sum_hours)
+
+    def test_pensum_reservation(self):
+        pensum = Pensum.objects.get(schedule=self.schedule, employee__abbreviation='emp1')
+        PensumTotals.refresh(Pensum.objects.filter(pk=pensum.pk))
+        PensumTotals.objects.filter(pk=pensum.pk).update(amount_until_contact_hours_limit=3)
+        response = self.client.post(self.url, {'employee': 'emp1', 'plan_hours': 4})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("contact hours limit", response.data['plan_hours'][0])
+        # order's reservation is rolled back
+        self.assertEqual(Orders.objects.get(pk=self.order.pk).remaining_hours, 15)
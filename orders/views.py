@@ -1,19 +1,42 @@
 from django.shortcuts import get_object_or_404
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
 from rest_framework.viewsets import GenericViewSet, ModelViewSet, mixins
+from rest_framework_csv.renderers import CSVStreamingRenderer
 from rest_framework_nested.viewsets import NestedViewSetMixin
 
-from utils.ViewSets import OneToOneRelationViewSet
+from utils.ViewSets import OneToOneRelationViewSet, StreamingExportMixin
+from utils.streaming import NDJSONRenderer
 from .models import Orders, Plans
-from .serializers import ClassesOrderSerializer, OrdersSerializer, PlansSerializer
+from .serializers import BulkPlansSerializer, ClassesOrderSerializer, OrdersSerializer, PlansSerializer
 
 
-class OrdersViewSet(GenericViewSet,
+class OrdersRenderer(CSVStreamingRenderer):
+    """
+    Custom CSV Renderer for Orders View Set - orders' values without nested plans (exported in NDJSON format)
+    """
+    header = ['module', 'classes_name', 'students_number', 'groups_number', 'order_hours', 'order_number',
+              'plans_sum_hours', 'remaining_hours']
+
+
+class OrdersViewSet(StreamingExportMixin,
+                    GenericViewSet,
                     mixins.ListModelMixin,
                     mixins.CreateModelMixin):
     serializer_class = OrdersSerializer
+    renderer_classes = tuple(api_settings.DEFAULT_RENDERER_CLASSES) + (OrdersRenderer, NDJSONRenderer)
+    keyset_ordering = ['classes__module__module_code', 'classes__name']
+    export_filename = 'orders'
 
     def get_queryset(self):
-        return Orders.objects.filter(classes__module__schedule__slug=self.kwargs.get('schedule_slug'))
+        return Orders.objects.filter(classes__module__schedule__slug=self.kwargs.get('schedule_slug')).with_metrics()
+
+    def list(self, request, *args, **kwargs):
+        # stream orders with their plans (prefetched for every chunk of orders)
+        if self.is_export():
+            return self.export_response(self.filter_queryset(self.get_queryset()))
+        return super().list(request, *args, **kwargs)
 
 
 class OrderDetailViewSet(OneToOneRelationViewSet):
@@ -32,3 +55,20 @@ class PlansViewSet(NestedViewSetMixin, ModelViewSet):
     # custom object for explicit employee (nested plan's queryset for explicit order - see above)
     def get_object(self):
         return get_object_or_404(self.get_queryset(), employee__abbreviation=self.kwargs.get(self.lookup_field))
+
+
+class PlansBulkViewSet(GenericViewSet):
+    """
+    Plans Bulk View Set
+    Creates or updates many plans of the schedule at once. Accepts list of plans (or {"plans": [...]}) with
+    module_code, classes_name, employee and plan_hours fields.
+    """
+    queryset = Plans.objects.none()
+    serializer_class = BulkPlansSerializer
+
+    def create(self, request, *args, **kwargs):
+        data = {'plans': request.data} if isinstance(request.data, list) else request.data
+        serializer = self.get_serializer(data=data)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
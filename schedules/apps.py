@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class SchedulesConfig(AppConfig):
     name = 'schedules'
+
+    def ready(self):
+        # connect receivers keeping PensumTotals up to date
+        from . import signals  # noqa: F401
@@ -0,0 +1,115 @@
+from collections import defaultdict
+
+from AGH.AGH_utils import ExamsFactors, get_job_time_hours_limit, get_major_factors_value
+
+# types of basic threshold factors
+ADDITION = 'Addition'
+MULTIPLICATION = 'Multiplication'
+
+
+def apply_basic_threshold_factor(factor_type, factor_value, value):
+    if factor_type == ADDITION:
+        return value + factor_value
+    if factor_type == MULTIPLICATION:
+        return value * factor_value
+
+
+def calculate_pensum_values(basic_threshold, part_of_job_time, factors, reduction_value, contact_hours,
+                            plans_additional_hours, factors_hours, factors_hours_not_counted, exam_hours):
+    """
+    Calculates all derived values of a pensum - single source of formulas for Pensum.values_snapshot and
+    calculate_pensums_values() batch calculation
+
+    params: basic_threshold, part_of_job_time - pensum's and employee's values
+    params: factors - list of (factor_type, value) pairs of basic threshold factors in calculation order (pk)
+    params: reduction_value - value of pensum's reduction or None if not set
+    params: contact_hours, plans_additional_hours, factors_hours, factors_hours_not_counted, exam_hours - sums of
+    hours of employee's plans, additional hours factors and exams
+    return: dictionary of pensum's values
+    """
+    additional_hours = (
+        factors_hours + plans_additional_hours + min(exam_hours, ExamsFactors().max_summary_hours)).__round__(2)
+
+    threshold = basic_threshold
+    # reduce if employee has part-time job
+    threshold *= part_of_job_time
+    # calculate all basic threshold factors
+    for factor_type, factor_value in factors:
+        threshold = apply_basic_threshold_factor(factor_type, factor_value, threshold)
+    # reduce with function's value
+    if reduction_value is not None:
+        threshold -= reduction_value
+    threshold = threshold if threshold > 0 else 0
+
+    relative_min = 1 - get_major_factors_value("max relative deficit for contact hours")
+    absolute_min = threshold - get_major_factors_value("max absolute deficit for contact hours")
+    min_for_contact_hours = max([relative_min * threshold, absolute_min])
+    limit_for_contact_hours = threshold * get_job_time_hours_limit("contact hours limit")
+    if part_of_job_time < 1.0:
+        limit_for_over_time_hours = threshold * get_job_time_hours_limit("part-time hours limit")
+    else:
+        limit_for_over_time_hours = threshold * get_job_time_hours_limit("full-time hours limit")
+    amount_until_over_time_hours_limit = (
+        limit_for_over_time_hours - contact_hours - additional_hours + factors_hours_not_counted).__round__(2)
+
+    return {
+        'pensum_contact_hours': contact_hours,
+        'pensum_additional_hours': additional_hours,
+        'pensum_additional_hours_not_counted_into_limit': factors_hours_not_counted,
+        'exam_hours': exam_hours,
+        'calculated_threshold': threshold,
+        'min_for_contact_hours': min_for_contact_hours,
+        'amount_until_contact_hours_min': max(min_for_contact_hours - contact_hours, 0),
+        'limit_for_contact_hours': limit_for_contact_hours,
+        'amount_until_contact_hours_limit': min(
+            limit_for_contact_hours - contact_hours, amount_until_over_time_hours_limit),
+        'limit_for_over_time_hours': limit_for_over_time_hours,
+        'amount_until_over_time_hours_limit': amount_until_over_time_hours_limit,
+    }
+
+
+def load_pensums_inputs(pensums):
+    """
+    Loads inputs of calculate_pensum_values() for whole querysets. Pensums (with annotated sums of hours) and their
+    basic threshold factors are loaded with two queries as plain values - no model instances are created.
+
+    params: pensums - Pensum queryset
+    return: dictionary of pensum's pk and its calculate_pensum_values() kwargs
+    """
+    from AGH.AGH_utils import get_regulation_catalog
+    from .models import Pensum, PensumBasicThresholdFactors
+
+    rows = pensums.annotate_totals().values_list(
+        'pk', 'basic_threshold', 'employee__part_of_job_time', 'reduction__function', *Pensum.TOTALS_ANNOTATIONS)
+    factors = defaultdict(list)
+    for pensum_pk, factor_type, factor_value in PensumBasicThresholdFactors.objects.filter(
+            pensum__in=pensums.values('pk')).order_by('pk').values_list('pensum', 'factor_type', 'value'):
+        factors[pensum_pk].append((factor_type, factor_value))
+    reduction_values = get_regulation_catalog().reduction_values
+
+    return {
+        pk: {
+            'basic_threshold': basic_threshold,
+            'part_of_job_time': part_of_job_time,
+            'factors': factors[pk],
+            'reduction_value': reduction_values.get(function) if function else None,
+            'contact_hours': contact_hours,
+            'plans_additional_hours': plans_additional_hours,
+            'factors_hours': factors_hours,
+            'factors_hours_not_counted': factors_hours_not_counted,
+            'exam_hours': exam_hours,
+        }
+        for (pk, basic_threshold, part_of_job_time, function, contact_hours, plans_additional_hours, factors_hours,
+             factors_hours_not_counted, exam_hours) in rows
+    }
+
+
+def calculate_pensums_values(pensums):
+    """
+    Batch version of Pensum.values_snapshot for whole querysets (e.g. all pensums of a schedule).
+    Inputs are loaded with load_pensums_inputs() and values of all pensums are calculated in one pass.
+
+    params: pensums - Pensum queryset
+    return: dictionary of pensum's pk and its values
+    """
+    return {pk: calculate_pensum_values(**inputs) for pk, inputs in load_pensums_inputs(pensums).items()}
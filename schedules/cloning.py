@@ -0,0 +1,92 @@
+from django.db import transaction
+from django.db.models import Q
+
+from modules.models import Classes, Modules
+from orders.models import Orders, Plans
+from .models import (ExamsAdditionalHours, PensumAdditionalHoursFactors, PensumBasicThresholdFactors, PensumReductions,
+                     Schedules)
+from .signals import schedule_totals_refresh
+
+# number of rows inserted in a single query
+BULK_BATCH_SIZE = 1000
+
+
+def copy_rows(queryset, **remap):
+    """
+    Copies rows of queryset with bulk inserts (primary keys are not copied, unless remapped)
+
+    params: queryset - rows to copy
+    params: remap - field's attname and dictionary of its old and new values (or a single new value for all rows)
+    return: number of copied rows
+    """
+    model = queryset.model
+    fields = [field.attname for field in model._meta.concrete_fields
+              if not field.primary_key or field.attname in remap]
+    copies = []
+    for row in queryset.order_by().values(*fields).iterator(chunk_size=BULK_BATCH_SIZE):
+        for field, values in remap.items():
+            row[field] = values[row[field]] if isinstance(values, dict) else values
+        copies.append(model(**row))
+    model.objects.bulk_create(copies, batch_size=BULK_BATCH_SIZE)
+    return len(copies)
+
+
+def _natural_map(old_queryset, new_queryset, *natural_key):
+    """
+    return: dictionary of old and new primary keys of rows with the same natural key
+    """
+    new = {tuple(row[1:]): row[0] for row in new_queryset.values_list('pk', *natural_key)}
+    return {row[0]: new[tuple(row[1:])] for row in old_queryset.values_list('pk', *natural_key)}
+
+
+def clone_schedule(schedule_slug, new_slug, plans=False, exams=False):
+    """
+    Deep-copies schedule with its modules, classes, orders, pensums, factors and reductions into a new schedule, in one
+    transaction. Rows are inserted in bulk, foreign keys are remapped with old-new primary keys dictionaries of every
+    table (new primary keys are found by natural keys, as not every database returns them from bulk inserts).
+
+    params: schedule_slug - slug of the schedule to copy
+    params: new_slug - slug of the new schedule
+    params: plans - copy orders' plans as well (note: plans count into employees' contact hours in every schedule)
+    params: exams - copy exams' assignments as well
+    return: dictionary with new schedule and numbers of copied rows
+    """
+    schedule = Schedules.objects.get(slug=schedule_slug)
+    copied = {}
+    with transaction.atomic():
+        new_schedule = Schedules.objects.create(slug=new_slug)
+
+        copied['modules'] = copy_rows(schedule.modules.all(), schedule_id=new_schedule.pk, main_order_id=None)
+        modules = _natural_map(schedule.modules.all(), new_schedule.modules.all(), 'module_code')
+
+        copied['classes'] = copy_rows(Classes.objects.filter(module__schedule=schedule), module_id=modules)
+        classes = _natural_map(
+            Classes.objects.filter(module__schedule=schedule), Classes.objects.filter(module__schedule=new_schedule),
+            'module__module_code', 'name')
+
+        # orders' primary key is their classes' one
+        copied['orders'] = copy_rows(Orders.objects.filter(classes__module__schedule=schedule), classes_id=classes)
+
+        copied['pensums'] = copy_rows(schedule.pensums.all(), schedule_id=new_schedule.pk)
+        pensums = _natural_map(schedule.pensums.all(), new_schedule.pensums.all(), 'employee')
+        for name, model in [('basic_threshold_factors', PensumBasicThresholdFactors),
+                            ('additional_hours_factors', PensumAdditionalHoursFactors),
+                            ('reductions', PensumReductions)]:
+            copied[name] = copy_rows(model.objects.filter(pensum__schedule=schedule), pensum_id=pensums)
+
+        if plans:
+            copied['plans'] = copy_rows(Plans.objects.filter(order__classes__module__schedule=schedule),
+                                        order_id=classes)
+        if exams:
+            copied['exams'] = copy_rows(ExamsAdditionalHours.objects.filter(pensum__schedule=schedule),
+                                        pensum_id=pensums, module_id=modules)
+
+        # values kept up to date by signals (not sent by bulk inserts)
+        Modules.objects.filter(schedule=new_schedule).refresh_main_order()
+        Orders.objects.filter(classes__module__schedule=new_schedule).refresh_remaining_hours()
+        # plans count into employees' pensums of every schedule
+        totals_filter = Q(schedule=new_schedule)
+        if plans:
+            totals_filter |= Q(employee__plans__order__classes__module__schedule=new_schedule)
+        schedule_totals_refresh(totals_filter)
+    return {'schedule': new_schedule, 'copied': copied}
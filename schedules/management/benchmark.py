@@ -0,0 +1,82 @@
+import random
+
+from employees.models import Degrees, Employees, Positions
+from modules.models import Classes, Modules
+from orders.models import Orders, Plans
+from schedules.models import (ExamsAdditionalHours, Pensum, PensumAdditionalHoursFactors, PensumBasicThresholdFactors,
+                              PensumReductions, Schedules)
+
+
+def create_benchmark_schedule(slug, employees_number, orders_number, plans_per_employee=0, factors=False):
+    """
+    Generates schedule with pensums of new employees and modules with lectures' orders for benchmark commands
+    (uses random module, so results depend on its seed). Everything is written with bulk queries - no signals are
+    sent, so pensums' totals are not calculated.
+
+    params: slug - slug of the new schedule
+    params: employees_number - number of employees (each of them with pensum)
+    params: orders_number - number of modules (each of them with a single order)
+    params: plans_per_employee - number of plans of every employee (orders are chosen at random)
+    params: factors - if True pensums get basic threshold factors, reductions, additional hours factors and exams of
+    their plans' modules
+    return: schedule instance
+    """
+    schedule = Schedules.objects.create(slug=slug)
+    degree = Degrees.objects.create(name='benchmark degree')
+    position = Positions.objects.create(name='benchmark position')
+    Employees.objects.bulk_create([
+        Employees(first_name='First', last_name='Last', abbreviation=f'b{i}', e_mail=f'b{i}@benchmark.pl',
+                  degree=degree, position=position, part_of_job_time=0.5 if i % 4 else 1)
+        for i in range(employees_number)
+    ], batch_size=500)
+    Pensum.objects.bulk_create([
+        Pensum(schedule=schedule, employee=employee, basic_threshold=random.choice([180, 240, 360]))
+        for employee in Employees.objects.filter(position=position)
+    ], batch_size=500)
+    Modules.objects.bulk_create([
+        Modules(module_code=f'b{i}', name=f'Module {i}', schedule=schedule, examination=random.random() < 0.5,
+                language='pl' if random.random() < 0.6 else 'en')
+        for i in range(orders_number)
+    ], batch_size=500)
+    Classes.objects.bulk_create([
+        Classes(module=module, name='Lectures', classes_hours=random.choice([15, 30]),
+                students_limit_per_group=random.choice([None, 20]))
+        for module in Modules.objects.filter(schedule=schedule)
+    ], batch_size=500)
+    Orders.objects.bulk_create([
+        Orders(classes=classes, students_number=random.randint(10, 60))
+        for classes in Classes.objects.filter(module__schedule=schedule)
+    ], batch_size=500)
+    # students number of main order is used for exams
+    Modules.objects.filter(schedule=schedule).refresh_main_order()
+
+    pensums = list(Pensum.objects.filter(schedule=schedule).order_by('pk'))
+    orders = dict(Orders.objects.filter(classes__module__schedule=schedule).values_list('pk', 'classes__module'))
+    plans = {
+        pensum: random.sample(list(orders), min(plans_per_employee, len(orders))) for pensum in pensums
+    }
+    Plans.objects.bulk_create([
+        Plans(order_id=order, employee_id=pensum.employee_id, plan_hours=random.choice([5, 10, 15]))
+        for pensum, pensum_orders in plans.items() for order in pensum_orders
+    ], batch_size=500)
+
+    if factors:
+        PensumBasicThresholdFactors.objects.bulk_create([
+            PensumBasicThresholdFactors(pensum=pensum, factor_type=factor_type, value=value)
+            for pensum in pensums[::2]
+            for factor_type, value in ((PensumBasicThresholdFactors.ADD, 10), (PensumBasicThresholdFactors.MUL, 0.9))
+        ], batch_size=500)
+        PensumReductions.objects.bulk_create([
+            PensumReductions(pensum=pensum, function='Kierownik Katedry') for pensum in pensums[::5]
+        ], batch_size=500)
+        PensumAdditionalHoursFactors.objects.bulk_create([
+            PensumAdditionalHoursFactors(pensum=pensum, value_per_unit=random.randint(5, 30),
+                                         amount=random.randint(1, 3))
+            for pensum in pensums[::3]
+        ], batch_size=500)
+        ExamsAdditionalHours.objects.bulk_create([
+            ExamsAdditionalHours(pensum=pensum, module_id=orders[pensum_orders[0]], portion=random.choice([0.5, 1]),
+                                 type=random.choice(['Written', 'Oral']))
+            for pensum, pensum_orders in plans.items() if pensum_orders
+        ], batch_size=500)
+    return schedule
@@ -0,0 +1,55 @@
+import random
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from schedules.management.benchmark import create_benchmark_schedule
+from schedules.staffing import StaffingSolver, propose_staffing
+
+
+class Command(BaseCommand):
+    help = "Measures automatic staffing of generated schedule (changes are rolled back)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--employees', type=int, default=2000)
+        parser.add_argument('--orders', type=int, default=10000)
+        parser.add_argument('--passes', type=int, default=3, help="local search passes")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--solver-only', action='store_true', help="run solver on generated data without DB")
+
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+        if options['solver_only']:
+            self.run_solver(options)
+            return
+
+        with transaction.atomic():
+            start = perf_counter()
+            schedule = create_benchmark_schedule('benchmark-auto-staff', options['employees'], options['orders'])
+            self.stdout.write(f"{'data generation':<35}{perf_counter() - start:>10.3f}s")
+
+            start = perf_counter()
+            proposal = propose_staffing(schedule.slug, options['passes'])
+            self.stdout.write(f"{'propose_staffing()':<35}{perf_counter() - start:>10.3f}s")
+            self.write_summary(proposal['staffed_hours'], proposal['unstaffed_hours'], len(proposal['plans']))
+
+            transaction.set_rollback(True)
+
+    def run_solver(self, options):
+        pensums = {}
+        for i in range(options['employees']):
+            contact_hours = random.uniform(50, 300)
+            pensums[i] = (contact_hours, contact_hours * random.uniform(0.9, 2))
+        orders = {i: (random.choice([15, 30, 45, 60]), 0 if random.random() < 0.6 else 0.5)
+                  for i in range(options['orders'])}
+        for passes in sorted({0, options['passes']}):
+            start = perf_counter()
+            solver = StaffingSolver(orders, pensums)
+            assignments = solver.solve(passes)
+            self.stdout.write(f"{f'solver ({passes} local search passes)':<35}{perf_counter() - start:>10.3f}s")
+            self.write_summary(sum(assignments.values()), sum(solver.remaining.values()), len(assignments))
+
+    def write_summary(self, staffed_hours, unstaffed_hours, plans_number):
+        self.stdout.write(f"    staffed hours: {staffed_hours}, unstaffed hours: {unstaffed_hours}, "
+                          f"plans: {plans_number}")
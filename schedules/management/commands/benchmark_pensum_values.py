@@ -0,0 +1,50 @@
+import random
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from schedules.calculations import calculate_pensums_values
+from schedules.management.benchmark import create_benchmark_schedule
+from schedules.models import Pensum
+
+
+class Command(BaseCommand):
+    help = "Compares per-instance and batch calculation of pensum values on generated data (changes are rolled back)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--employees', type=int, default=5000)
+        parser.add_argument('--orders', type=int, default=2000)
+        parser.add_argument('--plans', type=int, default=5, help="plans per employee")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--skip-per-instance', action='store_true',
+                            help="skip the slowest calculation - Pensum's properties without annotations")
+
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+        with transaction.atomic():
+            schedule = create_benchmark_schedule('benchmark-pensum-values', options['employees'], options['orders'],
+                                                 plans_per_employee=options['plans'], factors=True)
+            pensums = Pensum.objects.filter(schedule=schedule)
+            timings = {}
+
+            if not options['skip_per_instance']:
+                start = perf_counter()
+                for pensum in pensums.select_related('employee'):
+                    pensum.values_snapshot
+                timings['per-instance properties'] = perf_counter() - start
+
+            start = perf_counter()
+            for pensum in pensums.with_totals():
+                pensum.values_snapshot
+            timings['with_totals() instances'] = perf_counter() - start
+
+            start = perf_counter()
+            calculate_pensums_values(pensums)
+            timings['batch calculate_pensums_values()'] = perf_counter() - start
+
+            transaction.set_rollback(True)
+
+        batch_time = timings['batch calculate_pensums_values()']
+        for name, timing in timings.items():
+            self.stdout.write(f"{name:<35}{timing:>10.3f}s{timing / batch_time:>10.1f}x")
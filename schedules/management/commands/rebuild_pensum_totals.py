@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from schedules.models import Pensum, PensumTotals
+
+
+class Command(BaseCommand):
+    help = "Rebuilds denormalized pensum totals from scratch"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--schedule', help="slug of the schedule to rebuild (all schedules by default)")
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        pensums = Pensum.objects.order_by('pk')
+        if options['schedule']:
+            pensums = pensums.filter(schedule__slug=options['schedule'])
+        pks = list(pensums.values_list('pk', flat=True))
+        with transaction.atomic():
+            PensumTotals.objects.filter(pensum__in=pensums).delete()
+            for i in range(0, len(pks), options['batch_size']):
+                PensumTotals.refresh(Pensum.objects.filter(pk__in=pks[i:i + options['batch_size']]))
+        self.stdout.write(f"Rebuilt totals of {len(pks)} pensum(s)")
@@ -0,0 +1,43 @@
+# Generated by Django 3.1.3 on 2026-10-18 19:36
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_totals(apps, schema_editor):
+    # totals of existing pensums are calculated with the current models, formulas (see schedules/calculations.py) are
+    # not available for historical ones
+    from schedules.models import Pensum, PensumTotals
+
+    pks = list(apps.get_model('schedules', 'Pensum').objects.order_by('pk').values_list('pk', flat=True))
+    for i in range(0, len(pks), 500):
+        PensumTotals.refresh(Pensum.objects.filter(pk__in=pks[i:i + 500]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('modules', '0002_modules_main_order'),
+        ('schedules', '0002_examsadditionalhours'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PensumTotals',
+            fields=[
+                ('pensum', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='totals', serialize=False, to='schedules.pensum')),
+                ('pensum_contact_hours', models.PositiveIntegerField(default=0)),
+                ('pensum_additional_hours', models.FloatField(default=0)),
+                ('pensum_additional_hours_not_counted_into_limit', models.FloatField(default=0)),
+                ('exam_hours', models.FloatField(default=0)),
+                ('calculated_threshold', models.FloatField(default=0)),
+                ('min_for_contact_hours', models.FloatField(default=0)),
+                ('amount_until_contact_hours_min', models.FloatField(default=0)),
+                ('limit_for_contact_hours', models.FloatField(default=0)),
+                ('amount_until_contact_hours_limit', models.FloatField(default=0)),
+                ('limit_for_over_time_hours', models.FloatField(default=0)),
+                ('amount_until_over_time_hours_limit', models.FloatField(default=0)),
+            ],
+        ),
+        migrations.RunPython(fill_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 3.1.3 on 2026-10-18 20:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('schedules', '0003_pensumtotals'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pensumtotals',
+            index=models.Index(fields=['amount_until_contact_hours_min'], name='schedules_p_amount__207058_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pensumtotals',
+            index=models.Index(fields=['amount_until_contact_hours_limit'], name='schedules_p_amount__cdbdb9_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pensumtotals',
+            index=models.Index(fields=['amount_until_over_time_hours_limit'], name='schedules_p_amount__eae495_idx'),
+        ),
+    ]
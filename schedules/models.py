@@ -1,9 +1,14 @@
-from django.db import models
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import models, transaction
+from django.db.models import Case, F, FloatField, IntegerField, OuterRef, Prefetch, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
 
 from AGH.AGH_utils import (AdditionalHoursFactorData, ExamsFactors, get_additional_hours_factors_choices,
-                           get_exam_hours, get_job_time_hours_limit, get_major_factors_value, get_pensum_function_names,
-                           get_pensum_reduction_value)
+                           get_exam_hours, get_major_factors_value, get_pensum_function_names,
+                           get_pensum_reduction_value, get_regulation_catalog)
 from employees.models import Employees
+from .calculations import (ADDITION, MULTIPLICATION, apply_basic_threshold_factor, calculate_pensum_values,
+                           calculate_pensums_values)
 
 
 class Schedules(models.Model):
@@ -13,10 +18,80 @@ class Schedules(models.Model):
         return f"{self.slug} schedule"
 
 
+class PensumQuerySet(models.QuerySet):
+    def with_totals(self):
+        """
+        Annotates pensums with sums of hours needed by the pensum's properties, so they can be computed without
+        additional queries per instance. Related employee, reduction and basic threshold factors are fetched as well.
+
+        return: annotated queryset
+        """
+        return self.select_related('employee', 'reduction').prefetch_related(
+            Prefetch('basic_threshold_factors', queryset=PensumBasicThresholdFactors.objects.order_by('pk'))
+        ).annotate_totals()
+
+    def with_free_contact_hours(self, min_hours=1):
+        """
+        Filters pensums with at least min_hours of contact hours left until the limit. Values are read from
+        denormalized PensumTotals rows.
+
+        params: min_hours - minimal number of free contact hours
+        return: filtered queryset
+        """
+        return self.filter(totals__amount_until_contact_hours_limit__gte=min_hours)
+
+    def annotate_totals(self):
+        """
+        Annotates pensums with sums of hours only (see Pensum.TOTALS_ANNOTATIONS)
+
+        return: annotated queryset
+        """
+        from orders.models import Plans
+
+        plans = Plans.objects.filter(employee=OuterRef('employee')).order_by().values('employee')
+        factors = PensumAdditionalHoursFactors.objects.filter(pensum=OuterRef('pk')).order_by().values('pensum')
+        not_counted_factors_names = [
+            factor_ID for factor_ID in get_regulation_catalog().additional_hours_factors
+            if not AdditionalHoursFactorData(factor_ID).is_counted_into_limit
+        ]
+        exams_factors = ExamsFactors()
+        # students number of module's main order (see Modules.main_order), 0 if exam should not be counted
+        main_order_students = Case(
+            When(module__main_order__students_number__gt=exams_factors.min_students_number,
+                 then=F('module__main_order__students_number')),
+            default=Value(0), output_field=IntegerField())
+        exams = ExamsAdditionalHours.objects.filter(pensum=OuterRef('pk')).order_by().values('pensum')
+
+        def sum_of(queryset, expression, output_field):
+            return Coalesce(
+                Subquery(queryset.annotate(total=Sum(expression, output_field=output_field)).values('total'),
+                         output_field=output_field),
+                Value(0), output_field=output_field)
+
+        return self.annotate(
+            contact_hours_sum=sum_of(plans, 'plan_hours', IntegerField()),
+            plans_additional_hours_sum=sum_of(
+                plans.exclude(order__classes__module__language='pl'),
+                F('plan_hours') * Value(get_major_factors_value('congress language factor')),
+                FloatField()),
+            factors_hours_sum=sum_of(factors, F('value_per_unit') * F('amount'), IntegerField()),
+            factors_hours_not_counted_sum=sum_of(
+                factors.filter(name__in=not_counted_factors_names), F('value_per_unit') * F('amount'), IntegerField()),
+            exams_hours_sum=sum_of(
+                exams,
+                F('portion') * main_order_students * Case(
+                    When(type='Oral', then=Value(exams_factors.factor_for_oral_exam)),
+                    default=Value(exams_factors.factor_for_written_exam), output_field=FloatField()),
+                FloatField()),
+        )
+
+
 class Pensum(models.Model):
     class Meta:
         unique_together = (('schedule', 'employee'),)
 
+    objects = PensumQuerySet.as_manager()
+
     schedule = models.ForeignKey(Schedules, on_delete=models.CASCADE, related_name='pensums')
     employee = models.ForeignKey(Employees, on_delete=models.CASCADE, related_name='pensums')
     basic_threshold = models.FloatField(default=0)
@@ -24,85 +99,185 @@ class Pensum(models.Model):
     def __str__(self):
         return f"{self.employee}'s pensum of {self.schedule}"
 
+    # annotations added by PensumQuerySet.with_totals()
+    TOTALS_ANNOTATIONS = ['contact_hours_sum', 'plans_additional_hours_sum', 'factors_hours_sum',
+                          'factors_hours_not_counted_sum', 'exams_hours_sum']
+
+    def save(self, *args, **kwargs):
+        self.invalidate_values()
+        super().save(*args, **kwargs)
+
+    def refresh_from_db(self, *args, **kwargs):
+        self.invalidate_values()
+        super().refresh_from_db(*args, **kwargs)
+
+    def invalidate_values(self):
+        """
+        Drops memoized values of the pensum together with annotations and cached related objects they were
+        calculated with. Needs to be called whenever pensum's related records change.
+        """
+        self._values_snapshot = None
+        for name in self.TOTALS_ANNOTATIONS:
+            self.__dict__.pop(name, None)
+        getattr(self, '_prefetched_objects_cache', {}).pop('basic_threshold_factors', None)
+        self._state.fields_cache.pop('reduction', None)
+
+    @property
+    def values_snapshot(self):
+        """
+        Dictionary of all derived values of the pensum, evaluated in one pass and memoized until invalidate_values()
+        """
+        if getattr(self, '_values_snapshot', None) is None:
+            self._values_snapshot = self.__calculate_values()
+        return self._values_snapshot
+
+    def __calculate_values(self):
+        # sums of hours are read from PensumQuerySet.with_totals() annotations when present
+        if hasattr(self, 'contact_hours_sum'):
+            contact_hours = self.contact_hours_sum
+            plans_additional_hours = self.plans_additional_hours_sum
+            factors_hours = self.factors_hours_sum
+            factors_hours_not_counted = self.factors_hours_not_counted_sum
+            exam_hours = self.exams_hours_sum
+        else:
+            plans = list(self.employee.plans.select_related('order__classes__module'))
+            factors = list(self.additional_hours_factors.all())
+            contact_hours = sum([plan.plan_hours for plan in plans])
+            # additional hours for plans with congress language
+            plans_additional_hours = sum([plan.plan_additional_hours for plan in plans])
+            factors_hours = sum([factor.total_factor_hours for factor in factors])
+            factors_hours_not_counted = sum([
+                factor.total_factor_hours for factor in factors
+                if not AdditionalHoursFactorData(factor.name).is_counted_into_limit
+            ])
+            # examination additional hours
+            exam_hours = sum([exam.total_factor_hours or 0 for exam in self.exams_additional_hours.select_related(
+                'module')])
+        try:
+            reduction_value = self.reduction.reduction_value
+        except ObjectDoesNotExist:
+            # if instance has no reduction set
+            reduction_value = None
+        return calculate_pensum_values(
+            self.basic_threshold, self.employee.part_of_job_time,
+            [(factor.factor_type, factor.value) for factor in self.basic_threshold_factors.all()], reduction_value,
+            contact_hours, plans_additional_hours, factors_hours, factors_hours_not_counted, exam_hours)
+
     @property
     def pensum_contact_hours(self):
-        return sum([plan.plan_hours for plan in self.employee.plans.all()])
+        return self.values_snapshot['pensum_contact_hours']
 
     @property
     def pensum_additional_hours_not_counted_into_limit(self):
-        return sum([
-            factor.total_factor_hours for factor in self.additional_hours_factors.all()
-            if not AdditionalHoursFactorData(factor.name).is_counted_into_limit
-        ])
+        return self.values_snapshot['pensum_additional_hours_not_counted_into_limit']
 
     @property
     def pensum_additional_hours(self):
-        sum_of_factors_hours = sum([factor.total_factor_hours for factor in self.additional_hours_factors.all()])
-        # add additional hours for plans with congress language
-        sum_of_factors_hours += sum([plan.plan_additional_hours for plan in self.employee.plans.all()])
-        # examination additional hours
-        exam_additional_hours = sum([exam.total_factor_hours for exam in self.exams_additional_hours.all()])
-        return (sum_of_factors_hours + min(exam_additional_hours, ExamsFactors.max_summary_hours)).__round__(2)
+        return self.values_snapshot['pensum_additional_hours']
 
     @property
     def calculated_threshold(self):
-        ret = self.basic_threshold
-
-        # reduce if employee has part-time job
-        ret *= self.employee.part_of_job_time
-
-        # calculate all basic threshold factors
-        for factor in self.basic_threshold_factors.all():
-            ret = factor.calculate_value(ret)
-
-        # reduce with function's value
-        try:
-            ret -= self.reduction.reduction_value
-        except Exception:
-            # if instance has no reduction set
-            pass
-        return ret if ret > 0 else 0
+        return self.values_snapshot['calculated_threshold']
 
     @property
     def min_for_contact_hours(self):
-        relative_min = 1 - get_major_factors_value("max relative deficit for contact hours")
-        absolute_min = self.calculated_threshold - get_major_factors_value("max absolute deficit for contact hours")
-        return max([relative_min * self.calculated_threshold, absolute_min])
+        return self.values_snapshot['min_for_contact_hours']
 
     @property
     def amount_until_contact_hours_min(self):
-        hours = self.min_for_contact_hours - self.pensum_contact_hours
-        return hours if hours >= 0 else 0
+        return self.values_snapshot['amount_until_contact_hours_min']
 
     @property
     def limit_for_contact_hours(self):
-        return self.calculated_threshold * get_job_time_hours_limit("contact hours limit")
+        return self.values_snapshot['limit_for_contact_hours']
 
     @property
     def amount_until_contact_hours_limit(self):
-        return min(self.limit_for_contact_hours - self.pensum_contact_hours , self.amount_until_over_time_hours_limit)
+        return self.values_snapshot['amount_until_contact_hours_limit']
 
     @property
     def limit_for_over_time_hours(self):
-        ret = self.calculated_threshold
-        if self.employee.part_of_job_time < 1.0:
-            ret *= get_job_time_hours_limit("part-time hours limit")
-        else:
-            ret *= get_job_time_hours_limit("full-time hours limit")
-        return ret
+        return self.values_snapshot['limit_for_over_time_hours']
 
     @property
     def amount_until_over_time_hours_limit(self):
-        return (self.limit_for_over_time_hours - self.pensum_contact_hours - self.pensum_additional_hours
-                + self.pensum_additional_hours_not_counted_into_limit).__round__(2)
+        return self.values_snapshot['amount_until_over_time_hours_limit']
 
     def plans(self):
         return self.employee.plans.filter(order__classes__module__schedule=self.schedule)
 
 
+class PensumTotals(models.Model):
+    """
+    Denormalized values of the pensum's properties.
+    Rows are refreshed whenever related records change (see schedules/signals.py) or rebuilt with the
+    rebuild_pensum_totals management command.
+    """
+
+    class Meta:
+        # for filtering pensums by their limits
+        indexes = [
+            models.Index(fields=['amount_until_contact_hours_min']),
+            models.Index(fields=['amount_until_contact_hours_limit']),
+            models.Index(fields=['amount_until_over_time_hours_limit']),
+        ]
+
+    pensum = models.OneToOneField(Pensum, on_delete=models.CASCADE, related_name='totals', primary_key=True)
+    pensum_contact_hours = models.PositiveIntegerField(default=0)
+    pensum_additional_hours = models.FloatField(default=0)
+    pensum_additional_hours_not_counted_into_limit = models.FloatField(default=0)
+    exam_hours = models.FloatField(default=0)
+    calculated_threshold = models.FloatField(default=0)
+    min_for_contact_hours = models.FloatField(default=0)
+    amount_until_contact_hours_min = models.FloatField(default=0)
+    limit_for_contact_hours = models.FloatField(default=0)
+    amount_until_contact_hours_limit = models.FloatField(default=0)
+    limit_for_over_time_hours = models.FloatField(default=0)
+    amount_until_over_time_hours_limit = models.FloatField(default=0)
+
+    # fields filled with Pensum's properties of the same name
+    PENSUM_PROPERTIES = [
+        'pensum_contact_hours', 'pensum_additional_hours', 'pensum_additional_hours_not_counted_into_limit',
+        'calculated_threshold', 'min_for_contact_hours', 'amount_until_contact_hours_min', 'limit_for_contact_hours',
+        'amount_until_contact_hours_limit', 'limit_for_over_time_hours', 'amount_until_over_time_hours_limit'
+    ]
+
+    def __str__(self):
+        return f"Totals of {self.pensum}"
+
+    @classmethod
+    def refresh(cls, pensums):
+        """
+        Recalculates totals of given pensums (rows are updated or created)
+
+        params: pensums - Pensum queryset
+        return: list of PensumTotals instances
+        """
+        with transaction.atomic():
+            # existing rows are locked before hours are summed, so plan hours reservations of concurrent transactions
+            # (see orders.reservations) are not overwritten
+            list(cls.objects.select_for_update().filter(pensum__in=pensums.values('pk')).values_list('pk'))
+            totals = [
+                cls(pensum_id=pk, exam_hours=values['exam_hours'],
+                    **{name: values[name] for name in cls.PENSUM_PROPERTIES})
+                for pk, values in calculate_pensums_values(pensums).items()
+            ]
+            if not totals:
+                return totals
+            existing_pks = set(cls.objects.filter(pk__in=[item.pensum_id for item in totals]).values_list(
+                'pk', flat=True))
+            cls.objects.bulk_update(
+                [item for item in totals if item.pensum_id in existing_pks],
+                fields=['exam_hours', *cls.PENSUM_PROPERTIES], batch_size=500)
+            cls.objects.bulk_create(
+                [item for item in totals if item.pensum_id not in existing_pks], batch_size=500,
+                ignore_conflicts=True)
+        return totals
+
+
 class PensumBasicThresholdFactors(models.Model):
-    ADD = 'Addition'
-    MUL = 'Multiplication'
+    ADD = ADDITION
+    MUL = MULTIPLICATION
     TYPES = [
         (ADD, ADD),
         (MUL, MUL),
@@ -118,10 +293,7 @@ class PensumBasicThresholdFactors(models.Model):
             f" (name: {self.name})" if self.name else "")
 
     def calculate_value(self, value):
-        if self.factor_type == self.ADD:
-            return value + self.value
-        if self.factor_type == self.MUL:
-            return value * self.value
+        return apply_basic_threshold_factor(self.factor_type, self.value, value)
 
 
 class PensumReductions(models.Model):
@@ -185,5 +357,5 @@ class ExamsAdditionalHours(models.Model):
     def total_factor_hours(self):
         if not self.module.main_order:
             return 0
-        if self.module.main_order.students_number > ExamsFactors.min_students_number:
+        if self.module.main_order.students_number > ExamsFactors().min_students_number:
             return self.portion * get_exam_hours(self.module, self.type)
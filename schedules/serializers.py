@@ -1,9 +1,11 @@
 import math
 
 from rest_framework.exceptions import ValidationError
+from rest_framework.fields import BooleanField, CharField, ChoiceField, FloatField, IntegerField, ReadOnlyField, \
+    SlugField
 from rest_framework.generics import get_object_or_404
 from rest_framework.relations import HyperlinkedIdentityField, SlugRelatedField, StringRelatedField
-from rest_framework.serializers import ModelSerializer
+from rest_framework.serializers import ModelSerializer, Serializer
 from rest_framework_nested.relations import NestedHyperlinkedIdentityField
 from rest_framework_nested.serializers import NestedHyperlinkedModelSerializer
 
@@ -12,7 +14,7 @@ from employees.models import Employees
 from modules.models import Modules
 from orders.serializers import EmployeePlansSerializer
 from utils.relations import AdvNestedHyperlinkedIdentityField, ParentHiddenRelatedField
-from utils.serializers import SerializerLambdaField
+from utils.serializers import SerializerLambdaField, get_request_cached_object
 from .models import ExamsAdditionalHours, Pensum, PensumAdditionalHoursFactors, PensumBasicThresholdFactors, \
     PensumReductions, Schedules
 
@@ -41,6 +43,20 @@ class ScheduleSerializer(ModelSerializer):
     )
 
 
+class ScheduleCloneSerializer(Serializer):
+    """
+    Schedule Clone Serializer - options of schedule's copy (see schedules.cloning)
+    """
+    slug = SlugField()
+    plans = BooleanField(default=False)
+    exams = BooleanField(default=False)
+
+    def validate_slug(self, value):
+        if Schedules.objects.filter(slug=value).exists():
+            raise ValidationError(f"Schedule {value} already exists.")
+        return value
+
+
 class PensumBasicThresholdFactorSerializer(NestedHyperlinkedModelSerializer):
     class Meta:
         model = PensumBasicThresholdFactors
@@ -144,8 +160,9 @@ class PensumAdditionalHoursFactorsSerializer(NestedHyperlinkedModelSerializer):
         pensum_filter_kwargs = {
             'schedule__slug': url_kwargs['schedule_slug'],
             'employee__abbreviation': url_kwargs['pensums_employee']}
-        # finding parent pensum instance
-        pensum = get_object_or_404(Pensum, **pensum_filter_kwargs)
+        # finding parent pensum instance (shared within request)
+        pensum = get_request_cached_object(self.context['request'], Pensum.objects.with_totals(),
+                                           **pensum_filter_kwargs)
         tmp = pensum.amount_until_over_time_hours_limit + (self.instance.value_per_unit if self.instance else 0)
         if value > tmp:
             if not max_value_to_set or tmp < max_value_to_set:
@@ -199,19 +216,10 @@ class ModulesToSetupRelatedField(SlugRelatedField):
             employee__abbreviation=self.context.get('request').resolver_match.kwargs.get('pensums_employee'),
             schedule__slug=schedule_slug
         )
-        queryset = self.queryset.filter(schedule__slug=schedule_slug)
-        # exclude modules with no orders at all (cannot simply exclude as main_order is a property)
-        modules_pk_to_exclude = [module.pk for module in queryset if not module.main_order]
-        # exclude employee's staffed exams
-        modules_pk_to_exclude.extend([exam.module.pk for exam in pensum.exams_additional_hours.all()])
-        # exclude already fully staffed exams
-        for module in queryset:
-            if module.exams_portion_staffed >= 1 and module.pk not in modules_pk_to_exclude:
-                modules_pk_to_exclude.append(module.pk)
-        # do not exclude instance if present
-        if self.root.instance:
-            modules_pk_to_exclude.remove(self.root.instance.module.pk)
-        return queryset.exclude(pk__in=set(modules_pk_to_exclude))
+        # exclude modules with no orders at all, employee's staffed exams and already fully staffed exams
+        # (do not exclude instance's module if present)
+        return self.queryset.filter(schedule__slug=schedule_slug).unstaffed_exams(
+            pensum=pensum, include=self.root.instance.module_id if self.root.instance else None)
 
 
 class ExamsAdditionalHoursSerializer(NestedHyperlinkedModelSerializer):
@@ -242,7 +250,7 @@ class ExamsAdditionalHoursSerializer(NestedHyperlinkedModelSerializer):
     module = ModulesToSetupRelatedField(slug_field='module_code', queryset=Modules.objects.filter(examination=True))
     module_name = SerializerLambdaField(lambda obj: obj.module.name)
     students_number = SerializerLambdaField(
-        lambda obj: obj.module.main_order.students_number if obj.module.main_order else None)
+        lambda obj: obj.module.main_order.students_number if obj.module.main_order_id else None)
 
     pensum = ParentHiddenRelatedField(
         queryset=Pensum.objects.all(),
@@ -262,14 +270,15 @@ class ExamsAdditionalHoursSerializer(NestedHyperlinkedModelSerializer):
             'schedule__slug': url_kwargs['schedule_slug'],
             'module_code': self.initial_data.get('module')}
         # finding parent module instance
-        module = get_object_or_404(Modules, **module_filter_kwargs)
+        module = get_object_or_404(Modules.objects.select_related('main_order'), **module_filter_kwargs)
         pensum_filter_kwargs = {
             'schedule__slug': url_kwargs['schedule_slug'],
             'employee__abbreviation': url_kwargs['pensums_employee']}
-        # finding parent pensum instance
-        pensum = get_object_or_404(Pensum, **pensum_filter_kwargs)
+        # finding parent pensum instance (shared within request)
+        pensum = get_request_cached_object(self.context['request'], Pensum.objects.with_totals(),
+                                           **pensum_filter_kwargs)
         exam_hours = get_exam_hours(module, self.initial_data.get('type'))
-        if module.main_order and module.main_order.students_number > ExamsFactors.min_students_number:
+        if module.main_order and module.main_order.students_number > ExamsFactors().min_students_number:
             if pensum.amount_until_over_time_hours_limit < exam_hours * (
                 value - (self.instance.portion if self.instance else 0)
             ):
@@ -279,7 +288,6 @@ class ExamsAdditionalHoursSerializer(NestedHyperlinkedModelSerializer):
                 reason = "Value exceeds employee's pensum additional hours limit."
 
         # get sum of all portions for this module's exam
-        module = get_object_or_404(Modules, **{'module_code': self.initial_data.get('module')})
         portion_to_set = module.exams_portion_staffed
         if self.instance:
             portion_to_set -= self.instance.portion
@@ -401,3 +409,82 @@ class PensumListSerializer(PensumSerializer):
                   'calculated_threshold',
                   'pensum_contact_hours', 'amount_until_contact_hours_min',
                   'pensum_additional_hours', 'amount_until_over_time_hours_limit']
+
+    # values read from denormalized PensumTotals row
+    calculated_threshold = ReadOnlyField(source='totals.calculated_threshold')
+    pensum_contact_hours = ReadOnlyField(source='totals.pensum_contact_hours')
+    amount_until_contact_hours_min = ReadOnlyField(source='totals.amount_until_contact_hours_min')
+    pensum_additional_hours = ReadOnlyField(source='totals.pensum_additional_hours')
+    amount_until_over_time_hours_limit = ReadOnlyField(source='totals.amount_until_over_time_hours_limit')
+
+
+class AvailableEmployeeSerializer(PensumListSerializer):
+    class Meta:
+        model = Pensum
+        fields = ['url',
+                  'employee_url', 'first_name', 'last_name', 'employee', 'pensum_group',
+                  'amount_until_contact_hours_limit', 'amount_until_over_time_hours_limit']
+
+    amount_until_contact_hours_limit = ReadOnlyField(source='totals.amount_until_contact_hours_limit')
+
+
+class UnstaffedExamSerializer(ModelSerializer):
+    """
+    Unstaffed Exam Serializer - examination module with exam's portion left to staff (see
+    ModulesQuerySet.unstaffed_exams)
+    """
+
+    class Meta:
+        model = Modules
+        fields = ['module_url', 'module_code', 'name', 'students_number', 'portion_staffed', 'portion_to_staff']
+
+    module_url = AdvNestedHyperlinkedIdentityField(
+        view_name='modules-detail',
+        lookup_field='module_code',
+        lookup_url_kwarg='module_code',
+        parent_lookup_kwargs={'schedule_slug': 'schedule__slug'}
+    )
+    students_number = ReadOnlyField(source='main_order.students_number')
+    portion_staffed = ReadOnlyField(source='exams_portion_staffed')
+    portion_to_staff = SerializerLambdaField(lambda obj: round(1 - obj.exams_portion_staffed, 3))
+
+
+class SimulationEditSerializer(Serializer):
+    """
+    Simulation Edit Serializer - single hypothetical edit of a plan, factor or exam (see schedules.simulation)
+    """
+    # fields required by edit's type
+    REQUIRED_FIELDS = {
+        'plan': ['module_code', 'classes_name', 'plan_hours'],
+        'additional_hours_factor': ['name', 'value_per_unit', 'amount'],
+        'basic_threshold_factor': [],
+        'exam': ['module_code', 'exam_type', 'portion'],
+    }
+
+    type = ChoiceField(choices=list(REQUIRED_FIELDS))
+    employee = CharField()
+    pk = IntegerField(required=False)
+    module_code = CharField(required=False)
+    classes_name = CharField(required=False)
+    plan_hours = IntegerField(required=False, min_value=0)
+    name = ChoiceField(choices=PensumAdditionalHoursFactors.ADDITIONAL_HOURS_CHOICES, required=False)
+    value_per_unit = IntegerField(required=False, min_value=0)
+    amount = IntegerField(required=False, min_value=0)
+    factor_type = ChoiceField(choices=PensumBasicThresholdFactors.TYPES, required=False)
+    value = FloatField(required=False)
+    delete = BooleanField(required=False, default=False)
+    exam_type = ChoiceField(choices=ExamsAdditionalHours.EXAM_TYPES_CHOICES, required=False)
+    portion = FloatField(required=False, min_value=0, max_value=1)
+
+    def validate(self, attrs):
+        required = self.REQUIRED_FIELDS[attrs['type']]
+        if attrs['type'] == 'basic_threshold_factor' and not attrs.get('delete'):
+            required = ['factor_type', 'value']
+        missing = {name: ['This field is required.'] for name in required if name not in attrs}
+        if missing:
+            raise ValidationError(missing)
+        return attrs
+
+
+class SimulationSerializer(Serializer):
+    edits = SimulationEditSerializer(many=True)
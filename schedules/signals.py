@@ -0,0 +1,100 @@
+import threading
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from employees.models import Employees
+from modules.models import Modules
+from orders.models import Orders, Plans
+from .models import (ExamsAdditionalHours, Pensum, PensumAdditionalHoursFactors, PensumBasicThresholdFactors,
+                     PensumReductions, PensumTotals)
+
+# callback of the current transaction refreshing totals of pensums gathered in its filters (per thread)
+_pending = threading.local()
+
+
+def refresh_totals_callback(pensum_filter):
+    """
+    Creates on_commit callback refreshing totals of pensums matching any of its filters (see schedule_totals_refresh)
+
+    params: pensum_filter - first Q object of the filters
+    return: callback function with list of filters in its filters attribute
+    """
+    filters = [pensum_filter]
+
+    def refresh_totals():
+        PensumTotals.refresh(Pensum.objects.filter(reduce(or_, filters)).distinct())
+
+    refresh_totals.filters = filters
+    return refresh_totals
+
+
+def schedule_totals_refresh(pensum_filter):
+    """
+    Marks pensums matching filter for totals refresh. Refresh is done after the current transaction commits and a
+    single callback refreshes all pending pensums of the transaction at once, so cascade deletes and bulk changes do
+    not recalculate the same pensum over and over. Filters of a rolled back transaction are dropped with its callback.
+
+    params: pensum_filter - Q object filtering Pensum queryset
+    """
+    connection = transaction.get_connection()
+    callback = getattr(_pending, 'callback', None)
+    # callback waits for the commit only within atomic block, until it is run or dropped by the rollback
+    if not (connection.in_atomic_block and any(func is callback for _, func in connection.run_on_commit)):
+        _pending.callback = refresh_totals_callback(pensum_filter)
+        transaction.on_commit(_pending.callback)
+    else:
+        callback.filters.append(pensum_filter)
+
+
+@receiver([post_save, post_delete], sender=Pensum)
+def pensum_changed(sender, instance, **kwargs):
+    schedule_totals_refresh(Q(pk=instance.pk))
+
+
+@receiver([post_save, post_delete], sender=PensumBasicThresholdFactors)
+@receiver([post_save, post_delete], sender=PensumReductions)
+@receiver([post_save, post_delete], sender=PensumAdditionalHoursFactors)
+@receiver([post_save, post_delete], sender=ExamsAdditionalHours)
+def pensum_factor_changed(sender, instance, **kwargs):
+    # drop memoized values of pensum instance kept in memory with the factor
+    if sender._meta.get_field('pensum').is_cached(instance):
+        instance.pensum.invalidate_values()
+    schedule_totals_refresh(Q(pk=instance.pensum_id))
+
+
+@receiver([post_save, post_delete], sender=Plans)
+def plan_changed(sender, instance, **kwargs):
+    # employee's contact hours are summed from all of his plans
+    schedule_totals_refresh(Q(employee=instance.employee_id))
+
+
+@receiver([post_save, post_delete], sender=Orders)
+def order_changed(sender, instance, **kwargs):
+    # students number of the module's main order is used for exams additional hours
+    schedule_totals_refresh(Q(exams_additional_hours__module__form_of_classes=instance.classes_id))
+
+
+@receiver(post_save, sender=Modules)
+def module_changed(sender, instance, **kwargs):
+    # module's language decides about plans additional hours
+    schedule_totals_refresh(Q(employee__plans__order__classes__module=instance.pk))
+
+
+@receiver(post_save, sender=Employees)
+def employee_changed(sender, instance, **kwargs):
+    # part of job time is used for calculating threshold and limits
+    schedule_totals_refresh(Q(employee=instance.pk))
+
+
+def employees_changed(instances):
+    """
+    Refreshes totals of employees saved with bulk queries (no post_save signal sent)
+
+    params: instances - saved employees
+    """
+    schedule_totals_refresh(Q(employee__in=[instance.pk for instance in instances]))
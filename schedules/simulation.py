@@ -0,0 +1,212 @@
+from collections import defaultdict
+from itertools import count
+
+from AGH.AGH_utils import AdditionalHoursFactorData, ExamsFactors
+from modules.models import Modules
+from orders.models import Orders, Plans, get_plans_additional_hours
+from .calculations import calculate_pensum_values, load_pensums_inputs
+from .models import ExamsAdditionalHours, Pensum, PensumAdditionalHoursFactors, PensumBasicThresholdFactors
+
+# pensum values reported by simulation
+SIMULATED_PENSUM_VALUES = ['calculated_threshold', 'pensum_contact_hours', 'pensum_additional_hours',
+                           'amount_until_contact_hours_min', 'amount_until_contact_hours_limit',
+                           'amount_until_over_time_hours_limit']
+
+
+def exam_hours_per_portion(students_number, exam_type):
+    """
+    Exam hours of the whole exam (portion equal 1) - see ExamsAdditionalHours.total_factor_hours
+    """
+    exams_factors = ExamsFactors()
+    if not students_number or students_number <= exams_factors.min_students_number:
+        return 0
+    return students_number * (
+        exams_factors.factor_for_written_exam if exam_type != 'Oral' else exams_factors.factor_for_oral_exam)
+
+
+class ScheduleSimulation:
+    """
+    In-memory model of schedule's pensums and orders for "what if" calculations.
+    Affected part of the schedule is loaded once (a few queries), then edits are applied to plain values and pensums
+    are recalculated with calculate_pensum_values() - nothing is written to the database.
+
+    Edits (dictionaries, see SimulationEditSerializer):
+    plan - module_code, classes_name, employee, plan_hours (new hours of the plan, 0 removes it)
+    additional_hours_factor - employee, pk (optional - existing factor to change), name, value_per_unit, amount
+    (0 removes the factor)
+    basic_threshold_factor - employee, pk (optional - existing factor to change), factor_type, value, delete
+    exam - employee, module_code, exam_type, portion (0 removes the exam)
+
+    params: schedule_slug - slug of the schedule
+    params: edits - list of edits
+    """
+
+    def __init__(self, schedule_slug, edits):
+        self.schedule_slug = schedule_slug
+        self.edits = edits
+        self.errors = [{} for _ in edits]
+        # keys of simulated new basic threshold factors
+        self.new_factors = count()
+        self.load()
+
+    def load(self):
+        employees = {edit['employee'] for edit in self.edits}
+        self.pensums = dict(Pensum.objects.filter(
+            schedule__slug=self.schedule_slug, employee__abbreviation__in=employees
+        ).values_list('employee__abbreviation', 'pk'))
+        self.inputs = load_pensums_inputs(Pensum.objects.filter(pk__in=self.pensums.values()))
+        self.before = {pk: calculate_pensum_values(**inputs) for pk, inputs in self.inputs.items()}
+
+        # orders and plans of plan edits
+        plan_edits = [edit for edit in self.edits if edit['type'] == 'plan']
+        self.orders = {}
+        for pk, module_code, classes_name, language, order_hours, plans_sum_hours in Orders.objects.filter(
+                classes__module__schedule__slug=self.schedule_slug,
+                classes__module__module_code__in={edit['module_code'] for edit in plan_edits}
+        ).annotate_metrics().values_list(
+                'pk', 'classes__module__module_code', 'classes__name', 'classes__module__language',
+                'order_hours_value', 'plans_sum_hours_value'):
+            self.orders[(module_code, classes_name)] = {
+                'pk': pk, 'factor': get_plans_additional_hours(Modules(language=language), 1),
+                'order_hours': order_hours, 'plans_sum_hours': plans_sum_hours,
+                'plans_sum_hours_before': plans_sum_hours,
+            }
+        orders_keys = {order['pk']: key for key, order in self.orders.items()}
+        self.plans = {
+            (orders_keys[order], abbreviation): hours for order, abbreviation, hours in Plans.objects.filter(
+                order__in=orders_keys, employee__abbreviation__in=employees
+            ).values_list('order', 'employee__abbreviation', 'plan_hours')
+        }
+
+        # existing additional hours factors and basic threshold factors of edited pensums
+        self.additional_hours_factors = {
+            pk: (pensum, name, value_per_unit * amount) for pk, pensum, name, value_per_unit, amount in
+            PensumAdditionalHoursFactors.objects.filter(pensum__in=self.pensums.values()).values_list(
+                'pk', 'pensum', 'name', 'value_per_unit', 'amount')
+        }
+        self.basic_threshold_factors = defaultdict(dict)
+        for pk, pensum, factor_type, value in PensumBasicThresholdFactors.objects.filter(
+                pensum__in=self.pensums.values()).order_by('pk').values_list('pk', 'pensum', 'factor_type', 'value'):
+            self.basic_threshold_factors[pensum][pk] = (factor_type, value)
+
+        # exams of exam edits with students number of modules' main orders (see Modules.main_order)
+        exam_modules = {edit['module_code'] for edit in self.edits if edit['type'] == 'exam'}
+        self.modules = {}
+        self.main_order_students = {}
+        for module_code, pk, students_number in Modules.objects.filter(
+                schedule__slug=self.schedule_slug, module_code__in=exam_modules
+        ).values_list('module_code', 'pk', 'main_order__students_number'):
+            self.modules[module_code] = pk
+            self.main_order_students[module_code] = students_number
+        modules_codes = {pk: module_code for module_code, pk in self.modules.items()}
+        self.exams = {
+            (pensum, modules_codes[module]): exam_hours_per_portion(
+                self.main_order_students.get(modules_codes[module]), exam_type) * portion
+            for pensum, module, exam_type, portion in ExamsAdditionalHours.objects.filter(
+                pensum__in=self.pensums.values(), module__in=self.modules.values()
+            ).values_list('pensum', 'module', 'type', 'portion')
+        }
+
+    def run(self):
+        """
+        Applies edits in order
+
+        return: True if all edits were valid
+        """
+        for edit, errors in zip(self.edits, self.errors):
+            pensum = self.pensums.get(edit['employee'])
+            if pensum is None:
+                errors['employee'] = [f"Employee {edit['employee']} has no pensum in this schedule."]
+                continue
+            getattr(self, f"apply_{edit['type']}")(edit, pensum, errors)
+        return not any(self.errors)
+
+    def apply_plan(self, edit, pensum, errors):
+        order = self.orders.get((edit['module_code'], edit['classes_name']))
+        if not order:
+            errors['classes_name'] = [f"Order of {edit['module_code']} module's {edit['classes_name']} classes "
+                                      f"does not exist in this schedule."]
+            return
+        key = ((edit['module_code'], edit['classes_name']), edit['employee'])
+        difference = edit['plan_hours'] - self.plans.get(key, 0)
+        self.plans[key] = edit['plan_hours']
+        order['plans_sum_hours'] += difference
+        self.inputs[pensum]['contact_hours'] += difference
+        self.inputs[pensum]['plans_additional_hours'] += difference * order['factor']
+
+    def apply_additional_hours_factor(self, edit, pensum, errors):
+        hours = edit['value_per_unit'] * edit['amount']
+        if edit.get('pk'):
+            if self.additional_hours_factors.get(edit['pk'], (None,))[0] != pensum:
+                errors['pk'] = [f"Additional hours factor {edit['pk']} does not exist in employee's pensum."]
+                return
+            _, name, old_hours = self.additional_hours_factors[edit['pk']]
+            self.change_factors_hours(pensum, name, -old_hours)
+        self.change_factors_hours(pensum, edit['name'], hours)
+        if edit.get('pk'):
+            self.additional_hours_factors[edit['pk']] = (pensum, edit['name'], hours)
+
+    def change_factors_hours(self, pensum, name, hours):
+        self.inputs[pensum]['factors_hours'] += hours
+        if not AdditionalHoursFactorData(name).is_counted_into_limit:
+            self.inputs[pensum]['factors_hours_not_counted'] += hours
+
+    def apply_basic_threshold_factor(self, edit, pensum, errors):
+        factors = self.basic_threshold_factors[pensum]
+        if edit.get('pk'):
+            if edit['pk'] not in factors:
+                errors['pk'] = [f"Basic threshold factor {edit['pk']} does not exist in employee's pensum."]
+                return
+            if edit.get('delete'):
+                del factors[edit['pk']]
+            else:
+                factors[edit['pk']] = (edit['factor_type'], edit['value'])
+        elif edit.get('delete'):
+            errors['pk'] = ["Basic threshold factor to delete is not given."]
+            return
+        else:
+            # new factors are calculated last (biggest pk)
+            factors[('new', next(self.new_factors))] = (edit['factor_type'], edit['value'])
+        self.inputs[pensum]['factors'] = list(factors.values())
+
+    def apply_exam(self, edit, pensum, errors):
+        if edit['module_code'] not in self.modules:
+            errors['module_code'] = [f"Module {edit['module_code']} does not exist in this schedule."]
+            return
+        key = (pensum, edit['module_code'])
+        hours = exam_hours_per_portion(self.main_order_students.get(edit['module_code']), edit['exam_type']) * \
+            edit['portion']
+        self.inputs[pensum]['exam_hours'] += hours - self.exams.get(key, 0)
+        self.exams[key] = hours
+
+    def result(self):
+        """
+        return: dictionary with values of edited pensums and orders before and after edits and their deltas
+        """
+        employees = {pk: abbreviation for abbreviation, pk in self.pensums.items()}
+        pensums = []
+        for pk, inputs in self.inputs.items():
+            after = calculate_pensum_values(**inputs)
+            pensums.append({
+                'employee': employees[pk],
+                'before': {name: self.before[pk][name] for name in SIMULATED_PENSUM_VALUES},
+                'after': {name: after[name] for name in SIMULATED_PENSUM_VALUES},
+                'delta': {name: round(after[name] - self.before[pk][name], 2) for name in SIMULATED_PENSUM_VALUES},
+                'limits_exceeded': after['amount_until_contact_hours_limit'] < 0 or
+                after['amount_until_over_time_hours_limit'] < 0,
+            })
+        orders = [
+            {
+                'module_code': module_code,
+                'classes_name': classes_name,
+                'order_hours': order['order_hours'],
+                'plans_sum_hours_before': order['plans_sum_hours_before'],
+                'plans_sum_hours_after': order['plans_sum_hours'],
+                'delta': order['plans_sum_hours'] - order['plans_sum_hours_before'],
+                'order_hours_exceeded': order['plans_sum_hours'] > order['order_hours'],
+            }
+            for (module_code, classes_name), order in self.orders.items()
+            if order['plans_sum_hours'] != order['plans_sum_hours_before']
+        ]
+        return {'pensums': sorted(pensums, key=lambda item: item['employee']),
+                'orders': sorted(orders, key=lambda item: (item['module_code'], item['classes_name']))}
@@ -0,0 +1,223 @@
+import heapq
+import math
+from collections import defaultdict
+
+# numbers of pensums checked for every unstaffed order during local search
+LOCAL_SEARCH_CANDIDATES = 10
+# numbers of pensums skipped (not able to take order's hours) before giving up on the order in greedy phase
+GREEDY_SKIP_LIMIT = 50
+
+
+def _floor(value):
+    # plans hours are integers, small tolerance for float sums
+    return max(math.floor(value + 1e-9), 0)
+
+
+class StaffingSolver:
+    """
+    Proposes plans filling orders' free hours with pensums' remaining capacity.
+
+    Every plan hour takes one contact hour and (1 + factor) over time hours of the pensum, where factor is congress
+    language factor of order's module (see orders.models.get_plans_additional_hours). Solution starts with greedy seed
+    (biggest orders first, each one given to the pensums with the biggest capacity, so orders are split as little as
+    possible) and is improved with local search: pensums limited by over time hours swap hours of orders with higher
+    factor for hours of orders with lower factor of donor pensums (with over time hours left), so freed over time
+    hours let them take hours of still unstaffed orders.
+
+    params: orders - dictionary of order's key and tuple of its free hours and factor
+    params: pensums - dictionary of pensum's key and tuple of its free contact hours and free over time hours
+    """
+
+    def __init__(self, orders, pensums):
+        self.orders = orders
+        self.remaining = {key: _floor(hours) for key, (hours, factor) in orders.items()}
+        # [contact hours, over time hours] left
+        self.capacity = {key: [contact_hours, over_time_hours] for key, (contact_hours, over_time_hours) in
+                         pensums.items()}
+        # {pensum's key: {order's key: hours}}
+        self.plans = defaultdict(dict)
+
+    def capacity_for(self, pensum, factor):
+        """
+        return: number of hours of order with given factor pensum is able to take
+        """
+        contact_hours, over_time_hours = self.capacity[pensum]
+        return _floor(min(contact_hours, over_time_hours / (1 + factor)))
+
+    def assign(self, order, pensum, hours):
+        factor = self.orders[order][1]
+        self.capacity[pensum][0] -= hours
+        self.capacity[pensum][1] -= hours * (1 + factor)
+        self.remaining[order] -= hours
+        self.plans[pensum][order] = self.plans[pensum].get(order, 0) + hours
+        if not self.plans[pensum][order]:
+            del self.plans[pensum][order]
+
+    def solve(self, local_search_passes=3):
+        """
+        return: dictionary of (order's key, pensum's key) pairs and their hours
+        """
+        self.greedy()
+        for _ in range(local_search_passes):
+            if not self.local_search():
+                break
+        return {(order, pensum): hours for pensum, plans in self.plans.items() for order, hours in plans.items()}
+
+    def greedy(self):
+        # max-heap of pensums by capacity (for factor 0), entries are updated lazily
+        heap = [(-self.capacity_for(pensum, 0), str(pensum), pensum) for pensum in self.capacity]
+        heap = [entry for entry in heap if entry[0] < 0]
+        heapq.heapify(heap)
+        # the biggest (counted with over time hours) orders first
+        for order in sorted(self.remaining, key=lambda key: -self.remaining[key] * (1 + self.orders[key][1])):
+            factor = self.orders[order][1]
+            skipped = []
+            while self.remaining[order] and heap and len(skipped) < GREEDY_SKIP_LIMIT:
+                key, name, pensum = heapq.heappop(heap)
+                current = self.capacity_for(pensum, 0)
+                if current != -key:
+                    if current:
+                        heapq.heappush(heap, (-current, name, pensum))
+                    continue
+                hours = min(self.remaining[order], self.capacity_for(pensum, factor))
+                if not hours:
+                    skipped.append((key, name, pensum))
+                    continue
+                self.assign(order, pensum, hours)
+                current = self.capacity_for(pensum, 0)
+                if current:
+                    heapq.heappush(heap, (-current, name, pensum))
+            for entry in skipped:
+                heapq.heappush(heap, entry)
+
+    def local_search(self):
+        """
+        One pass of local search. Pensums limited by over time hours (with contact hours left) swap hours of orders
+        with higher factor for hours of orders with lower factor of pensums limited by contact hours (with over time
+        hours left). Contact hours of both stay the same, but freed over time hours let the first pensum take hours
+        of unstaffed orders.
+
+        return: True if any unstaffed hours were assigned
+        """
+        improved = False
+        # orders with the lowest factor (the cheapest in over time hours) first
+        unstaffed = sorted([order for order, hours in self.remaining.items() if hours],
+                           key=lambda key: self.orders[key][1])
+        if not unstaffed:
+            return improved
+        lowest_factor = self.orders[unstaffed[0]][1]
+        # pensums with contact hours left, but limited by over time hours
+        receivers = sorted(
+            [key for key, (contact_hours, over_time_hours) in self.capacity.items()
+             if _floor(contact_hours) > self.capacity_for(key, lowest_factor)],
+            key=lambda key: -self.capacity[key][0])
+        # pensums with over time hours left
+        donors = sorted(
+            [key for key, (contact_hours, over_time_hours) in self.capacity.items() if over_time_hours > contact_hours],
+            key=lambda key: -(self.capacity[key][1] - self.capacity[key][0]))
+
+        for pensum in receivers:
+            if not unstaffed:
+                break
+            # over time hours needed to use all contact hours left
+            wanted = _floor(self.capacity[pensum][0]) * (1 + lowest_factor) - self.capacity[pensum][1]
+            for high_order, high_hours in sorted(self.plans[pensum].items(), key=lambda item: -self.orders[item[0]][1]):
+                donors = [donor for donor in donors if self.capacity[donor][1] > self.capacity[donor][0]]
+                for donor in donors[:LOCAL_SEARCH_CANDIDATES]:
+                    if wanted <= 0 or not high_hours:
+                        break
+                    if donor == pensum:
+                        continue
+                    for low_order, low_hours in list(self.plans[donor].items()):
+                        difference = self.orders[high_order][1] - self.orders[low_order][1]
+                        if difference <= 0 or low_order == high_order:
+                            continue
+                        hours = min(high_hours, low_hours, _floor(self.capacity[donor][1] / difference),
+                                    math.ceil(wanted / difference))
+                        if hours <= 0:
+                            continue
+                        self.assign(high_order, pensum, -hours)
+                        self.assign(low_order, donor, -hours)
+                        self.assign(high_order, donor, hours)
+                        self.assign(low_order, pensum, hours)
+                        high_hours -= hours
+                        wanted -= hours * difference
+                        if wanted <= 0 or not high_hours:
+                            break
+                if wanted <= 0:
+                    break
+
+            # fill freed hours with unstaffed orders
+            for order in unstaffed[:GREEDY_SKIP_LIMIT]:
+                if not self.capacity_for(pensum, lowest_factor):
+                    break
+                hours = min(self.remaining[order], self.capacity_for(pensum, self.orders[order][1]))
+                if hours:
+                    self.assign(order, pensum, hours)
+                    improved = True
+            unstaffed = [order for order in unstaffed if self.remaining[order]]
+        return improved
+
+
+def propose_staffing(schedule_slug, local_search_passes=3):
+    """
+    Proposes plans filling free hours of schedule's orders without breaking pensums' limits (see StaffingSolver)
+
+    params: schedule_slug - slug of the schedule
+    return: dictionary with proposed plans (in format of bulk plans endpoint, plan hours include existing plans' hours)
+    and orders left unstaffed
+    """
+    from modules.models import Modules
+    from orders.models import Orders, Plans, get_plans_additional_hours
+    from .calculations import calculate_pensums_values
+    from .models import Pensum
+
+    factors = {}
+    orders = {}
+    orders_names = {}
+    for pk, module_code, classes_name, language, order_hours, plans_sum_hours in Orders.objects.filter(
+            classes__module__schedule__slug=schedule_slug).annotate_metrics().values_list(
+            'pk', 'classes__module__module_code', 'classes__name', 'classes__module__language',
+            'order_hours_value', 'plans_sum_hours_value'):
+        if language not in factors:
+            factors[language] = get_plans_additional_hours(Modules(language=language), 1)
+        orders_names[pk] = (module_code, classes_name)
+        if order_hours > plans_sum_hours:
+            orders[pk] = (order_hours - plans_sum_hours, factors[language])
+
+    pensums = Pensum.objects.filter(schedule__slug=schedule_slug)
+    employees = dict(pensums.values_list('pk', 'employee__abbreviation'))
+    capacities = {
+        pk: (values['limit_for_contact_hours'] - values['pensum_contact_hours'],
+             values['amount_until_over_time_hours_limit'])
+        for pk, values in calculate_pensums_values(pensums).items()
+    }
+
+    solver = StaffingSolver(orders, capacities)
+    assignments = solver.solve(local_search_passes)
+
+    existing_hours = {
+        (order, abbreviation): hours for order, abbreviation, hours in Plans.objects.filter(
+            order__in={order for order, pensum in assignments}).values_list(
+            'order', 'employee__abbreviation', 'plan_hours')
+    }
+    plans = []
+    for (order, pensum), hours in sorted(assignments.items(), key=lambda item: (orders_names[item[0][0]],
+                                                                                  employees[item[0][1]])):
+        existing = existing_hours.get((order, employees[pensum]), 0)
+        plans.append({
+            'module_code': orders_names[order][0],
+            'classes_name': orders_names[order][1],
+            'employee': employees[pensum],
+            'plan_hours': existing + hours,
+            'added_hours': hours,
+        })
+    return {
+        'staffed_hours': sum(assignments.values()),
+        'unstaffed_hours': sum(solver.remaining.values()),
+        'plans': plans,
+        'unstaffed': [
+            {'module_code': orders_names[order][0], 'classes_name': orders_names[order][1], 'hours': hours}
+            for order, hours in sorted(solver.remaining.items(), key=lambda item: orders_names[item[0]]) if hours
+        ],
+    }
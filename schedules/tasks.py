@@ -0,0 +1,141 @@
+from django.db import IntegrityError, transaction
+from rest_framework.generics import get_object_or_404
+
+from AGH.AGH_utils import get_pensum
+from employees.models import Employees
+from jobs.tasks import register_task
+from utils.streaming import EXPORT_CHUNK_SIZE
+from .cloning import clone_schedule
+from .models import Pensum, PensumTotals, Schedules
+
+
+def check_and_overwrite_pensum_values(schedule_slug, job=None):
+    """
+    Creates missing pensums of schedule and updates basic thresholds of existing ones
+
+    params: schedule_slug - slug of the schedule
+    params: job - (optional) job instance for progress reports
+    return: list of report dictionaries
+    """
+    schedule = get_object_or_404(Schedules, slug=schedule_slug)
+    employees = list(Employees.objects.select_related('position'))
+    pensums = {pensum.employee_id: pensum for pensum in schedule.pensums.all()}
+    # basic thresholds of position-group pairs
+    thresholds = {}
+
+    pensums_to_create = {}
+    pensums_to_update = []
+    for employee in employees:
+        key = (employee.position.name, employee.pensum_group)
+        if key not in thresholds:
+            thresholds[key] = get_pensum(*key)
+        pensum = pensums.get(employee.pk)
+        if pensum is None:
+            pensums_to_create[employee.pk] = Pensum(schedule=schedule, employee=employee,
+                                                    basic_threshold=thresholds[key] or 0)
+        elif pensum.basic_threshold != (thresholds[key] or 0):
+            pensum.basic_threshold = thresholds[key] or 0
+            pensums_to_update.append(pensum)
+    if job:
+        job.set_progress(0.5)
+
+    with transaction.atomic():
+        while pensums_to_create:
+            try:
+                with transaction.atomic():
+                    Pensum.objects.bulk_create(pensums_to_create.values(), batch_size=500)
+                break
+            except IntegrityError:
+                # pensums created by concurrent transactions in the meantime are updated instead
+                created_meanwhile = list(schedule.pensums.filter(employee__in=list(pensums_to_create)))
+                if not created_meanwhile:
+                    raise
+                for pensum in created_meanwhile:
+                    basic_threshold = pensums_to_create.pop(pensum.employee_id).basic_threshold
+                    if pensum.basic_threshold != basic_threshold:
+                        pensum.basic_threshold = basic_threshold
+                        pensums_to_update.append(pensum)
+                    pensums[pensum.employee_id] = pensum
+        Pensum.objects.bulk_update(pensums_to_update, ['basic_threshold'], batch_size=500)
+        # bulk operations do not send signals
+        PensumTotals.refresh(schedule.pensums.filter(
+            employee__in=[*pensums_to_create, *(pensum.employee_id for pensum in pensums_to_update)]))
+    pensums.update(pensums_to_create)
+
+    return [
+        {
+            'employee': ' '.join([employee.first_name, employee.last_name, f'({employee.abbreviation})']),
+            'position': employee.position.name,
+            'employee status': 'created' if employee.pk in pensums_to_create else 'updated',
+            'pensum status': f'pensum basic threshold ({pensums[employee.pk].basic_threshold})'
+        }
+        for employee in employees
+    ]
+
+
+def recalculate_pensum_values(schedule_slug, dry_run=False, job=None):
+    """
+    Sets basic thresholds of schedule's pensums based on employees' positions and groups.
+    Changes are written before return, report is generated lazily - pensums are iterated in chunks, so neither of them
+    is ever kept in memory as a whole.
+
+    params: schedule_slug - slug of the schedule
+    params: dry_run - if True nothing is written
+    params: job - (optional) job instance for progress reports
+    return: generator of report dictionaries
+    """
+    pensums = Pensum.objects.filter(schedule__slug=schedule_slug).order_by('pk')
+    # basic thresholds of position-group pairs
+    thresholds = {}
+    # new basic thresholds of changed pensums
+    changed = {}
+
+    with transaction.atomic():
+        locked = pensums if dry_run else pensums.select_for_update(of=('self',))
+        for pk, position, pensum_group, basic_threshold in locked.values_list(
+                'pk', 'employee__position__name', 'employee__pensum_group', 'basic_threshold'
+        ).iterator(chunk_size=EXPORT_CHUNK_SIZE):
+            key = (position, pensum_group)
+            if key not in thresholds:
+                thresholds[key] = get_pensum(*key) or 0
+            if basic_threshold != thresholds[key]:
+                changed[pk] = thresholds[key]
+        if job:
+            job.set_progress(0.5)
+        if changed and not dry_run:
+            Pensum.objects.bulk_update(
+                [Pensum(pk=pk, basic_threshold=basic_threshold) for pk, basic_threshold in changed.items()],
+                ['basic_threshold'], batch_size=500)
+            # bulk operations do not send signals
+            PensumTotals.refresh(Pensum.objects.filter(pk__in=changed))
+
+    def report():
+        for pensum in pensums.select_related('employee__position').iterator(chunk_size=EXPORT_CHUNK_SIZE):
+            if pensum.pk in changed:
+                status = ('pensum basic threshold to be set' if dry_run else 'new pensum basic threshold set') + \
+                    f' ({changed[pensum.pk]})'
+            else:
+                status = f'no change fo pensum basic threshold ({pensum.basic_threshold})'
+            yield {
+                'employee': ' '.join([pensum.employee.first_name, pensum.employee.last_name,
+                                      f'({pensum.employee.abbreviation})']),
+                'position': pensum.employee.position.name,
+                'pensum status': status
+            }
+
+    return report()
+
+
+@register_task('check_and_overwrite_pensum_values')
+def check_and_overwrite_pensum_values_task(job, schedule_slug):
+    return check_and_overwrite_pensum_values(schedule_slug, job=job)
+
+
+@register_task('recalculate_pensum_values')
+def recalculate_pensum_values_task(job, schedule_slug, dry_run=False):
+    return list(recalculate_pensum_values(schedule_slug, dry_run=dry_run, job=job))
+
+
+@register_task('clone_schedule')
+def clone_schedule_task(job, schedule_slug, new_slug, plans=False, exams=False):
+    return clone_schedule(schedule_slug, new_slug, plans=plans, exams=exams)['copied']
@@ -1 +1,498 @@
-# Create your tests here.
+import csv
+import json
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import DatabaseError, transaction
+from django.db.models import Q
+from django.test import TestCase, TransactionTestCase
+from rest_framework import status
+from rest_framework.reverse import reverse
+from rest_framework.test import APIClient, APITestCase
+
+from employees.models import Degrees, Employees, Positions
+from modules.models import Classes, Modules
+from orders.models import Orders, Plans
+from .calculations import calculate_pensums_values
+from .models import (ExamsAdditionalHours, Pensum, PensumAdditionalHoursFactors, PensumBasicThresholdFactors,
+                     PensumReductions, PensumTotals, Schedules)
+from .signals import schedule_totals_refresh
+from .staffing import StaffingSolver
+
+PENSUM_VALUES = ['pensum_contact_hours', 'pensum_additional_hours', 'pensum_additional_hours_not_counted_into_limit',
+                 'calculated_threshold', 'min_for_contact_hours', 'amount_until_contact_hours_min',
+                 'limit_for_contact_hours', 'amount_until_contact_hours_limit', 'limit_for_over_time_hours',
+                 'amount_until_over_time_hours_limit']
+
+
+def create_schedule_data(slug='test'):
+    """
+    Creates schedule with a few employees, modules, orders, plans and factors of every kind
+
+    return: schedule instance
+    """
+    schedule = Schedules.objects.create(slug=slug)
+    degree, _ = Degrees.objects.get_or_create(name='dr')
+    position, _ = Positions.objects.get_or_create(name='adiunkt')
+    employees = [
+        Employees.objects.get_or_create(
+            abbreviation=f'emp{i}',
+            defaults=dict(first_name=f'First{i}', last_name=f'Last{i}', e_mail=f'emp{i}@ab.ba', degree=degree,
+                          position=position, part_of_job_time=1 if i % 2 else 0.5))[0]
+        for i in range(3)
+    ]
+    pensums = [Pensum.objects.create(schedule=schedule, employee=employee, basic_threshold=360)
+               for employee in employees]
+
+    for i, language in enumerate(['pl', 'en']):
+        module = Modules.objects.create(module_code=f'{slug}-mod{i}', name=f'Module {i}', examination=True,
+                                        schedule=schedule, language=language)
+        lectures = Classes.objects.create(module=module, name='Lectures', classes_hours=30)
+        laboratories = Classes.objects.create(module=module, name='Laboratory_classes', classes_hours=15,
+                                              students_limit_per_group=12)
+        lectures_order = Orders.objects.create(classes=lectures, students_number=40 + i)
+        laboratories_order = Orders.objects.create(classes=laboratories, students_number=40 + i)
+        Plans.objects.create(order=lectures_order, employee=employees[i], plan_hours=30)
+        Plans.objects.create(order=laboratories_order, employee=employees[i], plan_hours=20)
+        Plans.objects.create(order=laboratories_order, employee=employees[2], plan_hours=25)
+        ExamsAdditionalHours.objects.create(pensum=pensums[i], module=module, type='Written', portion=0.5)
+        ExamsAdditionalHours.objects.create(pensum=pensums[2], module=module, type='Oral', portion=0.5)
+
+    PensumBasicThresholdFactors.objects.create(pensum=pensums[0], factor_type='Addition', value=10)
+    PensumBasicThresholdFactors.objects.create(pensum=pensums[0], factor_type='Multiplication', value=0.5)
+    PensumReductions.objects.create(pensum=pensums[1], function='Kierownik Katedry')
+    PensumAdditionalHoursFactors.objects.create(pensum=pensums[1], name='bachelor thesis', value_per_unit=10,
+                                                amount=2)
+    PensumAdditionalHoursFactors.objects.create(pensum=pensums[2], name='student research group', value_per_unit=5)
+    return schedule
+
+
+class PensumQuerySetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.schedule = create_schedule_data()
+
+    def test_with_totals_matches_properties(self):
+        for pensum in Pensum.objects.filter(schedule=self.schedule).with_totals():
+            expected = Pensum.objects.get(pk=pensum.pk)
+            for name in PENSUM_VALUES:
+                with self.subTest(pensum=str(pensum), value=name):
+                    self.assertAlmostEqual(getattr(pensum, name), getattr(expected, name))
+
+    def test_with_totals_queries_count(self):
+        with self.assertNumQueries(2):
+            pensums = list(Pensum.objects.filter(schedule=self.schedule).with_totals())
+            for pensum in pensums:
+                for name in PENSUM_VALUES:
+                    getattr(pensum, name)
+
+    def test_batch_calculation_matches_properties(self):
+        values = calculate_pensums_values(Pensum.objects.filter(schedule=self.schedule))
+        for pensum in Pensum.objects.filter(schedule=self.schedule):
+            for name in PENSUM_VALUES:
+                with self.subTest(pensum=str(pensum), value=name):
+                    self.assertAlmostEqual(values[pensum.pk][name], getattr(pensum, name))
+
+    def test_values_memoized_until_invalidated(self):
+        pensum = Pensum.objects.filter(schedule=self.schedule).with_totals().get(employee__abbreviation='emp0')
+        threshold = pensum.calculated_threshold
+        with self.assertNumQueries(0):
+            for name in PENSUM_VALUES:
+                getattr(pensum, name)
+        PensumBasicThresholdFactors.objects.create(pensum=pensum, factor_type='Addition', value=5)
+        self.assertAlmostEqual(pensum.calculated_threshold, threshold + 5)
+
+
+class PensumTotalsTests(TransactionTestCase):
+    def setUp(self):
+        self.schedule = create_schedule_data()
+
+    def assertTotalsUpToDate(self):
+        for pensum in Pensum.objects.filter(schedule=self.schedule):
+            for name in PensumTotals.PENSUM_PROPERTIES:
+                with self.subTest(pensum=str(pensum), value=name):
+                    self.assertAlmostEqual(getattr(PensumTotals.objects.get(pensum=pensum), name),
+                                           getattr(pensum, name))
+
+    def test_totals_created_with_related_records(self):
+        self.assertEqual(PensumTotals.objects.count(), Pensum.objects.count())
+        self.assertTotalsUpToDate()
+
+    def test_totals_refreshed_on_changes(self):
+        plan = Plans.objects.filter(employee__pensums__schedule=self.schedule).first()
+        plan.plan_hours += 5
+        plan.save()
+        self.assertTotalsUpToDate()
+
+        order = Orders.objects.filter(classes__module__schedule=self.schedule, classes__name='Lectures').first()
+        order.students_number = 100
+        order.save()
+        self.assertTotalsUpToDate()
+
+        PensumAdditionalHoursFactors.objects.filter(pensum__schedule=self.schedule).delete()
+        PensumReductions.objects.filter(pensum__schedule=self.schedule).delete()
+        Modules.objects.filter(schedule=self.schedule).first().delete()
+        self.assertTotalsUpToDate()
+
+    def test_totals_refreshed_on_main_order_change(self):
+        laboratories = Orders.objects.get(classes__module__module_code='test-mod0', classes__name='Laboratory_classes')
+        laboratories.students_number = 100
+        laboratories.save()
+        # laboratories' order becomes module's main order
+        lectures = Classes.objects.get(module__module_code='test-mod0', name='Lectures')
+        lectures.name = 'Seminar_classes'
+        lectures.save()
+        self.assertEqual(Modules.objects.get(module_code='test-mod0').main_order_id, laboratories.pk)
+        self.assertTotalsUpToDate()
+
+    def test_totals_refreshed_on_module_update(self):
+        url = reverse('modules-detail', kwargs={'schedule_slug': self.schedule.slug, 'module_code': 'test-mod0'})
+        response = APIClient().put(url, {'module_code': 'test-mod0', 'name': 'Module 0', 'examination': True,
+                                         'language': 'en', 'form_of_classes': []}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        self.assertTotalsUpToDate()
+
+    def test_rolled_back_refresh_dropped(self):
+        first, second = Pensum.objects.filter(schedule=self.schedule)[:2]
+        PensumTotals.objects.filter(pensum=first).update(exam_hours=-1)
+        with self.assertRaises(DatabaseError), transaction.atomic():
+            schedule_totals_refresh(Q(pk=first.pk))
+            raise DatabaseError
+        with transaction.atomic():
+            schedule_totals_refresh(Q(pk=second.pk))
+        # only pensums of the committed transaction are refreshed
+        self.assertEqual(PensumTotals.objects.get(pensum=first).exam_hours, -1)
+
+    def test_rebuild_command(self):
+        PensumTotals.objects.all().delete()
+        call_command('rebuild_pensum_totals', '--schedule', self.schedule.slug, stdout=StringIO())
+        self.assertTotalsUpToDate()
+
+
+class PensumFiltersTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.schedule = create_schedule_data()
+        # over time hours limit exceeded
+        PensumAdditionalHoursFactors.objects.create(pensum=Pensum.objects.get(employee__abbreviation='emp0'),
+                                                    name='student research group', value_per_unit=1000)
+        PensumTotals.refresh(Pensum.objects.all())
+        cls.url = reverse('pensums-list', kwargs={'schedule_slug': cls.schedule.slug})
+
+    def employees(self, **params):
+        return [data['employee'] for data in self.client.get(self.url, params).data]
+
+    def test_filters(self):
+        values = {pensum.employee.abbreviation: pensum for pensum in Pensum.objects.with_totals()}
+        self.assertEqual(self.employees(search='last1'), ['emp1'])
+        self.assertEqual(self.employees(employee='EMP'), ['emp0', 'emp1', 'emp2'])
+        self.assertEqual(self.employees(below_min='1'), sorted(
+            abbreviation for abbreviation, pensum in values.items() if pensum.amount_until_contact_hours_min > 0))
+        self.assertEqual(self.employees(over_limit='1'), ['emp0'])
+        self.assertEqual(self.employees(over_limit='1'), sorted(
+            abbreviation for abbreviation, pensum in values.items()
+            if pensum.amount_until_contact_hours_limit < 0 or pensum.amount_until_over_time_hours_limit < 0))
+        self.assertEqual(len(self.employees(over_limit='1')) + len(self.employees(over_limit='0')), 3)
+
+    def test_export(self):
+        # rows with their totals in a single query
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, {'format': 'csv', 'below_min': '1'})
+            rows = list(csv.reader(StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="pensums.csv"')
+        self.assertEqual(rows[0][:4], ['employee', 'first_name', 'last_name', 'pensum_group'])
+        self.assertEqual([row[0] for row in rows[1:]], self.employees(below_min='1'))
+
+        response = self.client.get(self.url, {'format': 'ndjson'})
+        lines = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([line['employee'] for line in lines], self.employees())
+        self.assertEqual(lines[0]['pensum_contact_hours'], self.client.get(self.url).data[0]['pensum_contact_hours'])
+
+
+class PensumActionsTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.schedule = create_schedule_data()
+        Employees.objects.create(first_name='New', last_name='Employee', abbreviation='new', e_mail='new@ab.ba',
+                                 degree=Degrees.objects.first(), position=Positions.objects.get(name='adiunkt'))
+        Pensum.objects.filter(employee__abbreviation='emp0').update(basic_threshold=100)
+
+    def test_check_and_overwrite_pensum_values_for_all_employees(self):
+        response = self.client.post(reverse('pensums-check-and-overwrite-pensum-values-for-all-employees',
+                                            kwargs={'schedule_slug': self.schedule.slug}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        self.assertEqual(len(response.data), Employees.objects.count())
+        self.assertEqual(
+            {row['employee'].split()[-1]: row['employee status'] for row in response.data},
+            {'(emp0)': 'updated', '(emp1)': 'updated', '(emp2)': 'updated', '(new)': 'created'})
+        for pensum in Pensum.objects.filter(schedule=self.schedule):
+            self.assertEqual(pensum.basic_threshold, 360)
+        # totals of changed pensums are refreshed within the action
+        for pensum in Pensum.objects.filter(schedule=self.schedule, employee__abbreviation__in=['emp0', 'new']):
+            self.assertEqual(pensum.totals.calculated_threshold, pensum.calculated_threshold)
+
+    def test_recalculate_pensum_values_for_employees_of_current_schedule(self):
+        url = reverse('pensums-recalculate-pensum-values-for-employees-of-current-schedule',
+                      kwargs={'schedule_slug': self.schedule.slug})
+        response = self.client.get(url, {'dry_run': 1})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        report = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(len(report), 3)
+        self.assertIn('to be set (360)', report[0]['pensum status'])
+        self.assertEqual(Pensum.objects.get(employee__abbreviation='emp0').basic_threshold, 100)
+
+        response = self.client.get(url)
+        report = json.loads(b''.join(response.streaming_content))
+        self.assertIn('new pensum basic threshold set (360)', report[0]['pensum status'])
+        self.assertIn('no change', report[1]['pensum status'])
+        self.assertEqual(Pensum.objects.get(employee__abbreviation='emp0').basic_threshold, 360)
+
+
+class AvailableEmployeesTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.schedule = create_schedule_data()
+        PensumTotals.refresh(Pensum.objects.all())
+
+    def test_available_employees(self):
+        url = reverse('available_employees-list', kwargs={'schedule_slug': self.schedule.slug})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        expected = {pensum.employee.abbreviation: pensum.amount_until_contact_hours_limit
+                    for pensum in Pensum.objects.filter(schedule=self.schedule)
+                    if pensum.amount_until_contact_hours_limit >= 1}
+        self.assertEqual({data['employee']: data['amount_until_contact_hours_limit'] for data in response.data},
+                         expected)
+
+        min_hours = max(expected.values())
+        response = self.client.get(url, {'min_hours': min_hours})
+        self.assertEqual([data['amount_until_contact_hours_limit'] for data in response.data], [min_hours])
+
+        response = self.client.get(url, {'min_hours': 'abc'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_available_employees_pages(self):
+        url = reverse('available_employees-list', kwargs={'schedule_slug': self.schedule.slug})
+        employees = [data['employee'] for data in self.client.get(url, {'min_hours': -10000}).data]
+        # pages ordered by free hours as well
+        response = self.client.get(url, {'min_hours': -10000, 'page_size': 2})
+        paginated = [data['employee'] for data in response.data['results']]
+        response = self.client.get(response.data['next'])
+        paginated += [data['employee'] for data in response.data['results']]
+        self.assertEqual(paginated, employees)
+        self.assertIsNone(response.data['next'])
+
+
+class AutoStaffTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.schedule = create_schedule_data()
+        Plans.objects.filter(employee__abbreviation='emp2').delete()
+
+    def test_solver_respects_limits(self):
+        orders = {'pl': (40, 0), 'en': (20, 0.5)}
+        pensums = {'a': (40, 80), 'b': (40, 25)}
+        # greedy seed gives 'pl' order to 'a', so 'b' (limited by over time hours) is not able to take whole 'en'
+        solver = StaffingSolver(orders, pensums)
+        solver.solve(local_search_passes=0)
+        self.assertEqual(solver.remaining, {'pl': 0, 'en': 4})
+
+        # local search swaps hours between pensums
+        solver = StaffingSolver(orders, pensums)
+        assignments = solver.solve()
+        self.assertEqual(solver.remaining, {'pl': 0, 'en': 0})
+        for pensum, (contact_hours, over_time_hours) in pensums.items():
+            plans = {order: hours for (order, key), hours in assignments.items() if key == pensum}
+            self.assertLessEqual(sum(plans.values()), contact_hours)
+            self.assertLessEqual(sum(hours * (1 + orders[order][1]) for order, hours in plans.items()),
+                                 over_time_hours)
+        for order, (hours, factor) in orders.items():
+            self.assertEqual(sum(value for (key, pensum), value in assignments.items() if key == order), hours)
+
+    def test_auto_staff(self):
+        url = reverse('schedules-auto-staff', kwargs={'slug': self.schedule.slug})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        proposal = response.data
+        self.assertTrue(proposal['plans'])
+        self.assertEqual(proposal['staffed_hours'], sum(plan['added_hours'] for plan in proposal['plans']))
+        # nothing is written with GET
+        self.assertFalse(Plans.objects.filter(employee__abbreviation='emp2').exists())
+
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        for plan in proposal['plans']:
+            self.assertEqual(Plans.objects.get(
+                order__classes__module__module_code=plan['module_code'], order__classes__name=plan['classes_name'],
+                employee__abbreviation=plan['employee']).plan_hours, plan['plan_hours'])
+        for pensum in Pensum.objects.filter(schedule=self.schedule):
+            self.assertGreaterEqual(pensum.amount_until_contact_hours_limit, 0)
+            self.assertGreaterEqual(pensum.amount_until_over_time_hours_limit, 0)
+
+
+class SimulationTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.schedule = create_schedule_data()
+        cls.url = reverse('schedules-simulate', kwargs={'slug': cls.schedule.slug})
+
+    def test_simulation_matches_real_changes(self):
+        pensum = Pensum.objects.get(schedule=self.schedule, employee__abbreviation='emp1')
+        factor = PensumAdditionalHoursFactors.objects.get(pensum=pensum)
+        edits = [
+            {'type': 'plan', 'module_code': 'test-mod1', 'classes_name': 'Laboratory_classes', 'employee': 'emp1',
+             'plan_hours': 30},
+            {'type': 'plan', 'module_code': 'test-mod0', 'classes_name': 'Lectures', 'employee': 'emp0',
+             'plan_hours': 10},
+            {'type': 'additional_hours_factor', 'employee': 'emp1', 'pk': factor.pk, 'name': factor.name,
+             'value_per_unit': 10, 'amount': 5},
+            {'type': 'basic_threshold_factor', 'employee': 'emp1', 'factor_type': 'Addition', 'value': 20},
+            {'type': 'exam', 'employee': 'emp1', 'module_code': 'test-mod0', 'exam_type': 'Oral', 'portion': 0.5},
+        ]
+        with self.assertNumQueries(10):
+            response = self.client.post(self.url, edits, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        # nothing is written
+        self.assertEqual(Plans.objects.get(order__classes__module__module_code='test-mod1',
+                                           order__classes__name='Laboratory_classes',
+                                           employee__abbreviation='emp1').plan_hours, 20)
+        self.assertEqual(response.data['orders'][0]['delta'], -20)
+        self.assertEqual(response.data['orders'][1]['delta'], 10)
+
+        # apply the same changes for real
+        Plans.objects.filter(order__classes__module__module_code='test-mod1',
+                             order__classes__name='Laboratory_classes', employee__abbreviation='emp1').update(
+            plan_hours=30)
+        Plans.objects.filter(order__classes__module__module_code='test-mod0', order__classes__name='Lectures',
+                             employee__abbreviation='emp0').update(plan_hours=10)
+        PensumAdditionalHoursFactors.objects.filter(pk=factor.pk).update(value_per_unit=10, amount=5)
+        PensumBasicThresholdFactors.objects.create(pensum=pensum, factor_type='Addition', value=20)
+        ExamsAdditionalHours.objects.create(pensum=pensum, module=Modules.objects.get(module_code='test-mod0'),
+                                            type='Oral', portion=0.5)
+        values = calculate_pensums_values(Pensum.objects.filter(schedule=self.schedule))
+        for data in response.data['pensums']:
+            pk = Pensum.objects.get(schedule=self.schedule, employee__abbreviation=data['employee']).pk
+            for name, value in data['after'].items():
+                self.assertAlmostEqual(value, values[pk][name], places=2, msg=name)
+
+    def test_basic_threshold_factors_added_and_deleted(self):
+        pensum = Pensum.objects.get(schedule=self.schedule, employee__abbreviation='emp0')
+        factor = PensumBasicThresholdFactors.objects.get(pensum=pensum, factor_type='Addition')
+        response = self.client.post(self.url, [
+            {'type': 'basic_threshold_factor', 'employee': 'emp0', 'factor_type': 'Addition', 'value': 20},
+            {'type': 'basic_threshold_factor', 'employee': 'emp0', 'pk': factor.pk, 'delete': True},
+            {'type': 'basic_threshold_factor', 'employee': 'emp0', 'factor_type': 'Addition', 'value': 5},
+        ], format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+
+        factor.delete()
+        PensumBasicThresholdFactors.objects.create(pensum=pensum, factor_type='Addition', value=20)
+        PensumBasicThresholdFactors.objects.create(pensum=pensum, factor_type='Addition', value=5)
+        values = calculate_pensums_values(Pensum.objects.filter(pk=pensum.pk))[pensum.pk]
+        self.assertAlmostEqual(response.data['pensums'][0]['after']['calculated_threshold'],
+                               values['calculated_threshold'], places=2)
+
+    def test_invalid_edits(self):
+        response = self.client.post(self.url, [{'type': 'basic_threshold_factor', 'employee': 'emp0', 'delete': True}],
+                                    format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('pk', response.data['edits'][0])
+
+        response = self.client.post(self.url, [
+            {'type': 'plan', 'module_code': 'test-mod0', 'classes_name': 'Unknown', 'employee': 'emp0',
+             'plan_hours': 1},
+            {'type': 'exam', 'employee': 'unknown', 'module_code': 'test-mod0', 'exam_type': 'Oral', 'portion': 1},
+        ], format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('classes_name', response.data['edits'][0])
+        self.assertIn('employee', response.data['edits'][1])
+
+        response = self.client.post(self.url, [{'type': 'plan', 'employee': 'emp0'}], format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('plan_hours', response.data['edits'][0])
+
+
+class UnstaffedExamsTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.schedule = create_schedule_data()
+        # exam of the second module is staffed in a half (by emp2 only)
+        ExamsAdditionalHours.objects.filter(
+            module__module_code='test-mod1', pensum__employee__abbreviation='emp1').delete()
+        cls.url = reverse('schedules-exams-unstaffed', kwargs={'slug': cls.schedule.slug})
+
+    def test_unstaffed_exams_list(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([(data['module_code'], data['students_number'], data['portion_staffed'],
+                           data['portion_to_staff']) for data in response.data], [('test-mod1', 41, 0.5, 0.5)])
+        self.assertEqual(len(self.client.get(self.url, {'employee': 'emp0'}).data), 1)
+        self.assertEqual(self.client.get(self.url, {'employee': 'emp2'}).data, [])
+        self.assertEqual(self.client.get(self.url, {'employee': 'none'}).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_exam_modules_to_setup(self):
+        url = reverse('pensum-exams_additional_hours-list',
+                      kwargs={'schedule_slug': self.schedule.slug, 'pensums_employee': 'emp0'})
+        # already staffed by the employee
+        response = self.client.post(url, {'module': 'test-mod0', 'type': 'Written', 'portion': 0.1})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(url, {'module': 'test-mod1', 'type': 'Written', 'portion': 0.5})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.client.get(self.url).data, [])
+        # module of edited exam stays available
+        response = self.client.patch(response.data['url'], {'module': 'test-mod1', 'portion': 0.4})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class ScheduleCloneTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.schedule = create_schedule_data()
+        cls.url = reverse('schedules-clone', kwargs={'slug': cls.schedule.slug})
+
+    def test_clone_without_plans_and_exams(self):
+        response = self.client.post(self.url, {'slug': 'next'})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['slug'], 'next')
+        self.assertEqual(response.data['copied'], {'modules': 2, 'classes': 4, 'orders': 4, 'pensums': 3,
+                                                   'basic_threshold_factors': 2, 'additional_hours_factors': 2,
+                                                   'reductions': 1})
+        for model, lookup in [(Modules, 'schedule__slug'), (Classes, 'module__schedule__slug'),
+                              (Orders, 'classes__module__schedule__slug'), (Pensum, 'schedule__slug'),
+                              (PensumBasicThresholdFactors, 'pensum__schedule__slug'),
+                              (PensumAdditionalHoursFactors, 'pensum__schedule__slug'),
+                              (PensumReductions, 'pensum__schedule__slug')]:
+            old = model.objects.filter(**{lookup: 'test'})
+            new = model.objects.filter(**{lookup: 'next'})
+            self.assertEqual(old.count(), new.count(), model)
+            self.assertFalse(set(old.values_list('pk', flat=True)) & set(new.values_list('pk', flat=True)), model)
+        self.assertFalse(Plans.objects.filter(order__classes__module__schedule__slug='next').exists())
+        self.assertFalse(ExamsAdditionalHours.objects.filter(pensum__schedule__slug='next').exists())
+        # orders without plans have all hours left, main orders are set
+        for order in Orders.objects.filter(classes__module__schedule__slug='next'):
+            self.assertEqual(order.remaining_hours, order.order_hours)
+        self.assertEqual(sorted(Modules.objects.filter(schedule__slug='next').values_list(
+            'module_code', 'main_order__classes__name', 'main_order__classes__module__schedule__slug')),
+            [('test-mod0', 'Lectures', 'next'), ('test-mod1', 'Lectures', 'next')])
+        pensum = Pensum.objects.get(schedule__slug='next', employee__abbreviation='emp0')
+        self.assertEqual(list(pensum.basic_threshold_factors.order_by('pk').values_list('factor_type', 'value')),
+                         [('Addition', 10), ('Multiplication', 0.5)])
+
+    def test_clone_with_plans_and_exams(self):
+        response = self.client.post(self.url, {'slug': 'next', 'plans': True, 'exams': True})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual((response.data['copied']['plans'], response.data['copied']['exams']), (6, 4))
+        self.assertEqual(
+            sorted(Plans.objects.filter(order__classes__module__schedule__slug='next').values_list(
+                'order__classes__module__module_code', 'order__classes__name', 'employee__abbreviation',
+                'plan_hours')),
+            sorted(Plans.objects.filter(order__classes__module__schedule__slug='test').values_list(
+                'order__classes__module__module_code', 'order__classes__name', 'employee__abbreviation',
+                'plan_hours')))
+        self.assertEqual(ExamsAdditionalHours.objects.filter(
+            pensum__schedule__slug='next', module__schedule__slug='next').count(), 4)
+
+    def test_clone_into_existing_schedule(self):
+        response = self.client.post(self.url, {'slug': 'test'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
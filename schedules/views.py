@@ -1,16 +1,30 @@
+from django.db.models import Q
+from rest_framework import status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.generics import get_object_or_404
 from rest_framework.response import Response
-from rest_framework.viewsets import ModelViewSet
+from rest_framework.settings import api_settings
+from rest_framework.viewsets import GenericViewSet, ModelViewSet, mixins
+from rest_framework_csv.renderers import CSVStreamingRenderer
 from rest_framework_nested.viewsets import NestedViewSetMixin
 
-from AGH.AGH_utils import get_pensum
-from employees.models import Employees
-from utils.ViewSets import OneToOneRelationViewSet
+from jobs.views import enqueue_job_response, is_background_request
+from modules.models import Modules
+from orders.serializers import BulkPlansSerializer
+from utils.ViewSets import OneToOneRelationViewSet, StreamingExportMixin
+from utils.filters import flag
+from utils.streaming import NDJSONRenderer, stream_json_list
+from .cloning import clone_schedule
 from .models import ExamsAdditionalHours, Pensum, PensumAdditionalHoursFactors, PensumBasicThresholdFactors, \
     PensumReductions, Schedules
-from .serializers import ExamsAdditionalHoursSerializer, PensumAdditionalHoursFactorsSerializer, \
-    PensumBasicThresholdFactorSerializer, PensumListSerializer, PensumReductionSerializer, PensumSerializer, \
-    ScheduleSerializer
+from .serializers import AvailableEmployeeSerializer, ExamsAdditionalHoursSerializer, \
+    PensumAdditionalHoursFactorsSerializer, PensumBasicThresholdFactorSerializer, PensumListSerializer, \
+    PensumReductionSerializer, PensumSerializer, ScheduleCloneSerializer, ScheduleSerializer, SimulationSerializer, \
+    UnstaffedExamSerializer
+from .simulation import ScheduleSimulation
+from .staffing import propose_staffing
+from .tasks import check_and_overwrite_pensum_values, recalculate_pensum_values
 
 
 class SchedulesViewSet(ModelViewSet):
@@ -23,11 +37,89 @@ class SchedulesViewSet(ModelViewSet):
     # Custom lookup_field - needs entry in extra_kwargs of serializer!
     lookup_field = 'slug'
 
+    @action(detail=True, methods=['GET', 'POST'])
+    def auto_staff(self, request, *args, **kwargs):
+        """
+        Proposes plans filling free hours of schedule's orders without exceeding pensums' limits (see
+        schedules.staffing). GET returns the proposal, POST applies it (as plans bulk endpoint would).
+        """
+        schedule = self.get_object()
+        proposal = propose_staffing(schedule.slug)
+        if request.method == 'POST':
+            serializer = BulkPlansSerializer(
+                data={'plans': proposal['plans']}, context={'request': request, 'schedule_slug': schedule.slug})
+            serializer.is_valid(raise_exception=True)
+            serializer.save()
+            return Response(proposal, status=status.HTTP_201_CREATED)
+        return Response(proposal)
+
+    @action(detail=True, methods=['POST'])
+    def clone(self, request, *args, **kwargs):
+        """
+        Copies schedule with its modules, classes, orders, pensums, factors and reductions into a new schedule
+        ({"slug": ..., "plans": false, "exams": false} - plans and exams' assignments are copied on demand).
+        Use ?background=1 to run it as a background job.
+        """
+        schedule = self.get_object()
+        serializer = ScheduleCloneSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        # plans and exams options
+        options = dict(serializer.validated_data)
+        new_slug = options.pop('slug')
+        if is_background_request(request):
+            return enqueue_job_response(request, 'clone_schedule', schedule=schedule, schedule_slug=schedule.slug,
+                                        new_slug=new_slug, **options)
+        result = clone_schedule(schedule.slug, new_slug, **options)
+        return Response({**self.get_serializer(result['schedule']).data, 'copied': result['copied']},
+                        status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['GET'], url_path='exams/unstaffed', url_name='exams-unstaffed')
+    def unstaffed_exams(self, request, *args, **kwargs):
+        """
+        Lists examination modules with exams left to staff (with order and exams' portions staffed below 1).
+        Use ?employee=<abbreviation> to skip modules with exams of employee's pensum.
+        """
+        schedule = self.get_object()
+        pensum = None
+        if request.query_params.get('employee'):
+            pensum = get_object_or_404(
+                Pensum, schedule=schedule, employee__abbreviation=request.query_params['employee'])
+        queryset = Modules.objects.filter(schedule=schedule).unstaffed_exams(pensum=pensum).select_related(
+            'schedule', 'main_order')
+        page = self.paginate_queryset(queryset)
+        serializer = UnstaffedExamSerializer(
+            queryset if page is None else page, many=True, context={'request': request})
+        return Response(serializer.data) if page is None else self.get_paginated_response(serializer.data)
+
+    @action(detail=True, methods=['POST'])
+    def simulate(self, request, *args, **kwargs):
+        """
+        Shows how pensums' and orders' values would change with list of hypothetical plan, factor and exam edits
+        (see schedules.simulation). Nothing is written.
+        """
+        schedule = self.get_object()
+        data = {'edits': request.data} if isinstance(request.data, list) else request.data
+        serializer = SimulationSerializer(data=data)
+        serializer.is_valid(raise_exception=True)
+        simulation = ScheduleSimulation(schedule.slug, serializer.validated_data['edits'])
+        if not simulation.run():
+            return Response({'edits': simulation.errors}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(simulation.result())
+
+
+class PensumRenderer(CSVStreamingRenderer):
+    """
+    Custom CSV Renderer for Pensum View Set - pensums' summaries (see PensumListSerializer)
+    """
+    header = ['employee', 'first_name', 'last_name', 'pensum_group', 'calculated_threshold', 'pensum_contact_hours',
+              'amount_until_contact_hours_min', 'pensum_additional_hours', 'amount_until_over_time_hours_limit']
 
-class PensumViewSet(NestedViewSetMixin, ModelViewSet):
+
+class PensumViewSet(StreamingExportMixin, NestedViewSetMixin, ModelViewSet):
     """
     Pensum View Set
     CRUD pensum values.
+    Summaries of pensums are exported (streamed) in CSV and NDJSON formats.
 
     Additional actions:
     check_and_overwrite_pensum_values_for_all_employees [POST]
@@ -35,63 +127,61 @@ class PensumViewSet(NestedViewSetMixin, ModelViewSet):
     """
     queryset = Pensum.objects.all()
     serializer_class = PensumSerializer
+    renderer_classes = tuple(api_settings.DEFAULT_RENDERER_CLASSES) + (PensumRenderer, NDJSONRenderer)
     # Custom lookup_field - needs entry in extra_kwargs of serializer!
     lookup_field = 'employee'
+    export_serializer_class = PensumListSerializer
+    export_filename = 'pensums'
+    keyset_ordering = ['employee__abbreviation']
+    search_fields = ['employee__abbreviation', 'employee__first_name', 'employee__last_name']
+    filter_lookups = {
+        'employee': 'employee__abbreviation__istartswith',
+        'pensum_group': 'employee__pensum_group',
+        'over_limit': flag(Q(totals__amount_until_contact_hours_limit__lt=0) |
+                           Q(totals__amount_until_over_time_hours_limit__lt=0)),
+        'below_min': flag(Q(totals__amount_until_contact_hours_min__gt=0)),
+    }
 
     # Custom list method with simpler serializer
     def list(self, request, *args, **kwargs):
-        serializer = PensumListSerializer(self.get_queryset(), many=True, context={'request': request})
-        return Response(serializer.data)
+        queryset = self.filter_queryset(self.get_queryset()).select_related('schedule', 'employee', 'totals')
+        if self.is_export():
+            return self.export_response(queryset)
+        page = self.paginate_queryset(queryset)
+        serializer = PensumListSerializer(queryset if page is None else page, many=True, context={'request': request})
+        return Response(serializer.data) if page is None else self.get_paginated_response(serializer.data)
 
     def get_object(self):
-        return self.get_queryset().filter(employee__abbreviation=self.kwargs.get(self.lookup_field)).first()
+        return self.get_queryset().with_totals().filter(
+            employee__abbreviation=self.kwargs.get(self.lookup_field)).first()
 
     @action(detail=False, methods=['POST'])
     def check_and_overwrite_pensum_values_for_all_employees(self, request, *args, **kwargs):
-        ret = []
-        for employee in Employees.objects.all():
-            pensum, created = Pensum.objects.get_or_create(
-                schedule=Schedules.objects.get(slug=kwargs.get('schedule_slug')),
-                employee=employee
-            )
-            if pensum.basic_threshold != get_pensum(employee.position.name, employee.pensum_group):
-                pensum.basic_threshold = get_pensum(employee.position.name, employee.pensum_group) or 0
-                pensum.save()
-            ret.append(
-                {
-                    'employee': ' '.join([employee.first_name, employee.last_name, f'({employee.abbreviation})']),
-                    'position': employee.position.name,
-                    'employee status': f'{"created" if created else "updated"}',
-                    'pensum status': f'pensum basic threshold ({pensum.basic_threshold})'
-                },
-            )
-        return Response(ret)
+        """
+        Creates missing pensums and updates basic thresholds of existing ones.
+        Use ?background=1 to run it as a background job.
+        """
+        schedule_slug = kwargs.get('schedule_slug')
+        if is_background_request(request):
+            schedule = get_object_or_404(Schedules, slug=schedule_slug)
+            return enqueue_job_response(
+                request, 'check_and_overwrite_pensum_values', schedule=schedule, schedule_slug=schedule_slug)
+        return Response(check_and_overwrite_pensum_values(schedule_slug))
 
     @action(detail=False, methods=['GET'])
     def recalculate_pensum_values_for_employees_of_current_schedule(self, request, *args, **kwargs):
-        ret = []
-        for pensum in Pensum.objects.filter(schedule__slug=kwargs.get('schedule_slug')):
-            if pensum.basic_threshold != get_pensum(pensum.employee.position.name, pensum.employee.pensum_group):
-                pensum.basic_threshold = get_pensum(pensum.employee.position.name, pensum.employee.pensum_group) or 0
-                pensum.save()
-                ret.append(
-                    {
-                        'employee': ' '.join([pensum.employee.first_name, pensum.employee.last_name,
-                                              f'({pensum.employee.abbreviation})']),
-                        'position': pensum.employee.position.name,
-                        'pensum status': f'new pensum basic threshold set ({pensum.basic_threshold})'
-                    },
-                )
-            else:
-                ret.append(
-                    {
-                        'employee': ' '.join([pensum.employee.first_name, pensum.employee.last_name,
-                                              f'({pensum.employee.abbreviation})']),
-                        'position': pensum.employee.position.name,
-                        'pensum status': f'no change fo pensum basic threshold ({pensum.basic_threshold})'
-                    },
-                )
-        return Response(ret)
+        """
+        Sets basic thresholds of schedule's pensums based on employees' positions and groups.
+        Use ?dry_run=1 to preview changes without writing anything.
+        Use ?background=1 to run it as a background job.
+        """
+        schedule_slug = kwargs.get('schedule_slug')
+        dry_run = request.query_params.get('dry_run') in ('1', 'true', 'True')
+        if is_background_request(request):
+            schedule = get_object_or_404(Schedules, slug=schedule_slug)
+            return enqueue_job_response(
+                request, 'recalculate_pensum_values', schedule=schedule, schedule_slug=schedule_slug, dry_run=dry_run)
+        return stream_json_list(recalculate_pensum_values(schedule_slug, dry_run=dry_run))
 
 
 class PensumBasicThresholdFactorsViewSet(NestedViewSetMixin, ModelViewSet):
@@ -122,5 +212,25 @@ class ExamsAdditionalHoursViewSet(NestedViewSetMixin, ModelViewSet):
     """
     Exams Additional Hours View Set
     """
-    queryset = ExamsAdditionalHours.objects.all()
+    queryset = ExamsAdditionalHours.objects.select_related('module__main_order', 'pensum__schedule', 'pensum__employee')
     serializer_class = ExamsAdditionalHoursSerializer
+
+
+class AvailableEmployeesViewSet(NestedViewSetMixin, mixins.ListModelMixin, GenericViewSet):
+    """
+    Available Employees View Set
+    Lists employees of the schedule with free contact hours. Use ?min_hours=N to set minimal number of free hours
+    (default: 1).
+    """
+    queryset = Pensum.objects.all()
+    serializer_class = AvailableEmployeeSerializer
+    # pages follow the list's ordering - the most free hours first
+    keyset_ordering = ['-totals__amount_until_contact_hours_limit', 'employee__abbreviation']
+
+    def get_queryset(self):
+        try:
+            min_hours = float(self.request.query_params.get('min_hours', 1))
+        except ValueError:
+            raise ValidationError({'min_hours': 'A valid number is required.'})
+        return super().get_queryset().with_free_contact_hours(min_hours).select_related(
+            'employee', 'totals').order_by('-totals__amount_until_contact_hours_limit', 'employee__abbreviation')
@@ -0,0 +1,55 @@
+import json
+
+import requests
+from rest_framework import status
+
+from jobs.tasks import register_task
+from modules.serializers import ModuleSerializer
+from schedules.models import Schedules
+
+
+def get_study_plan_modules(academic_year, department, study_plan):
+    """
+    Gets study plan's modules (with language) from syllabus web API
+
+    params: academic_year, department, study_plan - syllabus' identifiers of study plan
+    return: tuple of data (list of modules or error dictionary) and HTTP status code
+    """
+    response = requests.get(
+        f"https://syllabuskrk.agh.edu.pl/{academic_year}/magnesite/api/faculties/"
+        f"{department}/study_plans/{study_plan}/modules?fields=module-code,language")
+    json_lang = json.loads(response.content).get('syllabus').get('assignments')
+    lang_dict = {}
+    for rec in json_lang:
+        lang_dict[rec.get('assignment').get('module_code')] = rec.get('assignment').get('module').get('language')
+    response = requests.get(
+        f"https://syllabuskrk.agh.edu.pl/{academic_year}/magnesite/api/faculties/"
+        f"{department}/study_plans/{study_plan}/")
+    try:
+        json_data = json.loads(response.content).get('syllabus')
+        modules = []
+        for semester in json_data.get('study_plan').get('semesters'):
+            for group in semester.get('groups'):
+                for module in group.get('modules'):
+                    module['language'] = lang_dict.get(module.get('module_code')) or 'pl'
+                    modules.append(module)
+        return modules, status.HTTP_200_OK
+    except json.JSONDecodeError:
+        return {'Syllabus': {'content': response.content}}, status.HTTP_404_NOT_FOUND
+    except TypeError:
+        return {'error': 'No valid data to display'}, status.HTTP_200_OK
+
+
+@register_task('import_study_plan_modules')
+def import_study_plan_modules_task(job, schedule_slug, academic_year, department, study_plan):
+    data, _ = get_study_plan_modules(academic_year, department, study_plan)
+    job.set_progress(0.5)
+    data = data if isinstance(data, list) else [data]
+    schedule = Schedules.objects.get(slug=schedule_slug)
+    for sub_data in data:
+        sub_data['schedule'] = schedule
+    serializer = ModuleSerializer(data=data, many=True, context={'request': None})
+    if serializer.is_valid():
+        serializer.save()
+        return {'imported modules': [module.get('module_code') for module in serializer.validated_data]}
+    return {'errors': serializer.errors}
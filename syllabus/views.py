@@ -5,13 +5,16 @@ from django.shortcuts import redirect
 from django.utils.decorators import method_decorator
 from django.views.decorators.cache import cache_page
 from rest_framework import status
+from rest_framework.generics import get_object_or_404
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.viewsets import GenericViewSet
 
+from jobs.views import enqueue_job_response, is_background_request
 from modules.serializers import ModuleSerializer
 from schedules.models import Schedules
 from .serializers import ImportModulesSerializer, StudyTypesSerializer, SyllabusSerializer
+from .tasks import get_study_plan_modules
 
 
 class SyllabusView(GenericViewSet):
@@ -62,35 +65,24 @@ class StudyProgrammesImportView(GenericViewSet):
     # cache this view for an hour
     @method_decorator(cache_page(60 * 60))
     def get(self, request, *args, **kwargs):
-        response = requests.get(
-            f"https://syllabuskrk.agh.edu.pl/{kwargs.get('academic_year')}/magnesite/api/faculties/"
-            f"{kwargs.get('department')}/study_plans/{kwargs.get('study_plan')}/modules?fields=module-code,language")
-        json_lang = json.loads(response.content).get('syllabus').get('assignments')
-        lang_dict = {}
-        for rec in json_lang:
-            lang_dict[rec.get('assignment').get('module_code')] = rec.get('assignment').get('module').get('language')
-        response = requests.get(
-            f"https://syllabuskrk.agh.edu.pl/{kwargs.get('academic_year')}/magnesite/api/faculties/"
-            f"{kwargs.get('department')}/study_plans/{kwargs.get('study_plan')}/")
-        try:
-            json_data = json.loads(response.content).get('syllabus')
-            modules = []
-            for semester in json_data.get('study_plan').get('semesters'):
-                for group in semester.get('groups'):
-                    for module in group.get('modules'):
-                        module['language'] = lang_dict.get(module.get('module_code')) or 'pl'
-                        modules.append(module)
-            return Response(modules)
-        except json.JSONDecodeError:
-            return Response({'Syllabus': {'content': response.content}}, status=status.HTTP_404_NOT_FOUND)
-        except TypeError:
-            return Response({'error': 'No valid data to display'})
+        data, status_code = get_study_plan_modules(
+            kwargs.get('academic_year'), kwargs.get('department'), kwargs.get('study_plan'))
+        return Response(data, status=status_code)
 
     # required by GenericViewSet with post() method
     def get_queryset(self):
         pass
 
     def post(self, request, *args, **kwargs):
+        """
+        Imports study plan's modules into schedule. Use ?background=1 to run it as a background job.
+        """
+        if is_background_request(request):
+            schedule = get_object_or_404(Schedules, slug=request.data.get('schedule'))
+            return enqueue_job_response(
+                request, 'import_study_plan_modules', schedule=schedule, schedule_slug=schedule.slug,
+                academic_year=kwargs.get('academic_year'), department=kwargs.get('department'),
+                study_plan=kwargs.get('study_plan'))
         data = self.get(request, *args, **kwargs).data
         data = data if isinstance(data, list) else [data]
         schedule = Schedules.objects.get(slug=request.data.get('schedule'))
@@ -1,8 +1,11 @@
+from django.http import StreamingHttpResponse
 from rest_framework import mixins
 from rest_framework.response import Response
 from rest_framework.viewsets import GenericViewSet
 from rest_framework_nested.viewsets import NestedViewSetMixin
 
+from .streaming import EXPORT_CHUNK_SIZE, iterate_queryset
+
 
 class OneToOneRelationViewSet(NestedViewSetMixin,
                               GenericViewSet,
@@ -39,3 +42,33 @@ class OneToOneRelationViewSet(NestedViewSetMixin,
                 return super().update(request, *args, **kwargs)
             else:
                 return super().create(request, *args, **kwargs)
+
+
+class StreamingExportMixin:
+    """
+    Streams exports of the list - rows are fetched in chunks (see iterate_queryset) and rendered one by one with
+    streaming renderer (CSVStreamingRenderer, NDJSONRenderer), so memory used does not depend on number of rows.
+    View's list() should return export_response() when is_export() is True.
+
+    export_serializer_class - serializer of exported rows (view's serializer by default)
+    export_filename - name of exported file (without extension)
+    """
+    export_formats = ('csv', 'ndjson')
+    export_serializer_class = None
+    export_filename = None
+    export_chunk_size = EXPORT_CHUNK_SIZE
+
+    def is_export(self):
+        return getattr(self.request.accepted_renderer, 'format', None) in self.export_formats
+
+    def export_response(self, queryset):
+        renderer = self.request.accepted_renderer
+        serializer_class = self.export_serializer_class or self.get_serializer_class()
+        serializer = serializer_class(context=self.get_serializer_context())
+        rows = (serializer.to_representation(instance)
+                for instance in iterate_queryset(queryset, chunk_size=self.export_chunk_size))
+        response = StreamingHttpResponse(renderer.render(rows, renderer_context=self.get_renderer_context()),
+                                         content_type=renderer.media_type)
+        if self.export_filename:
+            response['Content-Disposition'] = f'attachment; filename="{self.export_filename}.{renderer.format}"'
+        return response
@@ -0,0 +1,303 @@
+import csv
+import io
+import multiprocessing
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain
+
+import django
+from django.conf import settings
+from django.db import transaction
+from rest_framework.exceptions import ValidationError
+from rest_framework.validators import UniqueValidator
+
+from .relations import PrefetchedSlugRelatedField
+from .streaming import chunked
+
+# number of CSV rows validated and saved at once
+CSV_IMPORT_CHUNK_SIZE = 1000
+
+# pool of processes validating chunks of rows in dry run mode (created with the first use)
+_validation_executor = None
+
+
+def read_csv_rows(file, encoding=None):
+    """
+    Reads uploaded CSV file row by row (first line is the header), without loading the whole file into memory
+
+    params: file - uploaded file
+    params: encoding - file's encoding (DEFAULT_CHARSET by default)
+    return: generator of rows' dictionaries (empty values converted into None)
+    """
+    file.seek(0)
+    stream = io.TextIOWrapper(file, encoding=encoding or settings.DEFAULT_CHARSET, newline='')
+    try:
+        for row in csv.DictReader(stream):
+            yield {key: value if value else None for key, value in row.items() if key is not None}
+    finally:
+        # do not close uploaded file together with the wrapper
+        stream.detach()
+
+
+def get_validation_executor():
+    """
+    return: pool of processes validating rows (see validate_rows()), with CSV_VALIDATION_PROCESSES processes (number
+    of CPUs by default). Processes are spawned (not forked), so they never share parent's DB connections.
+    """
+    global _validation_executor
+    if _validation_executor is None:
+        _validation_executor = ProcessPoolExecutor(
+            max_workers=getattr(settings, 'CSV_VALIDATION_PROCESSES', None),
+            mp_context=multiprocessing.get_context('spawn'), initializer=django.setup)
+    return _validation_executor
+
+
+def pop_unique_validators(serializer):
+    """
+    Removes UniqueValidators of serializer's fields (they query database for every validated value)
+
+    return: dictionary of fields' sources and messages of removed validators
+    """
+    unique_fields = {}
+    for field in serializer.fields.values():
+        validators = [validator for validator in field.validators if isinstance(validator, UniqueValidator)]
+        if validators and not field.read_only:
+            unique_fields[field.source] = validators[0].message
+            field.validators = [validator for validator in field.validators if validator not in validators]
+    return unique_fields
+
+
+def validate_rows(serializer_class, prefetched, rows):
+    """
+    Validates rows with serializer's fields only, without database queries - related objects are prefetched and unique
+    values are checked by the caller. Run by processes of validation pool.
+
+    params: serializer_class - class of serializer rows are validated with
+    params: prefetched - dictionary of PrefetchedSlugRelatedFields' names and their prefetched instances
+    params: rows - list of tuples: row's number, row and its existing instance (or None)
+    return: list of tuples: row's number and errors (of invalid rows only)
+    """
+    serializer = serializer_class()
+    pop_unique_validators(serializer)
+    for name, instances in prefetched.items():
+        serializer.fields[name].prefetched = instances
+    errors = []
+    for number, row, instance in rows:
+        serializer.instance = instance
+        try:
+            serializer.run_validation(row)
+        except ValidationError as error:
+            errors.append((number, {field: [str(message) for message in messages]
+                                    for field, messages in error.detail.items()}))
+    return errors
+
+
+class CSVImporter:
+    """
+    Imports rows of CSV files in chunks - every chunk is validated with serializer's fields, with existing records,
+    related objects (see PrefetchedSlugRelatedField) and unique values found in one query per field, then saved with
+    bulk_create() / bulk_update() in one transaction.
+    Serializer's UniqueValidators are replaced with set-based checks against the database and rows of the import.
+
+    params: serializer - serializer instance (of the view, not bound to any data) rows are validated with
+    params: model - model of imported records
+    params: lookup - unique field existing records are found by (when update is True) and rows are reported by
+    params: update - update existing records (create only otherwise)
+    params: saved - (optional) function called with saved instances of every chunk, as bulk writes send no signals
+    """
+
+    def __init__(self, serializer, model, lookup, update=False, saved=None):
+        self.serializer = serializer
+        self.model = model
+        self.lookup = lookup
+        self.update = update
+        self.saved = saved
+        # messages of removed unique validators
+        self.unique_fields = pop_unique_validators(serializer)
+        # unique values of already imported rows
+        self.seen = {field: set() for field in self.unique_fields}
+
+    def import_rows(self, rows, chunk_size=CSV_IMPORT_CHUNK_SIZE):
+        """
+        return: generator of tuples: row's lookup value and list with serialized record or errors of the row
+        """
+        for chunk in chunked(rows, chunk_size):
+            yield from self.import_chunk(chunk)
+
+    def import_chunk(self, rows):
+        """
+        Validates and saves chunk of rows in one transaction
+
+        return: list of tuples: row's lookup value and list with serialized record or errors of the row
+        """
+        with transaction.atomic():
+            results = self.validate_chunk(rows)
+            valid = [(instance, validated_data) for row, instance, validated_data, errors in results if not errors]
+            instances = iter(self.save_chunk(valid))
+        return [(row.get(self.lookup), [errors if errors else self.serializer.to_representation(next(instances))])
+                for row, instance, validated_data, errors in results]
+
+    def lookup_chunk(self, rows):
+        """
+        Prefetches related objects of rows, finds their existing records and records using their unique values
+
+        return: tuple: dictionary of existing instances by lookup value and dictionary of unique fields with
+        dictionaries of their values already used in database and records using them
+        """
+        for field in self.serializer.fields.values():
+            if isinstance(field, PrefetchedSlugRelatedField):
+                field.prefetch(row.get(field.field_name) for row in rows)
+        existing = {}
+        if self.update:
+            existing = {
+                str(getattr(instance, self.lookup)): instance for instance in self.model.objects.filter(
+                    **{f'{self.lookup}__in': {row.get(self.lookup) for row in rows if row.get(self.lookup)}})
+            }
+        # values of unique fields already used in database and records they are used by
+        taken = {}
+        for field in self.unique_fields:
+            values = {row.get(field) for row in rows if row.get(field)}
+            taken[field] = {str(value): pk for value, pk in self.model.objects.filter(
+                **{f'{field}__in': values}).order_by().values_list(field, 'pk')}
+        return existing, taken
+
+    def unique_errors(self, values, instance, taken):
+        """
+        Checks unique values of a row against database and previous valid rows of the import (see remember_unique())
+
+        params: values - dictionary of row's values
+        params: instance - row's existing record (or None)
+        params: taken - values of unique fields used in database (see lookup_chunk())
+        return: dictionary of fields' errors
+        """
+        errors = {}
+        own_pk = instance.pk if instance else None
+        for field, message in self.unique_fields.items():
+            value = values.get(field)
+            if value is None:
+                continue
+            # used by other record or by one of previous rows
+            if taken[field].get(str(value), own_pk) != own_pk or str(value) in self.seen[field]:
+                errors[field] = [message]
+        return errors
+
+    def remember_unique(self, values):
+        """
+        Marks unique values of a valid row as used by the import
+
+        params: values - dictionary of row's values
+        """
+        for field in self.unique_fields:
+            value = values.get(field)
+            if value is not None:
+                self.seen[field].add(str(value))
+
+    def validate_chunk(self, rows):
+        """
+        return: list of tuples: row, its existing instance, validated data and errors
+        """
+        existing, taken = self.lookup_chunk(rows)
+        results = []
+        for row in rows:
+            instance = existing.get(row.get(self.lookup))
+            self.serializer.instance = instance
+            try:
+                validated_data = self.serializer.run_validation(row)
+                errors = {}
+            except ValidationError as error:
+                validated_data = None
+                errors = error.detail
+            for field, messages in self.unique_errors(validated_data or row, instance, taken).items():
+                errors.setdefault(field, []).extend(messages)
+            if not errors:
+                self.remember_unique(validated_data)
+            results.append((row, instance, None if errors else validated_data, errors))
+        self.serializer.instance = None
+        return results
+
+    def save_chunk(self, valid):
+        """
+        Saves valid rows of a chunk (called in transaction of import_chunk())
+
+        params: valid - list of tuples: existing instance (or None) and validated data
+        return: list of saved instances
+        """
+        instances = []
+        to_create = []
+        to_update = []
+        updated_fields = set()
+        for instance, validated_data in valid:
+            if instance is None:
+                instance = self.model(**validated_data)
+                to_create.append(instance)
+            else:
+                for key, value in validated_data.items():
+                    setattr(instance, key, value)
+                updated_fields.update(validated_data)
+                to_update.append(instance)
+            instances.append(instance)
+        self.model.objects.bulk_create(to_create, batch_size=CSV_IMPORT_CHUNK_SIZE)
+        if to_update and updated_fields:
+            self.model.objects.bulk_update(to_update, updated_fields, batch_size=CSV_IMPORT_CHUNK_SIZE)
+        if to_create and to_create[0].pk is None:
+            # primary keys are not set by bulk_create() on some databases (e.g. SQLite)
+            created = dict(self.model.objects.filter(
+                **{f'{self.lookup}__in': [getattr(instance, self.lookup) for instance in to_create]}
+            ).values_list(self.lookup, 'pk'))
+            for instance in to_create:
+                instance.pk = created[getattr(instance, self.lookup)]
+        if self.saved and instances:
+            self.saved(instances)
+        return instances
+
+    def dry_run(self, rows, chunk_size=CSV_IMPORT_CHUNK_SIZE):
+        """
+        Validates rows without saving them. Database lookups and unique values checks are done here for every chunk,
+        then chunks are validated in parallel by the validation pool (see get_validation_executor()) - a single chunk is
+        validated in this process. Duplicates within the file are checked at the end, when validity of rows is known.
+
+        return: dictionary with numbers of rows and invalid rows and errors of invalid rows by their line in the file
+        """
+        report = {'rows': 0, 'invalid': 0, 'errors': {}}
+        errors = defaultdict(dict)
+        # unique values of rows by their numbers
+        unique_values = {}
+        prefetched_fields = [name for name, field in self.serializer.fields.items()
+                             if isinstance(field, PrefetchedSlugRelatedField)]
+
+        def tasks():
+            # rows are numbered by their lines (the first one is the header)
+            for chunk in chunked(enumerate(rows, start=2), chunk_size):
+                report['rows'] += len(chunk)
+                existing, taken = self.lookup_chunk([row for _, row in chunk])
+                for number, row in chunk:
+                    row_errors = self.unique_errors(row, existing.get(row.get(self.lookup)), taken)
+                    if row_errors:
+                        errors[number].update(row_errors)
+                    unique_values[number] = {field: row[field] for field in self.unique_fields
+                                             if row.get(field) is not None}
+                yield (type(self.serializer),
+                       {name: self.serializer.fields[name].prefetched for name in prefetched_fields},
+                       [(number, row, existing.get(row.get(self.lookup))) for number, row in chunk])
+
+        tasks = tasks()
+        first, second = next(tasks, None), next(tasks, None)
+        if second is None:
+            results = [validate_rows(*first)] if first else []
+        else:
+            executor = get_validation_executor()
+            futures = [executor.submit(validate_rows, *task) for task in chain([first, second], tasks)]
+            results = (future.result() for future in futures)
+        for chunk_errors in results:
+            for number, row_errors in chunk_errors:
+                for field, messages in row_errors.items():
+                    errors[number].setdefault(field, []).extend(messages)
+        for number, values in sorted(unique_values.items()):
+            for field, value in values.items():
+                if str(value) in self.seen[field]:
+                    errors[number].setdefault(field, []).append(self.unique_fields[field])
+            if not errors.get(number):
+                self.remember_unique(values)
+        report['invalid'] = len(errors)
+        report['errors'] = dict(sorted(errors.items()))
+        return report
@@ -0,0 +1,29 @@
+from django.db import migrations
+
+
+def trigram_indexes(table, fields):
+    """
+    Migration operation creating trigram (GIN) indexes used by icontains / istartswith lookups on PostgreSQL.
+    Other databases are skipped - their LIKE lookups (e.g. on SQLite) cannot be served by indexes, so searches scan
+    the table there.
+
+    params: table - name of database table
+    params: fields - names of text columns (indexed as UPPER(column), the way Django compares them)
+    return: RunPython operation
+    """
+
+    def create(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        for field in fields:
+            schema_editor.execute(f'CREATE INDEX IF NOT EXISTS {table}_{field}_trgm ON {table} '
+                                  f'USING gin (UPPER({field}::text) gin_trgm_ops)')
+
+    def drop(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        for field in fields:
+            schema_editor.execute(f'DROP INDEX IF EXISTS {table}_{field}_trgm')
+
+    return migrations.RunPython(create, drop)
@@ -0,0 +1,41 @@
+from django.db.models import Q
+from rest_framework.filters import BaseFilterBackend
+
+# query parameter's values meaning True / False for flag filters
+TRUE_VALUES = ('1', 'true', 'True', 'yes')
+FALSE_VALUES = ('0', 'false', 'False', 'no')
+
+
+def flag(condition):
+    """
+    Flag filter - ?param=1 filters rows meeting the condition, ?param=0 rows not meeting it
+
+    params: condition - Q object
+    return: function returning Q object for query parameter's value (None for values other than true / false ones)
+    """
+    def lookup(value):
+        if value in TRUE_VALUES:
+            return condition
+        if value in FALSE_VALUES:
+            return ~condition
+        return None
+
+    return lookup
+
+
+class LookupsFilterBackend(BaseFilterBackend):
+    """
+    Filters list with view's filter_lookups - dictionary of query parameters' names and lookups their values are
+    used with (e.g. {'name': 'name__istartswith'}) or functions returning Q object for the value (see flag()).
+    Parameters missing in request (or with empty value) are skipped.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        for param, lookup in getattr(view, 'filter_lookups', {}).items():
+            value = request.query_params.get(param)
+            if value in (None, ''):
+                continue
+            condition = lookup(value) if callable(lookup) else Q(**{lookup: value})
+            if condition is not None:
+                queryset = queryset.filter(condition)
+        return queryset
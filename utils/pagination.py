@@ -0,0 +1,137 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+from functools import reduce
+from operator import or_
+
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset (cursor) pagination - pages are found with filter on ordering fields' values of the last seen row, so every
+    page costs the same, no matter how far it is from the beginning.
+
+    Pagination is opt-in - list is paginated only if request has page_size or cursor query parameter, bare list is
+    returned otherwise (and for CSV format).
+    Ordering is taken from view's keyset_ordering, queryset's ordering or model's Meta.ordering (in that order), primary
+    key is always added as the last field, so rows with equal values are never skipped.
+    """
+    page_size = api_settings.PAGE_SIZE or 100
+    max_page_size = 1000
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if not {self.page_size_query_param, self.cursor_query_param} & set(request.query_params) or \
+                getattr(request.accepted_renderer, 'format', None) == 'csv':
+            return None
+
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(queryset, view)
+        values, self.reverse = self.decode_cursor(request)
+
+        # values of ordering fields annotated, so they are read from instances the same way for every lookup
+        keys = [f'keyset_{i}' for i in range(len(self.ordering))]
+        queryset = queryset.annotate(**{key: F(field.lstrip('-')) for key, field in zip(keys, self.ordering)})
+        ordering = [(key, field.startswith('-') != self.reverse) for key, field in zip(keys, self.ordering)]
+        if values is not None:
+            if len(values) != len(keys):
+                raise NotFound(self.invalid_cursor_message)
+            queryset = queryset.filter(self.position_filter(ordering, values))
+        queryset = queryset.order_by(*[f'-{key}' if descending else key for key, descending in ordering])
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if self.reverse:
+            results.reverse()
+        rows = [[getattr(instance, key) for key in keys] for instance in results]
+        # going forward - the next page exists if there are more rows, the previous one if cursor was given
+        has_next, has_previous = (values is not None, has_more) if self.reverse else (has_more, values is not None)
+        self.next_values = rows[-1] if rows and has_next else None
+        self.previous_values = rows[0] if rows and has_previous else None
+        return results
+
+    @staticmethod
+    def position_filter(ordering, values):
+        """
+        params: ordering - list of tuples: annotated field's name and True if it is in descending order
+        params: values - values of fields of the last seen row
+        return: Q object matching rows after the last seen row (field1 > value1 OR field1 = value1 AND field2 >
+        value2 ...)
+        """
+        conditions = []
+        for i, (key, descending) in enumerate(ordering):
+            condition = Q(**{f'{key}__lt' if descending else f'{key}__gt': values[i]})
+            for (previous_key, _), previous_value in zip(ordering[:i], values[:i]):
+                condition &= Q(**{previous_key: previous_value})
+            conditions.append(condition)
+        return reduce(or_, conditions)
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except ValueError:
+            return self.page_size
+        return min(page_size, self.max_page_size) if page_size > 0 else self.page_size
+
+    @staticmethod
+    def get_ordering(queryset, view):
+        # only fields' names (not expressions) can be used for keys
+        ordering = [field for field in getattr(view, 'keyset_ordering', None) or queryset.query.order_by or
+                    queryset.model._meta.ordering if isinstance(field, str)]
+        if not {'pk', '-pk', queryset.model._meta.pk.name} & set(ordering):
+            ordering.append('pk')
+        return ordering
+
+    def decode_cursor(self, request):
+        """
+        return: tuple of values of the last seen row (None for the first page) and True if page is before that row
+        """
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None, False
+        try:
+            data = json.loads(urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+            return data['v'], bool(data.get('r'))
+        except (BinasciiError, UnicodeError, ValueError, TypeError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, values, reverse):
+        if values is None:
+            return None
+        cursor = urlsafe_b64encode(json.dumps({'v': values, 'r': reverse}).encode('utf-8')).decode('ascii')
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.page_size_query_param, self.page_size)
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_next_link(self):
+        return self.encode_cursor(self.next_values, False)
+
+    def get_previous_link(self):
+        return self.encode_cursor(self.previous_values, True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True},
+                'previous': {'type': 'string', 'nullable': True},
+                'results': schema,
+            },
+        }
@@ -1,6 +1,10 @@
 from functools import reduce
+from urllib.parse import quote
 
+from django.utils.encoding import smart_str
+from django.utils.http import RFC3986_SUBDELIMS
 from rest_framework.fields import HiddenField
+from rest_framework.relations import HyperlinkedIdentityField, SlugRelatedField
 from rest_framework_nested.relations import NestedHyperlinkedIdentityField
 
 
@@ -64,6 +68,7 @@ class ParentHiddenRelatedField(HiddenField):
         kwargs['write_only'] = True
         kwargs['default'] = None
         super().__init__(**kwargs)
+        self.parents = {}
 
     def get_value(self, dictionary):
         # in case of bulk data sent, return instance hidden under
@@ -80,8 +85,66 @@ class ParentHiddenRelatedField(HiddenField):
             if self.context.get('request'):
                 filter_kwargs[value] = self.context.get(
                     'request').resolver_match.kwargs.get(key)
-        return self.queryset.filter(**filter_kwargs).first()
+        # without request (e.g. in background job) or parent's kwargs in URL there is no parent to look for
+        if not filter_kwargs or None in filter_kwargs.values():
+            return None
+        # parent is the same for every item of bulk data - look for it once
+        key = tuple(sorted(filter_kwargs.items()))
+        if key not in self.parents:
+            self.parents[key] = self.queryset.filter(**filter_kwargs).first()
+        return self.parents[key]
 
     def to_internal_value(self, data):
         # return model's instance, no conversion needed
         return data
+
+
+class PrefetchedSlugRelatedField(SlugRelatedField):
+    """
+    Slug Related Field able to find instances of many slugs with one query (see prefetch()),
+    so bulk validation does not query database for every row
+    """
+
+    def prefetch(self, values):
+        """
+        Finds instances of given slugs - following to_internal_value() calls use them instead of querying database
+
+        params: values - iterable of slugs
+        """
+        values = {value for value in values if value is not None}
+        self.prefetched = {
+            smart_str(getattr(instance, self.slug_field)): instance
+            for instance in self.get_queryset().filter(**{f'{self.slug_field}__in': values})
+        }
+
+    def to_internal_value(self, data):
+        prefetched = getattr(self, 'prefetched', None)
+        if prefetched is None:
+            return super().to_internal_value(data)
+        if smart_str(data) not in prefetched:
+            self.fail('does_not_exist', slug_name=self.slug_field, value=smart_str(data))
+        return prefetched[smart_str(data)]
+
+
+class TemplateHyperlinkedIdentityField(HyperlinkedIdentityField):
+    """
+    Hyperlinked Identity Field reversing view's URL once per serializer - URL is reversed with a placeholder instead of
+    lookup value, which is then replaced with (quoted) lookup value of every instance, so long lists of nested
+    instances do not resolve the same URL pattern over and over
+    """
+    placeholder = 'lookup-value-placeholder'
+
+    def __init__(self, view_name=None, **kwargs):
+        super().__init__(view_name, **kwargs)
+        # URLs with placeholder by view's name and format
+        self.url_templates = {}
+
+    def get_url(self, obj, view_name, request, format):
+        if hasattr(obj, 'pk') and obj.pk in (None, ''):
+            return None
+        if (view_name, format) not in self.url_templates:
+            self.url_templates[(view_name, format)] = self.reverse(
+                view_name, kwargs={self.lookup_url_kwarg: self.placeholder}, request=request, format=format)
+        # quoted the same way as by reverse()
+        lookup_value = quote(smart_str(getattr(obj, self.lookup_field)), safe=RFC3986_SUBDELIMS + '/~:@')
+        return self.url_templates[(view_name, format)].replace(self.placeholder, lookup_value)
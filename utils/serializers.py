@@ -1,36 +1,56 @@
-from collections import OrderedDict
-
+from rest_framework import status
 from rest_framework.fields import SerializerMethodField
+from rest_framework.generics import get_object_or_404
 from rest_framework.response import Response
-from rest_framework_csv.parsers import CSVParser
+
+from .csv_import import CSVImporter, read_csv_rows
+from .filters import TRUE_VALUES
 
 
-def read_csv_files(self, request, model, lookup):
+def read_csv_files(self, request, model, lookup, saved=None):
     """
-    Function reads any file uploaded and tries to serialize data into objects
-    self - for serializer (get_serializer method of the ViewSet) and for CSVParser
+    Function reads any file uploaded and tries to serialize data into objects.
+    Files are read row by row and imported in chunks (see CSVImporter) - rows of a chunk are validated with a few
+    queries and saved with bulk queries, in one transaction per chunk
+    self - for serializer (get_serializer method of the ViewSet)
     model + lookup - for searching already existing records
+    saved - (optional) function called with saved instances of every chunk (bulk writes send no signals)
+    With ?dry_run=1 files are only validated (in parallel, see CSVImporter.dry_run()) and a report of invalid rows is
+    returned
+    """
+    if not request.FILES:
+        return Response({'detail': 'No files uploaded.'}, status=status.HTTP_400_BAD_REQUEST)
+    update = request.method == 'PUT'
+    if request.query_params.get('dry_run') in TRUE_VALUES:
+        return Response({
+            file + ' file': CSVImporter(self.get_serializer(), model, lookup, update=update).dry_run(
+                read_csv_rows(request.FILES[file]))
+            for file in request.FILES
+        })
+    data = {}
+    for file in request.FILES:
+        importer = CSVImporter(self.get_serializer(), model, lookup, update=update, saved=saved)
+        data[file + ' file'] = dict(importer.import_rows(read_csv_rows(request.FILES[file])))
+    return Response(data)
+
+
+def get_request_cached_object(request, queryset, **filter_kwargs):
+    """
+    Works like get_object_or_404, but keeps found instance on the request, so all serializers and validators working
+    within the same request share one instance (with its memoized values)
+
+    params: request - request object the instance is cached with
+    params: queryset - queryset to search instance in
+    params: filter_kwargs - lookups of the instance
+    return: model instance
     """
-    if request.FILES:
-        data = {}
-        for file in request.FILES:
-            data[file + ' file'] = {}
-            for file_data in CSVParser.parse(self, stream=request.data.get(file)):
-                for key, value in file_data.items():
-                    # convert empty strings into None
-                    file_data[key] = value if value else None
-                partial_data = OrderedDict(file_data)
-                if request.method == 'PUT':
-                    instance = model.objects.filter(**{lookup: partial_data[lookup]}).first()
-                    serializer = self.get_serializer(instance, data=partial_data)
-                else:
-                    serializer = self.get_serializer(data=partial_data)
-                if serializer.is_valid():
-                    serializer.save()
-                    data[file + ' file'][partial_data.get(lookup)] = [serializer.data]
-                if serializer.errors:
-                    data[file + ' file'][partial_data.get(lookup)] = [serializer.errors]
-        return Response(data)
+    cache = getattr(request, '_cached_objects', None)
+    if cache is None:
+        cache = request._cached_objects = {}
+    key = (queryset.model._meta.label, tuple(sorted(filter_kwargs.items())))
+    if key not in cache:
+        cache[key] = get_object_or_404(queryset, **filter_kwargs)
+    return cache[key]
 
 
 class SerializerLambdaField(SerializerMethodField):
@@ -0,0 +1,75 @@
+import json
+from itertools import islice
+from types import GeneratorType
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import prefetch_related_objects
+from django.http import StreamingHttpResponse
+from rest_framework.renderers import BaseRenderer
+
+# number of rows fetched from database at once while streaming exports
+EXPORT_CHUNK_SIZE = 500
+
+
+def chunked(iterable, size):
+    """
+    return: generator of lists of up to size items of iterable
+    """
+    iterator = iter(iterable)
+    chunk = list(islice(iterator, size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(iterator, size))
+
+
+def iterate_queryset(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Iterates over queryset fetching chunk_size rows at once (see QuerySet.iterator()), so rows are never all kept in
+    memory. iterator() skips prefetch_related() lookups, so they are prefetched for every chunk separately.
+
+    params: queryset - queryset to iterate over
+    params: chunk_size - number of rows fetched at once
+    return: generator of queryset's instances
+    """
+    lookups = queryset._prefetch_related_lookups
+    if not lookups:
+        yield from queryset.iterator(chunk_size=chunk_size)
+        return
+    for chunk in chunked(queryset.iterator(chunk_size=chunk_size), chunk_size):
+        prefetch_related_objects(chunk, *lookups)
+        yield from chunk
+
+
+class NDJSONRenderer(BaseRenderer):
+    """
+    Newline delimited JSON renderer - every row is rendered as a JSON object in a separate line.
+    Like CSVStreamingRenderer, render() returns generator of lines, so it can be used with StreamingHttpResponse.
+    """
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return
+        if not isinstance(data, (GeneratorType, list)):
+            data = [data]
+        for row in data:
+            yield (json.dumps(row, cls=DjangoJSONEncoder) + '\n').encode(self.charset)
+
+
+def stream_json_list(rows, **kwargs):
+    """
+    Returns response with JSON list, encoded and sent row by row, so whole content is never kept in memory
+
+    params: rows - iterable (preferably generator) of JSON serializable rows
+    params: kwargs - additional kwargs of StreamingHttpResponse
+    return: StreamingHttpResponse instance
+    """
+    def content():
+        yield '['
+        for i, row in enumerate(rows):
+            yield (',' if i else '') + json.dumps(row, cls=DjangoJSONEncoder)
+        yield ']'
+
+    return StreamingHttpResponse(content(), content_type='application/json', **kwargs)